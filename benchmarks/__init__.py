@@ -0,0 +1,2 @@
+"""Benchmarks of ``browser-history`` on generated browser profiles, see
+``benchmarks/README.md``."""
@@ -0,0 +1,167 @@
+"""Command line interface of the benchmarks, run with ``python -m benchmarks``
+from the root of the repository. See ``benchmarks/README.md``."""
+
+import argparse
+import json
+import logging
+import re
+import sys
+import tempfile
+from pathlib import Path
+
+from benchmarks import fixtures, suite
+from browser_history import utils
+
+SIZE_SUFFIXES = {"": 1, "k": 1000, "m": 1000000}
+
+
+def parse_size(value):
+    """Parses a number of visits like ``10000``, ``10k`` or ``10M``.
+
+    :rtype: int
+    """
+    match = re.fullmatch(r"(\d+)([kKmM]?)", value.strip())
+    if not match:
+        raise argparse.ArgumentTypeError(
+            f"invalid size '{value}'. Should be a number like 10000, 10k or 10M"
+        )
+    return int(match.group(1)) * SIZE_SUFFIXES[match.group(2).lower()]
+
+
+def make_parser():
+    """Creates an ArgumentParser for the benchmarks."""
+    parser = argparse.ArgumentParser(
+        description="""
+                    Benchmarks browser-history on generated Chromium, Firefox
+                    and Safari profiles.
+                    """,
+        epilog="""
+                Checks for regressions: run with -o on the release to compare
+                against, then with -b on the change.
+                """,
+    )
+    parser.add_argument(
+        "-s",
+        "--sizes",
+        nargs="+",
+        type=parse_size,
+        default=[10000, 100000],
+        help="""
+                number of visits of every browser, like 10k or 10M.
+                Default is 10k 100k.
+                """,
+    )
+    parser.add_argument(
+        "-p",
+        "--profiles",
+        type=int,
+        default=2,
+        help="number of profiles of Chromium and Firefox. Default is 2.",
+    )
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        default=3,
+        help="number of times every benchmark is run. Default is 3.",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="seed of the generated profiles."
+    )
+    parser.add_argument(
+        "-k",
+        "--only",
+        nargs="+",
+        metavar="PATTERN",
+        help="""
+                only run the benchmarks matching these glob patterns, like
+                'Firefox.*' or '*.query*'.
+                """,
+    )
+    parser.add_argument(
+        "-f",
+        "--fixtures",
+        type=Path,
+        help="""
+                directory in which the generated profiles are kept, and
+                reused by the next runs. By default they are generated in a
+                temporary directory.
+                """,
+    )
+    parser.add_argument(
+        "-o", "--output", type=Path, help="file to write the results to, as JSON."
+    )
+    parser.add_argument(
+        "-b", "--baseline", type=Path, help="results of an earlier run to compare to."
+    )
+    parser.add_argument(
+        "-t",
+        "--threshold",
+        type=float,
+        default=1.25,
+        help="""
+                ratio of the best times above which a benchmark has
+                regressed. Default is 1.25.
+                """,
+    )
+    return parser
+
+
+def fixture_home(fixtures_dir, size, profiles, seed):
+    """Returns the home directory of the profiles generated with these
+    arguments in ``fixtures_dir``, generating them if they are not there."""
+    home = fixtures_dir / f"{size}-{profiles}-{seed}"
+    complete = home / ".complete"
+    if not complete.exists():
+        print(f"Generating {size} visits in {home}", file=sys.stderr)
+        fixtures.generate(home, size, profiles, seed)
+        complete.touch()
+    return home
+
+
+def main():
+    """Entrypoint to the benchmarks."""
+    args = make_parser().parse_args()
+    # get_history logs every browser which is not installed
+    utils.logger.setLevel(logging.WARNING)
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        fixtures_dir = args.fixtures or Path(tmpdirname)
+        results = []
+        for size in args.sizes:
+            home = fixture_home(fixtures_dir, size, args.profiles, args.seed)
+            results += suite.run(home, size, args.repeat, args.only, log=sys.stdout)
+
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump(
+                {
+                    "environment": suite.environment(),
+                    "profiles": args.profiles,
+                    "repeat": args.repeat,
+                    "seed": args.seed,
+                    "results": results,
+                },
+                output_file,
+                indent=2,
+            )
+    if baseline is None:
+        return
+    compared, regressed = suite.compare(results, baseline, args.threshold)
+    print(f"\n{len(compared)} benchmarks compared to {args.baseline}:")
+    for result, ratio in compared:
+        mark = "  REGRESSED" if ratio > args.threshold else ""
+        print(
+            f"{result['browser']:>10} {result['name']:<20} {result['size']:>10} "
+            f"{ratio:>8.2f}x{mark}"
+        )
+    if regressed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
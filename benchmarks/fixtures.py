@@ -0,0 +1,437 @@
+"""This module generates synthetic browser profiles for the benchmarks.
+
+The generated home directory holds the files read by ``browser-history``,
+with the schema (tables and indexes) of the browsers themselves:
+
+* Chromium: ``History`` (``urls`` and ``visits``) and ``Bookmarks`` (JSON) of
+  every profile, listed in ``Local State``.
+* Firefox: ``places.sqlite`` (``moz_places``, ``moz_historyvisits`` and
+  ``moz_bookmarks``) of every profile, listed in ``profiles.ini``.
+* Safari: ``History.db`` (``history_items`` and ``history_visits``), which has
+  no profiles.
+
+Chromium and Firefox are at their Linux paths, Safari at its Mac OS path.
+
+URLs and domains are drawn from Zipf-like distributions, so a few sites get
+most of the visits like in real histories. Visits are spread over several
+years and stored in the order they were made. The same ``seed`` always
+generates the same files.
+"""
+import json
+import math
+import random
+import sqlite3
+from pathlib import Path
+
+# 2015-01-01 00:00:00 UTC, in microseconds since the Unix epoch
+START = 1420070400 * 1000000
+# visits are spread over this many microseconds after START
+SPAN = 6 * 365 * 24 * 3600 * 1000000
+# microseconds between the epochs of Chromium (1601) and Unix (1970)
+CHROMIUM_OFFSET = 11644473600 * 1000000
+# seconds between the epochs of Unix (1970) and Safari (2001)
+SAFARI_OFFSET = 978307200
+
+# number of rows inserted at a time
+BATCH = 10000
+
+POPULAR_DOMAINS = [
+    "www.google.com",
+    "www.youtube.com",
+    "github.com",
+    "en.wikipedia.org",
+    "www.reddit.com",
+    "stackoverflow.com",
+    "news.ycombinator.com",
+    "docs.python.org",
+    "mail.google.com",
+    "twitter.com",
+]
+
+WORDS = [
+    "python",
+    "history",
+    "browser",
+    "search",
+    "issues",
+    "pull",
+    "watch",
+    "wiki",
+    "questions",
+    "news",
+    "docs",
+    "library",
+    "release",
+    "profile",
+    "settings",
+    "blog",
+    "2021",
+    "index",
+    "tutorial",
+    "api",
+]
+
+TLDS = ["com", "org", "net", "io", "dev", "co.uk", "de", "in"]
+
+
+def _zipf(rng, count):
+    """Returns a random index below ``count``, where index ``i`` is drawn
+    with a probability of about ``1 / (i + 1)``."""
+    return min(int(math.exp(rng.random() * math.log(count + 1))) - 1, count - 1)
+
+
+class _Urls:
+    """Deterministic random URLs of a profile.
+
+    :param rng: the random number generator of the profile.
+    :param count: number of distinct URLs.
+    """
+
+    def __init__(self, rng, count):
+        self.rng = rng
+        self.count = count
+        domain_count = max(len(POPULAR_DOMAINS), count // 50)
+        self.domains = POPULAR_DOMAINS + [
+            f"{rng.choice(WORDS)}{i}.{rng.choice(TLDS)}"
+            for i in range(domain_count - len(POPULAR_DOMAINS))
+        ]
+
+    def __iter__(self):
+        """Yields ``(url, title, host)`` tuples for every URL."""
+        rng = self.rng
+        for i in range(self.count):
+            host = self.domains[_zipf(rng, len(self.domains))]
+            words = rng.sample(WORDS, 3)
+            url = f"https://{host}/{words[0]}/{words[1]}-{i}"
+            if rng.random() < 0.3:
+                url += f"?q={words[2]}&page={rng.randrange(20)}"
+            yield url, f"{words[0].title()} {words[1]} - {host}", host
+
+    def visits(self, count):
+        """Yields ``(visit_time, url_index)`` tuples of ``count`` visits, in
+        order of time, ``visit_time`` in microseconds since the Unix
+        epoch."""
+        rng = self.rng
+        mean_gap = SPAN / count
+        visit_time = START
+        for _ in range(count):
+            visit_time += int(rng.expovariate(1 / mean_gap)) + 1
+            yield visit_time, _zipf(rng, self.count)
+
+
+def _batches(rows):
+    """Yields lists of at most :py:data:`BATCH` rows."""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _connect(path):
+    """Creates a new SQLite database at ``path``, set up for fast inserts."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.exists():
+        path.unlink()
+    conn = sqlite3.connect(str(path))
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    return conn
+
+
+def make_chromium_history(path, visit_count, rng):
+    """Generates a Chromium ``History`` database at ``path`` with
+    ``visit_count`` visits. About one visit in ten has no duration, which
+    Chromium records for redirects and which is not returned as history."""
+    conn = _connect(path)
+    conn.executescript(
+        """
+        CREATE TABLE urls (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, url LONGVARCHAR,
+            title LONGVARCHAR, visit_count INTEGER DEFAULT 0 NOT NULL,
+            typed_count INTEGER DEFAULT 0 NOT NULL, last_visit_time INTEGER NOT NULL,
+            hidden INTEGER DEFAULT 0 NOT NULL
+        );
+        CREATE INDEX urls_url_index ON urls (url);
+        CREATE TABLE visits (
+            id INTEGER PRIMARY KEY, url INTEGER NOT NULL,
+            visit_time INTEGER NOT NULL, from_visit INTEGER,
+            transition INTEGER DEFAULT 0 NOT NULL, segment_id INTEGER,
+            visit_duration INTEGER DEFAULT 0 NOT NULL
+        );
+        CREATE INDEX visits_url_index ON visits (url);
+        CREATE INDEX visits_time_index ON visits (visit_time);
+        """
+    )
+    urls = _Urls(rng, max(1, visit_count // 3))
+    for batch in _batches(urls):
+        conn.executemany(
+            "INSERT INTO urls (url, title, last_visit_time) VALUES (?, ?, 0)",
+            [(url, title) for url, title, _ in batch],
+        )
+    for batch in _batches(urls.visits(visit_count)):
+        conn.executemany(
+            "INSERT INTO visits (url, visit_time, transition, visit_duration) "
+            "VALUES (?, ?, ?, ?)",
+            [
+                (
+                    url_index + 1,
+                    visit_time + CHROMIUM_OFFSET,
+                    rng.randrange(10),
+                    0 if rng.random() < 0.1 else rng.randrange(1, 600000000),
+                )
+                for visit_time, url_index in batch
+            ],
+        )
+    conn.commit()
+    conn.close()
+
+
+def make_chromium_bookmarks(path, bookmark_count, rng):
+    """Generates a Chromium ``Bookmarks`` JSON file at ``path`` with
+    ``bookmark_count`` bookmarks in nested folders."""
+    urls = iter(_Urls(rng, bookmark_count))
+
+    def folder(name, depth):
+        children = []
+        for _ in range(rng.randrange(5, 20)):
+            url = next(urls, None)
+            if url is None:
+                break
+            children.append(
+                {
+                    "date_added": str(START + rng.randrange(SPAN) + CHROMIUM_OFFSET),
+                    "name": url[1],
+                    "type": "url",
+                    "url": url[0],
+                }
+            )
+            if depth < 3 and rng.random() < 0.1:
+                children.append(folder(rng.choice(WORDS).title(), depth + 1))
+        return {"children": children, "name": name, "type": "folder"}
+
+    bar = folder("Bookmarks bar", 0)
+    other = folder("Other bookmarks", 0)
+    # the rest, in folders of the bookmarks bar
+    for _ in range(bookmark_count):
+        child = folder(rng.choice(WORDS).title(), 1)
+        if not child["children"]:
+            break
+        bar["children"].append(child)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as bookmarks:
+        json.dump(
+            {
+                "roots": {
+                    "bookmark_bar": bar,
+                    "other": other,
+                    "synced": folder("Mobile bookmarks", 3),
+                },
+                "version": 1,
+            },
+            bookmarks,
+        )
+
+
+def make_firefox_places(path, visit_count, bookmark_count, rng):
+    """Generates a Firefox ``places.sqlite`` database at ``path`` with
+    ``visit_count`` visits and ``bookmark_count`` bookmarks. Some places have
+    no title, their visits are not returned as history."""
+    conn = _connect(path)
+    conn.executescript(
+        """
+        CREATE TABLE moz_places (
+            id INTEGER PRIMARY KEY, url LONGVARCHAR, title LONGVARCHAR,
+            rev_host LONGVARCHAR, visit_count INTEGER DEFAULT 0,
+            hidden INTEGER DEFAULT 0 NOT NULL, typed INTEGER DEFAULT 0 NOT NULL,
+            frecency INTEGER DEFAULT -1 NOT NULL, last_visit_date INTEGER,
+            guid TEXT, url_hash INTEGER DEFAULT 0 NOT NULL
+        );
+        CREATE INDEX moz_places_url_hashindex ON moz_places (url_hash);
+        CREATE INDEX moz_places_hostindex ON moz_places (rev_host);
+        CREATE INDEX moz_places_frecencyindex ON moz_places (frecency);
+        CREATE UNIQUE INDEX moz_places_guid_uniqueindex ON moz_places (guid);
+        CREATE TABLE moz_historyvisits (
+            id INTEGER PRIMARY KEY, from_visit INTEGER, place_id INTEGER,
+            visit_date INTEGER, visit_type INTEGER, session INTEGER,
+            source INTEGER DEFAULT 0 NOT NULL, triggeringPlaceId INTEGER
+        );
+        CREATE INDEX moz_historyvisits_placedateindex
+            ON moz_historyvisits (place_id, visit_date);
+        CREATE INDEX moz_historyvisits_fromindex ON moz_historyvisits (from_visit);
+        CREATE INDEX moz_historyvisits_dateindex ON moz_historyvisits (visit_date);
+        CREATE TABLE moz_bookmarks (
+            id INTEGER PRIMARY KEY, type INTEGER, fk INTEGER DEFAULT NULL,
+            parent INTEGER, position INTEGER, title LONGVARCHAR,
+            keyword_id INTEGER, folder_type TEXT, dateAdded INTEGER,
+            lastModified INTEGER, guid TEXT
+        );
+        CREATE INDEX moz_bookmarks_itemindex ON moz_bookmarks (fk, type);
+        CREATE INDEX moz_bookmarks_parentindex ON moz_bookmarks (parent, position);
+        """
+    )
+    place_count = max(1, visit_count // 3)
+    urls = _Urls(rng, place_count)
+    place_ids = iter(range(1, place_count + 1))
+    for batch in _batches(urls):
+        conn.executemany(
+            "INSERT INTO moz_places (id, url, title, rev_host, guid, frecency) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    place_id,
+                    url,
+                    None if rng.random() < 0.05 else title,
+                    host[::-1] + ".",
+                    f"place{place_id:08d}",
+                    rng.randrange(10000),
+                )
+                for place_id, (url, title, host) in zip(place_ids, batch)
+            ],
+        )
+    for batch in _batches(urls.visits(visit_count)):
+        conn.executemany(
+            "INSERT INTO moz_historyvisits (place_id, visit_date, visit_type) "
+            "VALUES (?, ?, ?)",
+            [
+                (url_index + 1, visit_time, rng.randrange(1, 10))
+                for visit_time, url_index in batch
+            ],
+        )
+    roots = [
+        (1, 0, "", "root________"),
+        (2, 1, "menu", "menu________"),
+        (3, 1, "toolbar", "toolbar_____"),
+        (4, 1, "tags", "tags________"),
+        (5, 1, "unfiled", "unfiled_____"),
+    ]
+    conn.executemany(
+        "INSERT INTO moz_bookmarks (id, type, parent, title, dateAdded, guid) "
+        "VALUES (?, 2, ?, ?, 0, ?)",
+        roots,
+    )
+    folders = [2, 3, 5]
+    bookmarks = []
+    for i in range(bookmark_count):
+        bookmark_id = len(roots) + 1 + i
+        date_added = START + rng.randrange(SPAN)
+        if rng.random() < 0.05:
+            bookmarks.append(
+                (bookmark_id, 2, None, rng.choice(folders), i, rng.choice(WORDS))
+                + (date_added, f"folder{bookmark_id:06d}")
+            )
+            folders.append(bookmark_id)
+        else:
+            bookmarks.append(
+                (bookmark_id, 1, _zipf(rng, place_count) + 1, rng.choice(folders))
+                + (i, rng.choice(WORDS).title(), date_added, f"bmark{bookmark_id:07d}")
+            )
+    conn.executemany(
+        "INSERT INTO moz_bookmarks "
+        "(id, type, fk, parent, position, title, dateAdded, guid) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        bookmarks,
+    )
+    conn.commit()
+    conn.close()
+
+
+def make_safari_history(path, visit_count, rng):
+    """Generates a Safari ``History.db`` database at ``path`` with
+    ``visit_count`` visits, timestamped in seconds since 2001."""
+    conn = _connect(path)
+    conn.executescript(
+        """
+        CREATE TABLE history_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL UNIQUE,
+            domain_expansion TEXT NULL, visit_count INTEGER NOT NULL
+        );
+        CREATE TABLE history_visits (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            history_item INTEGER NOT NULL REFERENCES history_items(id),
+            visit_time REAL NOT NULL, title TEXT NULL,
+            load_successful BOOLEAN NOT NULL DEFAULT 1
+        );
+        CREATE INDEX history_visits__last_visit ON history_visits (history_item);
+        CREATE INDEX history_visits__visit_time ON history_visits (visit_time);
+        """
+    )
+    urls = _Urls(rng, max(1, visit_count // 3))
+    for batch in _batches(urls):
+        conn.executemany(
+            "INSERT INTO history_items (url, domain_expansion, visit_count) "
+            "VALUES (?, ?, 0)",
+            [(url, host.split(".")[-2]) for url, _, host in batch],
+        )
+    for batch in _batches(urls.visits(visit_count)):
+        conn.executemany(
+            "INSERT INTO history_visits (history_item, visit_time) VALUES (?, ?)",
+            [
+                (url_index + 1, visit_time / 1000000 - SAFARI_OFFSET)
+                for visit_time, url_index in batch
+            ],
+        )
+    conn.commit()
+    conn.close()
+
+
+def _split(count, parts):
+    """Splits ``count`` into ``parts`` integers which add up to it."""
+    return [count // parts + (part < count % parts) for part in range(parts)]
+
+
+def generate(home, size, profiles=2, seed=0):
+    """Generates the files of Chromium, Firefox and Safari in the home
+    directory ``home``. ``size`` visits are split between the profiles of
+    every browser, each profile also gets one bookmark for every hundred
+    visits.
+
+    :param home: the home directory, created if it does not exist.
+    :type home: :py:class:`pathlib.Path`
+    :param size: number of visits of every browser.
+    :type size: int
+    :param profiles: (optional) number of profiles of Chromium and Firefox.
+        Default value set to 2.
+    :type profiles: int
+    :param seed: (optional) seed of the random number generator. Default value
+        set to 0.
+    :type seed: int
+    """
+    home = Path(home)
+    chromium_dir = home / ".config/chromium"
+    firefox_dir = home / ".mozilla/firefox"
+    profile_names = ["Default"] + [f"Profile {i}" for i in range(1, profiles)]
+    for i, (name, count) in enumerate(zip(profile_names, _split(size, profiles))):
+        rng = random.Random(f"{seed}-chromium-{i}")
+        make_chromium_history(chromium_dir / name / "History", count, rng)
+        make_chromium_bookmarks(
+            chromium_dir / name / "Bookmarks", max(1, count // 100), rng
+        )
+    with open(chromium_dir / "Local State", "w") as local_state:
+        json.dump(
+            {"profile": {"info_cache": {name: {} for name in profile_names}}},
+            local_state,
+        )
+
+    profiles_ini = []
+    for i, count in enumerate(_split(size, profiles)):
+        rng = random.Random(f"{seed}-firefox-{i}")
+        profile_dir = f"bench{i:04d}.default-release"
+        make_firefox_places(
+            firefox_dir / profile_dir / "places.sqlite",
+            count,
+            max(1, count // 100),
+            rng,
+        )
+        profiles_ini.append(
+            f"[Profile{i}]\nName=bench{i}\nIsRelative=1\nPath={profile_dir}\n"
+        )
+    with open(firefox_dir / "profiles.ini", "w") as ini:
+        ini.write("\n".join(profiles_ini))
+
+    make_safari_history(
+        home / "Library/Safari/History.db", size, random.Random(f"{seed}-safari")
+    )
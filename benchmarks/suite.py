@@ -0,0 +1,285 @@
+"""This module defines the benchmarks and compares their results with a
+baseline.
+
+Every benchmark is run on the files generated by
+:py:func:`benchmarks.fixtures.generate`, with the home directory and the
+platform of the browser being measured patched in like in the tests. The
+stages of reading the history are measured on their own as well as
+:py:meth:`browser_history.generic.Browser.fetch_history` and
+:py:func:`browser_history.get_history` as a whole:
+
+* ``discovery``: finding the profiles of a browser.
+* ``snapshot.<strategy>``: taking snapshots of the history files.
+* ``query`` and ``query.sorted``: running the history query in SQLite.
+* ``decode``: converting the timestamps to datetimes.
+* ``merge``: merging the sorted histories of the profiles.
+* ``iter_history``, ``iter_history.sorted``, ``fetch_history`` and
+  ``fetch_bookmarks``: the API of a single browser.
+* ``get_history``: the history of all browsers of the platform.
+* ``write.<format>``: writing the output of ``get_history``.
+* ``export.<format>``: :py:meth:`browser_history.generic.Browser.export_history`.
+"""
+import contextlib
+import fnmatch
+import heapq
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from functools import partial
+from pathlib import Path
+from unittest import mock
+
+import browser_history
+from browser_history import browsers, generic
+
+# the browsers of the fixtures, along with the platform they are read on
+BROWSERS = [
+    ("Linux", browsers.Chromium),
+    ("Linux", browsers.Firefox),
+    ("Darwin", browsers.Safari),
+]
+
+SNAPSHOT_STRATEGIES = ("copy", "clone", "backup")
+
+
+@contextlib.contextmanager
+def emulate(home, system):
+    """Makes ``home`` the home directory and ``system`` the platform while in
+    the context."""
+    with mock.patch.object(Path, "home", lambda: Path(home)), mock.patch.object(
+        platform, "system", lambda: system
+    ):
+        yield
+
+
+def measure(func, repeat):
+    """Calls ``func`` ``repeat`` times and returns the number of rows it
+    returned and the times it took, in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = func()
+        times.append(time.perf_counter() - start)
+    return rows, times
+
+
+def _query(browser, paths, sort):
+    """Returns a function running the history query of ``browser`` on
+    ``paths`` and returning the number of rows, without decoding them."""
+
+    def query():
+        rows = 0
+        for path in paths:
+            conn = sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True)
+            cursor = conn.execute(*browser._history_query(sort, False))
+            for batch in generic._fetch_batches(cursor, browser.fetch_size):
+                rows += len(batch)
+            conn.close()
+        return rows
+
+    return query
+
+
+def _snapshot(browser, paths, strategy):
+    """Returns a function taking snapshots of ``paths`` with ``strategy`` and
+    returning their number."""
+
+    def snapshot():
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            for path in paths:
+                browser.snapshot_file(path, tempfile.mkdtemp(dir=tmpdirname), strategy)
+        return len(paths)
+
+    return snapshot
+
+
+def _decode(browser, paths):
+    """Returns a function decoding the timestamps of the history of ``browser``
+    in ``paths``, which are read first. Every call decodes them with a new
+    instance of the browser, which has not cached any UTC offsets yet."""
+    timestamps = []
+    for path in paths:
+        conn = sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True)
+        cursor = conn.execute(*browser._history_query(False, False))
+        timestamps += [row[0] for row in cursor]
+        conn.close()
+    return lambda: len(type(browser)()._decode_times(timestamps))
+
+
+def _merge(browser, paths):
+    """Returns a function merging the sorted histories of the profiles of
+    ``browser`` in ``paths``, which are read first."""
+    runs = [list(browser.iter_history([path], sort=True)) for path in paths]
+    return lambda: sum(1 for _ in heapq.merge(*runs))
+
+
+def _browser_benchmarks(browser_class):
+    """Yields the benchmarks of a single browser as ``(name, setup)`` tuples,
+    where ``setup()`` returns the function to measure. Must be called on the
+    platform of the browser.
+
+    The API is measured with a new instance of the browser every time, like a
+    program fetching the history once."""
+    browser = browser_class()
+    paths = browser.paths(profile_file=browser.history_file)
+    yield "discovery", lambda: lambda: len(
+        browser_class().paths(profile_file=browser_class.history_file)
+    )
+    for strategy in SNAPSHOT_STRATEGIES:
+        yield f"snapshot.{strategy}", partial(_snapshot, browser, paths, strategy)
+    yield "query", partial(_query, browser, paths, False)
+    yield "query.sorted", partial(_query, browser, paths, True)
+    yield "decode", partial(_decode, browser, paths)
+    yield "merge", partial(_merge, browser, paths)
+    yield "iter_history", lambda: lambda: sum(1 for _ in browser_class().iter_history())
+    yield "iter_history.sorted", lambda: lambda: sum(
+        1 for _ in browser_class().iter_history(sort=True)
+    )
+    yield "fetch_history", lambda: lambda: len(
+        browser_class().fetch_history().histories
+    )
+    if browser.bookmarks_file is not None:
+        yield "fetch_bookmarks", lambda: lambda: len(
+            browser_class().fetch_bookmarks().bookmarks
+        )
+    for output_format in ("csv", "jsonl"):
+        yield f"export.{output_format}", partial(_export, browser_class, output_format)
+
+
+def _export(browser_class, output_format):
+    """Returns a function exporting the history of ``browser_class`` as
+    ``output_format``. The number of rows is not known."""
+
+    def export():
+        with open(os.devnull, "w") as out_file:
+            browser_class().export_history(out_file, output_format, sort=False)
+        return None
+
+    return export
+
+
+def _write(outputs, output_format):
+    """Returns a function writing ``outputs`` as ``output_format`` and
+    returning the number of rows."""
+
+    def write():
+        with open(os.devnull, "w") as out_file:
+            outputs.write(out_file, output_format)
+        return len(outputs.histories)
+
+    return write
+
+
+def _all_benchmarks():
+    """Yields the benchmarks of all browsers like
+    :py:func:`_browser_benchmarks`. Must be called on Linux."""
+    yield "get_history", lambda: lambda: len(browser_history.get_history().histories)
+    outputs = None
+    for output_format in ("csv", "json", "jsonl"):
+
+        def setup(output_format=output_format):
+            nonlocal outputs
+            if outputs is None:
+                outputs = browser_history.get_history()
+            return _write(outputs, output_format)
+
+        yield f"write.{output_format}", setup
+
+
+def run(home, size, repeat=3, only=None, log=None):
+    """Runs the benchmarks on the fixtures in ``home`` generated with ``size``
+    visits.
+
+    :param home: the home directory of the fixtures.
+    :type home: :py:class:`pathlib.Path`
+    :param size: the size the fixtures were generated with.
+    :type size: int
+    :param repeat: (optional) number of times every benchmark is run. Default
+        value set to 3.
+    :type repeat: int
+    :param only: (optional) glob patterns of the benchmarks to run, matched
+        against ``<browser>.<name>`` (``all`` for ``get_history`` and the
+        outputs). Defaults to all benchmarks.
+    :type only: list(str)
+    :param log: (optional) file object to print the results to as they come.
+    :return: a list of results, with the ``name``, ``browser``, ``size``,
+        ``rows``, ``best`` and ``median`` time and all the ``times`` of every
+        benchmark.
+    :rtype: list(dict)
+    """
+    groups = [
+        (system, browser_class.name, partial(_browser_benchmarks, browser_class))
+        for system, browser_class in BROWSERS
+    ]
+    groups.append(("Linux", "all", _all_benchmarks))
+    results = []
+    for system, browser_name, benchmarks in groups:
+        with emulate(home, system):
+            for name, setup in benchmarks():
+                if only and not any(
+                    fnmatch.fnmatchcase(f"{browser_name}.{name}", pattern)
+                    for pattern in only
+                ):
+                    continue
+                rows, times = measure(setup(), repeat)
+                result = {
+                    "name": name,
+                    "browser": browser_name,
+                    "size": size,
+                    "rows": rows,
+                    "best": min(times),
+                    "median": statistics.median(times),
+                    "times": times,
+                }
+                results.append(result)
+                if log is not None:
+                    print(
+                        f"{browser_name:>10} {name:<20} {size:>10} "
+                        f"{result['best']:>10.4f}s {result['median']:>10.4f}s",
+                        file=log,
+                    )
+    return results
+
+
+def compare(results, baseline, threshold=1.25):
+    """Compares the best times of ``results`` with the same benchmarks of
+    ``baseline``.
+
+    :param results: results returned by :py:func:`run`.
+    :type results: list(dict)
+    :param baseline: results of an earlier run.
+    :type baseline: list(dict)
+    :param threshold: (optional) ratio of the times above which a benchmark
+        has regressed. Default value set to 1.25.
+    :type threshold: float
+    :return: the ``(result, ratio)`` of the benchmarks which are in both,
+        and the ones which regressed.
+    :rtype: tuple(list(tuple(dict, float)), list(tuple(dict, float)))
+    """
+    baseline_times = {
+        (result["name"], result["browser"], result["size"]): result["best"]
+        for result in baseline
+    }
+    compared = []
+    for result in results:
+        key = (result["name"], result["browser"], result["size"])
+        if baseline_times.get(key):
+            compared.append((result, result["best"] / baseline_times[key]))
+    return compared, [
+        (result, ratio) for result, ratio in compared if ratio > threshold
+    ]
+
+
+def environment():
+    """Returns a description of the environment the benchmarks run in."""
+    return {
+        "browser_history": browser_history.__version__,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "executable": sys.executable,
+    }
@@ -1,53 +1,376 @@
-from . import browsers, generic, utils  # noqa: F401
+import heapq
+import importlib
+import itertools
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from . import generic, stats, utils  # noqa: F401
 
 
 __version__ = "0.3.1"
 
+# submodules imported when first used, see __getattr__. The browsers are
+# imported by utils.get_browsers.
+_LAZY_MODULES = ("browsers", "store")
+
+
+def __getattr__(name):
+    """Imports the submodules of :py:data:`_LAZY_MODULES` when they are first
+    used, so that importing browser_history does not import them."""
+    if name in _LAZY_MODULES:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+if sys.version_info < (3, 7):
+    # modules have no __getattr__ before Python 3.7, importing the submodules
+    # sets them as attributes of the package
+    for _name in _LAZY_MODULES:
+        importlib.import_module(f".{_name}", __name__)
+
+
+def _browser_object(browser_class, fetch_type):
+    """Instantiates ``browser_class`` if it can be used to fetch
+    ``fetch_type`` on the current platform, otherwise logs why it cannot
+    and returns ``None``."""
+    try:
+        browser_object = browser_class()
+        if fetch_type == "bookmarks":
+            assert (
+                browser_object.bookmarks_file is not None
+            ), f"Bookmarks are not supported on {browser_class.name}"
+    except AssertionError as e:
+        if fetch_type == "history":
+            utils.logger.info("%s browser is not supported", browser_class.name)
+        else:
+            utils.logger.info("%s", e)
+        return None
+    return browser_object
+
+
+def _iter_browser(fetch_type, browser_class, **kwargs):
+    """Yields the ``fetch_type`` rows of a single browser class. ``kwargs``
+    are passed on to :py:meth:`browser_history.generic.Browser.iter_history`
+    or :py:meth:`browser_history.generic.Browser.iter_bookmarks`."""
+    browser_object = _browser_object(browser_class, fetch_type)
+    if browser_object is None:
+        return
+    if fetch_type == "history":
+        yield from browser_object.iter_history(**kwargs)
+    else:
+        yield from browser_object.iter_bookmarks(**kwargs)
+
+
+def _fetch_browser(fetch_type, browser_class, **kwargs):
+    """Returns the ``fetch_type`` rows of a single browser class as a list.
+
+    This is a module level function so that it can be sent to the workers of
+    a :py:class:`concurrent.futures.ProcessPoolExecutor`.
+    """
+    return list(_iter_browser(fetch_type, browser_class, **kwargs))
+
+
+def _fetch_all(
+    fetch_type,
+    workers=1,
+    processes=False,
+    sort=False,
+    desc=False,
+    limit=None,
+    **kwargs,
+):
+    """Yields the ``fetch_type`` rows of all browsers. ``kwargs`` are passed
+    on to every browser, see :py:func:`_iter_browser`.
+
+    If ``sort`` is set, every browser yields its rows in sorted order and
+    the browsers are combined with a k-way merge. Otherwise the rows are
+    yielded browser by browser in the order of
+    :py:func:`browser_history.utils.get_browsers`.
+
+    If ``limit`` is given, every browser returns at most ``limit`` rows and
+    only the first ``limit`` rows of the merge are yielded.
+
+    If ``workers`` is greater than 1 the browsers are fetched concurrently by
+    a pool of that many threads (or processes if ``processes`` is set).
+    """
+    browser_classes = utils.get_browsers()
+    combine = partial(heapq.merge, reverse=desc) if sort else itertools.chain
+    kwargs.update(sort=sort, desc=desc, limit=limit)
+    if workers <= 1:
+        yield from itertools.islice(
+            combine(
+                *(
+                    _iter_browser(fetch_type, browser_class, **kwargs)
+                    for browser_class in browser_classes
+                )
+            ),
+            limit,
+        )
+        return
+    executor_class = ThreadPoolExecutor
+    if processes:
+        # imported here since it imports multiprocessing, which is slow
+        from concurrent.futures import ProcessPoolExecutor
+
+        executor_class = ProcessPoolExecutor
+    with executor_class(max_workers=workers) as executor:
+        rows = generic._iter_concurrently(
+            executor,
+            partial(_fetch_browser, fetch_type, **kwargs),
+            browser_classes,
+            sort,
+            desc,
+        )
+        try:
+            yield from itertools.islice(rows, limit)
+        finally:
+            # the browsers which have not been fetched yet are skipped
+            rows.close()
+
+
+def _iter_store(**kwargs):
+    """Refreshes the persistent :py:class:`browser_history.store.HistoryStore`
+    and yields its history. ``kwargs`` are passed on to
+    :py:meth:`browser_history.store.HistoryStore.iter_history`."""
+    from . import store
+
+    with store.HistoryStore() as history_store:
+        history_store.refresh()
+        yield from history_store.iter_history(**kwargs)
+
+
+def iter_history(
+    sort=False,
+    since=None,
+    until=None,
+    url_filter=None,
+    workers=1,
+    processes=False,
+    use_store=False,
+    desc=False,
+    limit=None,
+):
+    """This method is used to lazily iterate over browser histories of all
+    available and supported browsers for the system platform.
+
+    Rows are yielded browser by browser (and profile by profile) without being
+    collected in memory, see :py:meth:`browser_history.generic.Browser.iter_history`.
+
+    :param sort: (optional) flag to specify if the output should be sorted.
+        The sorted history of every profile is merged as it is read.
+        Default value set to False.
+    :type sort: boolean
+    :param since: (optional) only return visits made at or after this time.
+    :type since: :py:class:`datetime.datetime`
+    :param until: (optional) only return visits made before this time.
+    :type until: :py:class:`datetime.datetime`
+    :param url_filter: (optional) only return visits to the URLs matching this
+        filter.
+    :type url_filter: :py:class:`browser_history.generic.UrlFilter`
+    :param workers: (optional) number of browsers to fetch concurrently. The
+        rows of every browser fetched by a worker are held in memory until
+        they are yielded. Default value set to 1.
+    :type workers: int
+    :param processes: (optional) flag to use a pool of processes instead of
+        threads when ``workers`` is greater than 1. Default value set to False.
+    :type processes: boolean
+    :param use_store: (optional) flag to read the history from the persistent
+        :py:class:`browser_history.store.HistoryStore`, see
+        :py:func:`get_history`. The history is then always sorted.
+        Default value set to False.
+    :type use_store: boolean
+    :param desc: (optional) flag to return the latest visits first
+        (Applicable if sort is True). Default value set to False.
+    :type desc: boolean
+    :param limit: (optional) maximum number of visits to return. If ``sort``
+        is set, these are the first visits in the sort order, and every
+        profile is only queried for that many visits.
+    :type limit: int
+    :rtype: iterator(tuple(:py:class:`datetime.datetime`, str))
+    """
+    if use_store:
+        return _iter_store(
+            since=since, until=until, url_filter=url_filter, desc=desc, limit=limit
+        )
+    return _fetch_all(
+        "history",
+        workers,
+        processes,
+        sort,
+        desc,
+        limit,
+        since=since,
+        until=until,
+        url_filter=url_filter,
+    )
+
 
-def get_history():
+def iter_bookmarks(sort=False, workers=1, processes=False, desc=False, limit=None):
+    """This method is used to lazily iterate over browser bookmarks of all
+    available and supported browsers for the system platform.
+
+    :param sort: (optional) flag to specify if the output should be sorted.
+        Default value set to False.
+    :type sort: boolean
+    :param workers: (optional) number of browsers to fetch concurrently.
+        Default value set to 1.
+    :type workers: int
+    :param processes: (optional) flag to use a pool of processes instead of
+        threads when ``workers`` is greater than 1. Default value set to False.
+    :type processes: boolean
+    :param desc: (optional) flag to return the latest bookmarks first
+        (Applicable if sort is True). Default value set to False.
+    :type desc: boolean
+    :param limit: (optional) maximum number of bookmarks to return.
+    :type limit: int
+    :rtype: iterator(tuple(:py:class:`datetime.datetime`, str, str, str))
+    """
+    return _fetch_all("bookmarks", workers, processes, sort, desc, limit)
+
+
+def get_history(
+    workers=1,
+    processes=False,
+    since=None,
+    until=None,
+    url_filter=None,
+    use_store=False,
+    columnar=False,
+    desc=False,
+    limit=None,
+):
     """This method is used to obtain browser histories of all available and
     supported browsers for the system platform.
 
+    :param workers: (optional) number of browsers to fetch concurrently.
+        Default value set to 1 (browsers are fetched one after the other).
+    :type workers: int
+    :param processes: (optional) flag to use a pool of processes instead of
+        threads when ``workers`` is greater than 1. Default value set to False.
+    :type processes: boolean
+    :param since: (optional) only return visits made at or after this time.
+        Naive datetimes are taken to be in the local timezone.
+    :type since: :py:class:`datetime.datetime`
+    :param until: (optional) only return visits made before this time.
+    :type until: :py:class:`datetime.datetime`
+    :param url_filter: (optional) only return visits to the URLs matching this
+        filter.
+    :type url_filter: :py:class:`browser_history.generic.UrlFilter`
+    :param use_store: (optional) flag to keep the history in the persistent
+        :py:class:`browser_history.store.HistoryStore`. The store is refreshed
+        with the visits added since the last call and the history is then read
+        from it. Default value set to False.
+    :type use_store: boolean
+    :param columnar: (optional) flag to return the history as compact
+        :py:class:`browser_history.generic.ColumnarRows`. Default value set to
+        False.
+    :type columnar: boolean
+    :param desc: (optional) flag to sort the latest visits first. Default
+        value set to False.
+    :type desc: boolean
+    :param limit: (optional) maximum number of visits to return, the first
+        ones in the sort order. For example, ``desc=True, limit=100`` returns
+        the latest 100 visits. Every profile is only queried for that many
+        visits.
+    :type limit: int
     :return: Object of class :py:class:`browser_history.generic.Outputs` with
         the data member histories set to
         list(tuple(:py:class:`datetime.datetime`, str))
 
     :rtype: :py:class:`browser_history.generic.Outputs`
     """
-    output_object = generic.Outputs(fetch_type="history")
-    browser_classes = utils.get_browsers()
-    for browser_class in browser_classes:
-        try:
-            browser_object = browser_class()
-            browser_output_object = browser_object.fetch_history()
-            output_object.histories.extend(browser_output_object.histories)
-        except AssertionError:
-            utils.logger.info("%s browser is not supported", browser_class.name)
-    output_object.histories.sort()
+    output_object = generic.Outputs(fetch_type="history", columnar=columnar)
+    with stats.span("get_history") as span:
+        output_object.histories.extend(
+            iter_history(
+                True,
+                since,
+                until,
+                url_filter,
+                workers,
+                processes,
+                use_store=use_store,
+                desc=desc,
+                limit=limit,
+            )
+        )
+        span.rows = len(output_object.histories)
     return output_object
 
 
-def get_bookmarks():
+def get_history_page(
+    page_size=500, token=None, desc=False, since=None, until=None, url_filter=None
+):
+    """This method is used to page through the browser histories of all
+    available and supported browsers for the system platform.
+
+    The first call returns the first page and a continuation token. Passing
+    the token back returns the next page, which every browser profile reads
+    from where the previous page ended instead of fetching the history
+    again. See :py:meth:`browser_history.generic.Browser.fetch_history_page`.
+
+    :param page_size: (optional) maximum number of visits in the page.
+        Default value set to 500.
+    :type page_size: int
+    :param token: (optional) token returned with the previous page. Defaults
+        to the first page.
+    :type token: str
+    :param desc: (optional) flag to page through the latest visits first. The
+        same value must be used for all pages. Default value set to False.
+    :type desc: boolean
+    :param since: (optional) only return visits made at or after this time.
+        Naive datetimes are taken to be in the local timezone.
+    :type since: :py:class:`datetime.datetime`
+    :param until: (optional) only return visits made before this time.
+    :type until: :py:class:`datetime.datetime`
+    :param url_filter: (optional) only return visits to the URLs matching this
+        filter.
+    :type url_filter: :py:class:`browser_history.generic.UrlFilter`
+    :return: Object of class :py:class:`browser_history.generic.Outputs` with
+        the data member histories set to the visits of the page, and the token
+        of the next page or ``None`` if this is the last one.
+    :rtype: tuple(:py:class:`browser_history.generic.Outputs`, str)
+    """
+    after = generic._decode_page_token(token) if token is not None else None
+    runs = []
+    for browser_class in utils.get_browsers():
+        browser_object = _browser_object(browser_class, "history")
+        if browser_object is not None:
+            runs.append(
+                browser_object.iter_history_keyset(
+                    after=after,
+                    desc=desc,
+                    since=since,
+                    until=until,
+                    url_filter=url_filter,
+                )
+            )
+    return generic._history_page(runs, page_size, desc)
+
+
+def get_bookmarks(workers=1, processes=False, columnar=False):
     """This method is used to obtain browser bookmarks of all available and
     supported browsers for the system platform.
 
+    :param workers: (optional) number of browsers to fetch concurrently.
+        Default value set to 1 (browsers are fetched one after the other).
+    :type workers: int
+    :param processes: (optional) flag to use a pool of processes instead of
+        threads when ``workers`` is greater than 1. Default value set to False.
+    :type processes: boolean
+    :param columnar: (optional) flag to return the bookmarks as compact
+        :py:class:`browser_history.generic.ColumnarRows`. Default value set to
+        False.
+    :type columnar: boolean
     :return: Object of class :py:class:`browser_history.generic.Outputs` with
         the data member bookmarks set to
         list(tuple(:py:class:`datetime.datetime`, str, str, str))
 
     :rtype: :py:class:`browser_history.generic.Outputs`
     """
-    output_object = generic.Outputs(fetch_type="bookmarks")
-    subclasses = utils.get_browsers()
-    for browser_class in subclasses:
-        try:
-            browser_object = browser_class()
-            assert (
-                browser_object.bookmarks_file is not None
-            ), f"Bookmarks are not supported on {browser_class.name}"
-            browser_output_object = browser_object.fetch_bookmarks()
-            output_object.bookmarks.extend(browser_output_object.bookmarks)
-        except AssertionError as e:
-            utils.logger.info("%s", e)
-    output_object.bookmarks.sort()
+    output_object = generic.Outputs(fetch_type="bookmarks", columnar=columnar)
+    with stats.span("get_bookmarks") as span:
+        output_object.bookmarks.extend(iter_bookmarks(True, workers, processes))
+        span.rows = len(output_object.bookmarks)
     return output_object
@@ -2,6 +2,7 @@
 
 All browsers must inherit from :py:mod:`browser_history.generic.Browser`.
 """
+import configparser
 import datetime
 import sqlite3
 
@@ -70,16 +71,21 @@ class Firefox(Browser):
     mac_path = "Library/Application Support/Firefox/Profiles/"
 
     profile_support = True
+    profile_registry = "profiles.ini"
 
     history_file = "places.sqlite"
     bookmarks_file = "places.sqlite"
 
+    history_epoch = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+    history_rev_host = True
+    history_visit_id = True
+
     history_SQL = """
         SELECT
-            datetime(
-                visit_date/1000000, 'unixepoch', 'localtime'
-            ) AS 'visit_time',
-            url
+            visit_date AS visit_time,
+            url,
+            rev_host,
+            moz_historyvisits.rowid AS visit_id
         FROM
             moz_historyvisits
         INNER JOIN
@@ -103,10 +109,7 @@ class Firefox(Browser):
 
         bookmarks_sql = """
             SELECT
-                datetime(
-                    moz_bookmarks.dateAdded/1000000,'unixepoch','localtime'
-                ) AS added_time,
-                url, moz_bookmarks.title, moz_folder.title
+                moz_bookmarks.dateAdded, url, moz_bookmarks.title, moz_folder.title
             FROM
                 moz_bookmarks JOIN moz_places, moz_bookmarks as moz_folder
             ON
@@ -116,22 +119,39 @@ class Firefox(Browser):
                 moz_bookmarks.dateAdded IS NOT NULL AND url LIKE 'http%'
                 AND moz_bookmarks.title IS NOT NULL
         """
-        conn = sqlite3.connect(f"file:{bookmark_path}?mode=ro", uri=True)
+        conn = sqlite3.connect(
+            f"file:{bookmark_path}?mode=ro&immutable=1&nolock=1", uri=True
+        )
         cursor = conn.cursor()
         cursor.execute(bookmarks_sql)
+        rows = cursor.fetchall()
         date_bookmarks = [
-            (
-                datetime.datetime.strptime(d, "%Y-%m-%d %H:%M:%S").replace(
-                    tzinfo=self._local_tz
-                ),
-                url,
-                title,
-                folder,
+            (d.replace(microsecond=0), url, title, folder)
+            for d, (_, url, title, folder) in zip(
+                self._decode_times([row[0] for row in rows]), rows
             )
-            for d, url, title, folder in cursor.fetchall()
         ]
         return date_bookmarks
 
+    def registered_profiles(self, registry_path):
+        """Returns the profile directories listed in Firefox's
+        ``profiles.ini`` file.
+
+        :param registry_path: the path of the ``profiles.ini`` file
+        :type registry_path: str
+        :rtype: list(str)
+        """
+        profiles_ini = configparser.ConfigParser(strict=False, interpolation=None)
+        try:
+            profiles_ini.read(registry_path, encoding="utf-8")
+        except configparser.Error as e:
+            raise ValueError(str(e)) from e
+        return [
+            section["Path"]
+            for name, section in profiles_ini.items()
+            if name.startswith("Profile") and "Path" in section
+        ]
+
 
 class Safari(Browser):
     """Apple Safari browser
@@ -151,20 +171,21 @@ class Safari(Browser):
 
     history_file = "History.db"
 
+    history_epoch = datetime.datetime(2001, 1, 1, tzinfo=datetime.timezone.utc)
+    history_time_unit = datetime.timedelta(seconds=1)
+    history_visit_id = True
+
     history_SQL = """
         SELECT
-            datetime(
-                visit_time + 978307200, 'unixepoch', 'localtime'
-            ) as visit_time,
-            url
+            history_visits.visit_time,
+            url,
+            history_visits.rowid AS visit_id
         FROM
             history_visits
         INNER JOIN
             history_items
         ON
             history_items.id = history_visits.history_item
-        ORDER BY
-            visit_time DESC
     """
 
 
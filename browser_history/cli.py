@@ -2,20 +2,145 @@
 command line interface of browser-history."""
 
 import argparse
+import datetime
+import os
+import re
 import sys
+from functools import partial
 
 from browser_history import (
     generic,
-    get_bookmarks,
-    get_history,
+    iter_bookmarks,
+    iter_history,
+    stats,
     utils,
     __version__,
 )
 
-# get list of all implemented browser by finding subclasses of generic.Browser
-AVAILABLE_BROWSERS = ", ".join(b.__name__ for b in utils.get_browsers())
-AVAILABLE_FORMATS = ", ".join(generic.Outputs(fetch_type=None).format_map.keys())
-AVAILABLE_TYPES = ", ".join(generic.Outputs(fetch_type=None).field_map.keys())
+
+def _browser_names():
+    # get list of all implemented browser by finding subclasses of generic.Browser
+    return [b.__name__ for b in utils.get_browsers()]
+
+
+def _format_names():
+    return list(generic.Outputs(fetch_type=None).format_map.keys())
+
+
+def _type_names():
+    return list(generic.Outputs(fetch_type=None).field_map.keys())
+
+
+# the names listed by AVAILABLE_BROWSERS, AVAILABLE_FORMATS and AVAILABLE_TYPES,
+# which are only looked up when they are used, see __getattr__
+_AVAILABLE_NAMES = {
+    "AVAILABLE_BROWSERS": _browser_names,
+    "AVAILABLE_FORMATS": _format_names,
+    "AVAILABLE_TYPES": _type_names,
+}
+
+
+def __getattr__(name):
+    """Returns ``AVAILABLE_BROWSERS``, ``AVAILABLE_FORMATS`` and
+    ``AVAILABLE_TYPES``, the comma separated names of the browsers, formats
+    and types."""
+    if name in _AVAILABLE_NAMES:
+        return ", ".join(_AVAILABLE_NAMES[name]())
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+if sys.version_info < (3, 7):
+    # modules have no __getattr__ before Python 3.7
+    globals().update((name, __getattr__(name)) for name in _AVAILABLE_NAMES)
+
+
+class _Names:
+    """Comma separated names which are only looked up when converted to a
+    string. Set as the ``names`` of an argument, they are filled in its help
+    string as ``%(names)s`` when the help is shown.
+
+    :param get_names: function returning the names.
+    :type get_names: callable
+    """
+
+    def __init__(self, get_names):
+        self.get_names = get_names
+
+    def __str__(self):
+        return ", ".join(self.get_names())
+
+
+RELATIVE_TIME_UNITS = {
+    "s": "seconds",
+    "m": "minutes",
+    "h": "hours",
+    "d": "days",
+    "w": "weeks",
+}
+
+ISO_TIME_FORMATS = (
+    "%Y-%m-%d",
+    "%Y-%m-%dT%H:%M",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S.%f",
+)
+
+
+def parse_time(value):
+    """Parses the argument of ``--since`` and ``--until``.
+
+    The value can either be a time in ISO 8601 format (like
+    ``2021-01-31T10:00:00``, naive times are in the local timezone) or a
+    duration before the current time (like ``30m``, ``2h`` or ``7d``).
+
+    :rtype: :py:class:`datetime.datetime`
+    """
+    match = re.fullmatch(r"(\d+)([smhdw])", value.strip())
+    if match:
+        amount, unit = match.groups()
+        return datetime.datetime.now().astimezone() - datetime.timedelta(
+            **{RELATIVE_TIME_UNITS[unit]: int(amount)}
+        )
+    # datetime.fromisoformat and the "+HH:MM" offsets of %z need Python 3.7
+    iso_time = re.sub(r"([+-]\d\d):(\d\d)$", r"\1\2", value.strip())
+    iso_time = re.sub(r"Z$", "+0000", iso_time).replace(" ", "T", 1)
+    for time_format in ISO_TIME_FORMATS:
+        for offset_format in ("", "%z"):
+            try:
+                return datetime.datetime.strptime(iso_time, time_format + offset_format)
+            except ValueError:
+                pass
+    raise argparse.ArgumentTypeError(
+        f"invalid time '{value}'. Should be an ISO 8601 time or a duration "
+        "like 30m, 2h or 7d"
+    )
+
+
+def _iter_store(browser_class, **kwargs):
+    """Refreshes the persistent store with the history of ``browser_class``
+    and yields it. ``kwargs`` are passed on to
+    :py:meth:`browser_history.store.HistoryStore.iter_history`."""
+    from browser_history import store
+
+    with store.HistoryStore() as history_store:
+        history_store.refresh([browser_class])
+        yield from history_store.iter_history(browsers=[browser_class.name], **kwargs)
+
+
+def positive_int(value):
+    """Parses the argument of ``--limit``.
+
+    :rtype: int
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number <= 0:
+        raise argparse.ArgumentTypeError(
+            f"invalid limit '{value}'. Should be a positive integer"
+        )
+    return number
 
 
 def make_parser():
@@ -35,32 +160,32 @@ def make_parser():
                 if you have any issues or want to help contribute""",
     )
 
-    parser_.add_argument(
+    type_argument = parser_.add_argument(
         "-t",
         "--type",
         default="history",
-        help=f"""
+        help="""
                 argument to decide whether to retrieve history or bookmarks.
-                Should be one of {AVAILABLE_TYPES}.
+                Should be one of %(names)s.
                 Default is history.""",
     )
-    parser_.add_argument(
+    browser_argument = parser_.add_argument(
         "-b",
         "--browser",
         default="all",
-        help=f"""
+        help="""
                 browser to retrieve history or bookmarks from. Should be one
-                of all, default, {AVAILABLE_BROWSERS}.
+                of all, default, %(names)s.
                 Default is all (gets history or bookmarks from all browsers).
                 """,
     )
 
-    parser_.add_argument(
+    format_argument = parser_.add_argument(
         "-f",
         "--format",
         default="infer",
-        help=f"""
-            Format to be used in output. Should be one of {AVAILABLE_FORMATS}.
+        help="""
+            Format to be used in output. Should be one of %(names)s.
             Default is infer (format is inferred from the output file's
             extension. If no output file (-o) is specified, it defaults to csv)""",
     )
@@ -84,21 +209,157 @@ def make_parser():
         """,
     )
 
-    parser_.add_argument(
+    show_profiles_argument = parser_.add_argument(
         "--show-profiles",
         default=None,
         metavar="BROWSER",
-        help=f"""
+        help="""
                 List all available profiles for a given browser where browser
-                can be one of default, {AVAILABLE_BROWSERS}. The browser
+                can be one of default, %(names)s. The browser
                 must always be provided.
         """,
     )
 
+    parser_.add_argument(
+        "--since",
+        default=None,
+        type=parse_time,
+        help="""
+                Only retrieve history visited at or after this time. Either an
+                ISO 8601 time (like 2021-01-31T10:00:00, in the local timezone
+                unless an offset is given) or a duration before now (like 30m,
+                2h or 7d). Only applies to history.
+        """,
+    )
+
+    parser_.add_argument(
+        "--until",
+        default=None,
+        type=parse_time,
+        help="""
+                Only retrieve history visited before this time. Same format as
+                --since. Only applies to history.
+        """,
+    )
+
+    url_filters = parser_.add_argument_group(
+        "URL filters",
+        """
+                Only retrieve history of the matching URLs. Each option can be
+                given more than once, a URL is retrieved if it matches any of
+                the --domain, --url-prefix, --url-glob or --url-like options
+                (or if none are given) and none of the --exclude options.
+        """,
+    )
+    url_filters.add_argument(
+        "--domain",
+        action="append",
+        default=[],
+        help="a domain, which also matches its subdomains",
+    )
+    url_filters.add_argument(
+        "--url-prefix",
+        action="append",
+        default=[],
+        help="a case-sensitive prefix of the URL, like https://github.com/pesos/",
+    )
+    url_filters.add_argument(
+        "--url-glob",
+        action="append",
+        default=[],
+        help="a case-sensitive GLOB pattern matching the URL, like '*/issues/*'",
+    )
+    url_filters.add_argument(
+        "--url-like",
+        action="append",
+        default=[],
+        help="a case-insensitive LIKE pattern matching the URL, like '%%wiki%%'",
+    )
+    url_filters.add_argument(
+        "--exclude-domain", action="append", default=[], metavar="DOMAIN"
+    )
+    url_filters.add_argument(
+        "--exclude-url-prefix", action="append", default=[], metavar="URL_PREFIX"
+    )
+    url_filters.add_argument(
+        "--exclude-url-glob", action="append", default=[], metavar="URL_GLOB"
+    )
+    url_filters.add_argument(
+        "--exclude-url-like", action="append", default=[], metavar="URL_LIKE"
+    )
+
+    parser_.add_argument(
+        "-l",
+        "--limit",
+        default=None,
+        type=positive_int,
+        help="""
+                Only output the first LIMIT history entries or bookmarks.
+                Every profile is only queried for LIMIT entries, combine with
+                --desc to get the latest ones.
+        """,
+    )
+
+    parser_.add_argument(
+        "--desc",
+        action="store_true",
+        help="""
+                Output the latest history entries or bookmarks first.
+        """,
+    )
+
+    parser_.add_argument(
+        "--store",
+        action="store_true",
+        help="""
+                Keep the history of the browsers in a persistent store (in
+                $XDG_CACHE_HOME/browser-history) and only read the visits added
+                since the last run from the browsers. Only applies to history.
+        """,
+    )
+
+    parser_.add_argument(
+        "-w",
+        "--workers",
+        default=1,
+        type=int,
+        help="""
+                Number of browsers (or profiles, if a single browser is
+                given) to fetch history or bookmarks from concurrently.
+                Default is 1 (everything is fetched one after the other).
+        """,
+    )
+
+    parser_.add_argument(
+        "--processes",
+        action="store_true",
+        help="""
+                Use a pool of processes instead of threads for --workers.
+        """,
+    )
+
+    parser_.add_argument(
+        "--stats",
+        nargs="?",
+        const="table",
+        choices=("table", "json"),
+        help="""
+                Print how long every phase of fetching took, per browser and
+                profile, to standard error when done. Either as a table (the
+                default) or as JSON.
+        """,
+    )
+
     parser_.add_argument(
         "-v", "--version", action="version", version="%(prog)s " + __version__
     )
 
+    # listed in the help strings only when the help is shown
+    type_argument.names = _Names(_type_names)
+    browser_argument.names = _Names(_browser_names)
+    show_profiles_argument.names = browser_argument.names
+    format_argument.names = _Names(_format_names)
+
     return parser_
 
 
@@ -130,18 +391,41 @@ def cli(args):
             print(profile)
         # ignore all other options and exit
         sys.exit(0)
-    outputs = None
-    fetch_map = {
-        "history": get_history,
-        "bookmarks": get_bookmarks,
+    iter_map = {
+        "history": iter_history,
+        "bookmarks": iter_bookmarks,
     }
 
-    if args.type not in fetch_map:
+    if args.type not in iter_map:
         utils.logger.critical(
             "Type %s is unavailable." " Check --help for available types", args.type
         )
         sys.exit(1)
 
+    if args.type != "history" and (args.since or args.until):
+        parser.error("--since and --until can only be used with history")
+
+    try:
+        url_filter = generic.UrlFilter(
+            args.domain,
+            args.url_prefix,
+            args.url_glob,
+            args.url_like,
+            args.exclude_domain,
+            args.exclude_url_prefix,
+            args.exclude_url_glob,
+            args.exclude_url_like,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    if args.type != "history" and url_filter:
+        parser.error("URL filters can only be used with history")
+
+    if args.store and args.type != "history":
+        parser.error("--store can only be used with history")
+    if args.store and args.profile is not None:
+        parser.error("--store cannot be used with --profile")
+
     if args.browser == "all" and args.profile is not None:
         # profiles are supported only for one browser at a time
         parser.error(
@@ -149,8 +433,21 @@ def cli(args):
             " or with --browser set to 'all'"
         )
 
+    collected = stats.Stats()
+    if args.stats:
+        collected.start()
+
+    fetch_options = {"desc": args.desc, "limit": args.limit}
+    if args.type == "history":
+        fetch_options.update(since=args.since, until=args.until, url_filter=url_filter)
+
+    export = None
     if args.browser == "all":
-        outputs = fetch_map[args.type]()
+        if args.store:
+            fetch_options["use_store"] = True
+        rows = iter_map[args.type](
+            sort=True, workers=args.workers, processes=args.processes, **fetch_options
+        )
     else:
         browser_class = utils.get_browser(args.browser)
         if browser_class is None:
@@ -183,25 +480,66 @@ def cli(args):
                 )
                 sys.exit(1)
             else:
-                # fetch_history and fetch_bookmarks require an array
+                # iter_history and iter_bookmarks require an array
                 profile = [profile]
 
-        if args.type == "history":
-            outputs = browser.fetch_history(profile)
+        if args.store:
+            rows = _iter_store(browser_class, **fetch_options)
+        elif args.type == "history":
+            rows = browser.iter_history(
+                profile, workers=args.workers, sort=True, **fetch_options
+            )
+            if args.workers <= 1:
+                export = partial(
+                    browser.export_history,
+                    history_paths=profile,
+                    sort=True,
+                    **fetch_options,
+                )
         elif args.type == "bookmarks":
-            outputs = browser.fetch_bookmarks(profile)
+            rows = browser.iter_bookmarks(
+                profile, workers=args.workers, sort=True, **fetch_options
+            )
 
+    # the rows are read from the browsers while the output is written, and
+    # reading stops as soon as the output does
+    outputs = generic.Outputs(fetch_type=args.type, rows=rows)
+    if export is not None:
+        # written straight from SQLite, see Browser.export_history
+        for output_format in ("csv", "jsonl"):
+            outputs.writer_map[output_format] = partial(
+                export, output_format=output_format
+            )
     try:
         if args.output is None:
             if args.format == "infer":
                 args.format = "csv"
-            print(outputs.formatted(args.format))
+            outputs.write(sys.stdout, args.format)
+            # like print, end the output with a newline
+            sys.stdout.write("\n")
+            sys.stdout.flush()
         elif args.output is not None:
             outputs.save(args.output, args.format)
 
+    except BrokenPipeError:
+        # the reader went away (like ``browser-history | head``). Stdout is
+        # flushed again at exit, which would fail too, so send it nowhere.
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        sys.exit(1)
     except ValueError as e:
         utils.logger.error(e)
         sys.exit(1)
+    finally:
+        # skips the profiles and browsers which have not been read yet and
+        # removes the snapshots
+        rows.close()
+        if args.stats:
+            collected.stop()
+            if args.stats == "json":
+                print(collected.to_json(), file=sys.stderr)
+            else:
+                print(collected.table(), file=sys.stderr)
 
 
 def main():
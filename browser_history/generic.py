@@ -4,26 +4,634 @@ This module defines the generic base class and the functionality.
 All browsers from :py:mod:`browser_history.browsers` inherit this class.
 """
 import abc
+import base64
 import csv
 import datetime
+import fnmatch
+import heapq
+import itertools
 import json
 import os
 import shutil
 import sqlite3
 import tempfile
+import threading
+import time
 import typing
-from collections import defaultdict
+from array import array
+from collections import OrderedDict, defaultdict
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 from io import StringIO
 from pathlib import Path
 from typing import Any, Callable, Dict, List, Tuple
 from urllib.parse import urlparse
 
+import browser_history.stats as stats
 import browser_history.utils as utils
 
 HistoryVar = List[Tuple[datetime.datetime, str]]
 BookmarkVar = List[Tuple[datetime.datetime, str, str, str]]
 
+_UNIX_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+_HOUR_MICROSECONDS = 3600 * 1000000
+
+
+def _fetch_batches(cursor, size):
+    """Yields lists of at most ``size`` rows from an executed ``cursor``
+    until it is exhausted."""
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+
+def _iter_concurrently(executor, func, items, sort, desc):
+    """Yields the rows of the lists returned by ``func(item)`` for every item
+    in ``items``, which are all submitted to ``executor`` up front. If
+    ``sort`` is set, the lists are sorted runs which are combined with a
+    k-way merge, otherwise they are yielded one after the other in the order
+    of ``items``.
+
+    Closing the generator cancels the items which have not started yet, so
+    that shutting down the ``executor`` only waits for the running ones."""
+    futures = [executor.submit(func, item) for item in items]
+    try:
+        results = (future.result() for future in futures)
+        if sort:
+            yield from heapq.merge(*results, reverse=desc)
+        else:
+            yield from itertools.chain.from_iterable(results)
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+SNAPSHOT_STRATEGIES = ("auto", "copy", "clone", "backup", "direct")
+"""Strategies that can be used to snapshot history and bookmark files, see
+:py:meth:`Browser.snapshot_file`."""
+
+_SQLITE_HEADER = b"SQLite format 3\x00"
+
+# ioctl request number of FICLONE on Linux, see ioctl_ficlone(2)
+_FICLONE = 0x40049409
+
+
+def _clone_file(src, dst):
+    """Creates ``dst`` as a clone of ``src`` without copying the data through
+    userspace: a reflink on copy-on-write filesystems (Btrfs, XFS, ...) or
+    an in-kernel ``copy_file_range``.
+
+    Returns ``False`` (and leaves no ``dst`` behind) if neither is supported.
+    """
+    try:
+        import fcntl  # pylint: disable=import-outside-toplevel
+    except ImportError:  # Windows
+        fcntl = None
+    with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(dst_file.fileno(), _FICLONE, src_file.fileno())
+                return True
+            except OSError:
+                pass
+        if hasattr(os, "copy_file_range"):
+            remaining = os.fstat(src_file.fileno()).st_size
+            try:
+                while remaining > 0:
+                    copied = os.copy_file_range(
+                        src_file.fileno(), dst_file.fileno(), remaining
+                    )
+                    if copied == 0:
+                        break
+                    remaining -= copied
+                else:
+                    return True
+            except OSError:
+                pass
+    os.remove(dst)
+    return False
+
+
+# sidecar files which hold the latest writes to an SQLite database. The -shm
+# file is an index which is rebuilt from the -wal file, so it is not needed.
+_SIDECAR_SUFFIXES = ("-wal", "-journal")
+
+
+def _clone_or_copy(src, dst):
+    """Clones ``src`` to ``dst`` if possible, otherwise copies it."""
+    if not _clone_file(src, dst):
+        shutil.copy2(src, dst)
+
+
+def _fingerprint(path):
+    """Returns ``(suffix, size, mtime_ns)`` of ``path`` (with an empty
+    suffix) followed by those of its existing sidecar files."""
+    fingerprint = []
+    for suffix in ("",) + _SIDECAR_SUFFIXES:
+        try:
+            stat = os.stat(f"{path}{suffix}")
+        except FileNotFoundError:
+            continue
+        fingerprint.append((suffix, stat.st_size, stat.st_mtime_ns))
+    return tuple(fingerprint)
+
+
+def _copy_consistent(path, snapshot_path, copy_file, attempts=3):
+    """Copies ``path`` and its sidecar files to ``snapshot_path`` with
+    ``copy_file`` and applies the sidecars to the copy, so the copy is a self
+    contained database with all the writes made to ``path``.
+
+    The copy is retried if the files change while they are being copied, as
+    the main file and its sidecars must be captured at the same moment.
+
+    :raises FileNotFoundError: if a file kept disappearing while it was
+        copied, in all ``attempts``.
+    :return: the :py:func:`_fingerprint` of the copied files
+    """
+    for attempt in range(attempts):
+        for suffix in _SIDECAR_SUFFIXES:
+            if os.path.exists(f"{snapshot_path}{suffix}"):
+                os.remove(f"{snapshot_path}{suffix}")
+        before = _fingerprint(path)
+        try:
+            for suffix, _, _ in before:
+                copy_file(f"{path}{suffix}", f"{snapshot_path}{suffix}")
+        except FileNotFoundError:
+            # a sidecar was removed by a checkpoint in the meantime
+            if attempt == attempts - 1:
+                raise
+            continue
+        after = _fingerprint(path)
+        if before == after:
+            break
+    else:
+        utils.logger.warning(
+            "%s kept changing while it was copied, its snapshot might be "
+            "inconsistent",
+            path,
+        )
+    if any(os.path.exists(f"{snapshot_path}{suffix}") for suffix in _SIDECAR_SUFFIXES):
+        # switching out of WAL mode checkpoints the -wal file into the copy
+        # and opening it rolls back a hot -journal, after which the sidecars
+        # are removed and the copy can be opened as immutable.
+        conn = sqlite3.connect(snapshot_path)
+        try:
+            conn.execute("PRAGMA journal_mode = DELETE")
+        finally:
+            conn.close()
+    return before
+
+
+# (browser class, browser path, profile file, prefixes, depth) ->
+# (paths looked at, their modification times, profile directories)
+_PROFILES_CACHE: typing.Dict[tuple, tuple] = {}
+
+
+def _mtimes(paths):
+    """Returns the modification times of ``paths``, or :py:class:`None` if one
+    of them does not exist anymore."""
+    try:
+        return tuple(os.stat(path).st_mtime_ns for path in paths)
+    except FileNotFoundError:
+        return None
+
+
+def _time_range(rows, since, until):
+    """Yields the ``rows`` with a timestamp (their first item) in
+    ``[since, until)``. Naive bounds are taken to be in the local timezone."""
+    if since is not None:
+        since = since.astimezone()
+    if until is not None:
+        until = until.astimezone()
+    for row in rows:
+        if (since is None or row[0] >= since) and (until is None or row[0] < until):
+            yield row
+
+
+def _encode_page_token(key):
+    """Encodes the page key ``(timestamp, browser, profile, visit id)`` of the
+    last visit of a page as an opaque, URL safe continuation token. The
+    timestamp is in microseconds since the Unix epoch and the visit id is the
+    URL for browsers without :py:attr:`Browser.history_visit_id`."""
+    return base64.urlsafe_b64encode(
+        json.dumps(list(key), separators=(",", ":")).encode()
+    ).decode("ascii")
+
+
+def _decode_page_token(token):
+    """Decodes a token from :py:func:`_encode_page_token` back to its page key.
+    Raises :py:class:`ValueError` if it is not a valid token."""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+    except (ValueError, AttributeError) as e:
+        raise ValueError(f"Invalid page token: {token!r}") from e
+    if not (
+        isinstance(key, list)
+        and len(key) == 4
+        and isinstance(key[0], int)
+        and isinstance(key[1], str)
+        and isinstance(key[2], str)
+        and isinstance(key[3], (int, str))
+    ):
+        raise ValueError(f"Invalid page token: {token!r}")
+    return tuple(key)
+
+
+def _history_page(runs, page_size, desc, tz=None):
+    """Merges the keyset ordered ``runs`` of ``(key, (datetime, url))`` rows
+    (see :py:meth:`Browser.iter_history_keyset`) and returns the first
+    ``page_size`` visits as an :py:class:`Outputs` object along with the
+    continuation token of the next page, or ``None`` if this is the last
+    page. The runs are closed afterwards."""
+    try:
+        rows = list(itertools.islice(heapq.merge(*runs, reverse=desc), page_size + 1))
+    finally:
+        for run in runs:
+            run.close()
+    output_object = Outputs("history", tz=tz)
+    output_object.histories.extend(row for _, row in rows[:page_size])
+    next_token = None
+    if len(rows) > page_size:
+        next_token = _encode_page_token(rows[page_size - 1][0])
+    return output_object, next_token
+
+
+def _in_use(path):
+    """Returns ``True`` if ``path`` is an SQLite database which looks like it
+    is held open by another process (usually the browser itself).
+
+    A database is considered in use if it has ``-wal``, ``-shm`` or
+    ``-journal`` sidecar files, or if it cannot be read because another
+    connection holds an exclusive lock on it. Files which are not SQLite
+    databases are never in use.
+    """
+    with open(path, "rb") as db_file:
+        header = db_file.read(20)
+    if not header.startswith(_SQLITE_HEADER):
+        return False
+    if any(
+        os.path.exists(f"{path}{suffix}") for suffix in _SIDECAR_SUFFIXES + ("-shm",)
+    ):
+        return True
+    if header[18] == 2:
+        # a read only connection to a WAL database creates the -wal and -shm
+        # files, so don't open it. Without them nobody has it open anyway.
+        return False
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=0)
+    try:
+        conn.execute("PRAGMA schema_version")
+    except sqlite3.OperationalError:
+        return True
+    finally:
+        conn.close()
+    return False
+
+
+# host (with the port, if any) of the ``url`` column
+_URL_HOST_SQL = (
+    "lower(substr(substr(url, instr(url, '://') + 3), 1,"
+    " instr(substr(url, instr(url, '://') + 3) || '/', '/') - 1))"
+)
+
+
+def _glob_escape(value):
+    """Escapes the special characters of an SQLite ``GLOB`` pattern."""
+    return "".join(f"[{char}]" if char in "*?[" else char for char in value)
+
+
+class _TimezoneConverter:
+    """Converts UTC timestamps to timezone-aware datetimes in ``tz`` (the
+    system's local timezone if ``None``), following its DST rules.
+
+    Converting to a timezone is slow, so the UTC offset of every hour is only
+    looked up once and cached. Within an hour with a single offset, every
+    timestamp is then converted with one addition. The rare hours in which
+    the offset changes are converted timestamp by timestamp.
+    """
+
+    def __init__(self, tz=None):
+        self.tz = tz
+        # hour since the Unix epoch -> (start of the hour as a datetime in
+        # ``tz``, its fold) or None if the offset changes within the hour
+        self._hours: typing.Dict[int, typing.Optional[tuple]] = {}
+
+    def _convert(self, micros):
+        """Converts a single timestamp without the cache."""
+        return (_UNIX_EPOCH + _MICROSECOND * micros).astimezone(self.tz)
+
+    def _hour(self, hour):
+        start = self._convert(hour * _HOUR_MICROSECONDS)
+        end = self._convert((hour + 1) * _HOUR_MICROSECONDS - 1)
+        if (start.utcoffset(), start.tzinfo, start.fold) == (
+            end.utcoffset(),
+            end.tzinfo,
+            end.fold,
+        ):
+            self._hours[hour] = (start, start.fold)
+        else:
+            self._hours[hour] = None
+        return self._hours[hour]
+
+    def datetimes(self, timestamps):
+        """Converts timestamps in microseconds since the Unix epoch.
+
+        :param timestamps: the timestamps, as integers.
+        :type timestamps: iterable(int)
+        :rtype: list(:py:class:`datetime.datetime`)
+        """
+        hours = self._hours
+        converted = []
+        for micros in timestamps:
+            hour, micros_in_hour = divmod(micros, _HOUR_MICROSECONDS)
+            try:
+                cached = hours[hour]
+            except KeyError:
+                cached = self._hour(hour)
+            if cached is None:
+                converted.append(self._convert(micros))
+                continue
+            start, fold = cached
+            # arithmetic on aware datetimes always resets the fold
+            timestamp = start + _MICROSECOND * micros_in_hour
+            converted.append(timestamp.replace(fold=1) if fold else timestamp)
+        return converted
+
+
+def _utc_offsets(tz, first, last):
+    """Returns the UTC offsets of ``tz`` (the system's local timezone if
+    ``None``) between the timestamps ``first`` and ``last``, in microseconds
+    since the Unix epoch, so that SQLite can format timestamps in ``tz``.
+
+    The offsets are returned as ``(start, offset, suffix)`` tuples sorted by
+    ``start``, the timestamp from which the ``offset`` (in microseconds)
+    applies, where ``suffix`` is how :py:meth:`datetime.datetime.isoformat`
+    writes it. The first one applies to all earlier timestamps too.
+
+    Looking up offsets is slow for some timezones, so the offset is only
+    looked up once a week and the seconds at which it changes are found by
+    bisection. A change which is undone within a week is missed.
+    """
+    second = 1000000
+    week = 7 * 86400 * second
+
+    def offset(micros):
+        local = (_UNIX_EPOCH + _MICROSECOND * micros).astimezone(tz)
+        return (
+            local.utcoffset() // _MICROSECOND,
+            local.replace(microsecond=0).isoformat()[19:],
+        )
+
+    low = first - first % second
+    current = offset(low)
+    offsets = [(-(1 << 63),) + current]
+    while low < last:
+        high = low + week
+        end = offset(high)
+        # the offset can change more than once in a week, every bisection
+        # finds the first change after low
+        while end != current:
+            changed = high
+            while changed - low > second:
+                middle = low + (changed - low) // 2 // second * second
+                if offset(middle) == current:
+                    low = middle
+                else:
+                    changed = middle
+            current = offset(changed)
+            offsets.append((changed,) + current)
+            low = changed
+        low = high
+    return offsets
+
+
+class UrlFilter:
+    """Filter on the URLs of the history, applied by SQLite while the history
+    is queried so that rows which do not match never leave the database.
+
+    A URL matches the filter if it matches any of the ``domains``,
+    ``prefixes``, ``globs`` or ``likes`` (or if none of them are given) and
+    none of the ``exclude_*`` rules.
+
+    :param domains: (optional) domains whose URLs are included. A domain also
+        includes all of its subdomains, ``example.com`` matches
+        ``https://www.example.com/``.
+    :type domains: list(str)
+    :param prefixes: (optional) case-sensitive URL prefixes, like
+        ``https://github.com/pesos/``.
+    :type prefixes: list(str)
+    :param globs: (optional) SQLite ``GLOB`` patterns matched against the
+        entire URL, like ``*/issues/*``. These are case-sensitive.
+    :type globs: list(str)
+    :param likes: (optional) SQLite ``LIKE`` patterns matched against the
+        entire URL, like ``%wiki%``. These ignore the case of ASCII characters.
+    :type likes: list(str)
+    :param exclude_domains: (optional) domains whose URLs are excluded.
+    :type exclude_domains: list(str)
+    :param exclude_prefixes: (optional) URL prefixes which are excluded.
+    :type exclude_prefixes: list(str)
+    :param exclude_globs: (optional) ``GLOB`` patterns which are excluded.
+    :type exclude_globs: list(str)
+    :param exclude_likes: (optional) ``LIKE`` patterns which are excluded.
+    :type exclude_likes: list(str)
+
+    Examples:
+
+    >>> url_filter = UrlFilter(domains=["github.com"], exclude_likes=["%/issues/%"])
+    >>> url_filter.where()[1]
+    ['*.github.com:*', '%/issues/%']
+    """
+
+    def __init__(
+        self,
+        domains=(),
+        prefixes=(),
+        globs=(),
+        likes=(),
+        exclude_domains=(),
+        exclude_prefixes=(),
+        exclude_globs=(),
+        exclude_likes=(),
+    ):
+        self.include = (tuple(domains), tuple(prefixes), tuple(globs), tuple(likes))
+        self.exclude = (
+            tuple(exclude_domains),
+            tuple(exclude_prefixes),
+            tuple(exclude_globs),
+            tuple(exclude_likes),
+        )
+        for rules in self.include + self.exclude:
+            if not all(rules):
+                raise ValueError("URL filter rules cannot be empty")
+
+    def __bool__(self):
+        return any(self.include + self.exclude)
+
+    def __repr__(self):
+        return f"UrlFilter(include={self.include!r}, exclude={self.exclude!r})"
+
+    @staticmethod
+    def _conditions(rules, rev_host):
+        """Returns the SQL conditions matching any of the ``rules`` and their
+        parameters."""
+        domains, prefixes, globs, likes = rules
+        conditions = []
+        params = []
+        for domain in domains:
+            domain = domain.strip(".").lower()
+            if rev_host:
+                # the reversed host ends with a ".", so this range includes
+                # the domain itself and all its subdomains
+                conditions.append("(rev_host >= ? AND rev_host < ?)")
+                reversed_domain = domain[::-1]
+                params.extend([f"{reversed_domain}.", f"{reversed_domain}/"])
+            else:
+                conditions.append(f"('.' || {_URL_HOST_SQL} || ':' GLOB ?)")
+                params.append(f"*.{_glob_escape(domain)}:*")
+        for prefix in prefixes:
+            # a range instead of LIKE or GLOB lets SQLite use an index on url
+            conditions.append("(url >= ? AND url < ?)")
+            params.extend([prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)])
+        conditions.extend("url GLOB ?" for _ in globs)
+        params.extend(globs)
+        conditions.extend("url LIKE ?" for _ in likes)
+        params.extend(likes)
+        return " OR ".join(conditions), params
+
+    def where(self, rev_host=False):
+        """Returns an SQL condition on the ``url`` column which is true for
+        the URLs matching the filter, along with its parameters.
+
+        :param rev_host: (optional) flag to match domains using a ``rev_host``
+            column holding the reversed host name (like Firefox's
+            ``moz_places.rev_host``) instead of extracting the host from the
+            URL. Default value set to False.
+        :type rev_host: boolean
+        :rtype: tuple(str, list)
+        """
+        clauses = []
+        params = []
+        include, include_params = self._conditions(self.include, rev_host)
+        if include:
+            clauses.append(f"({include})")
+            params.extend(include_params)
+        exclude, exclude_params = self._conditions(self.exclude, rev_host)
+        if exclude:
+            clauses.append(f"NOT ({exclude})")
+            params.extend(exclude_params)
+        return " AND ".join(clauses) or "1", params
+
+
+class FetchCache:
+    """An in-process LRU cache of the :py:class:`Outputs` returned by
+    :py:meth:`Browser.fetch_history` and :py:meth:`Browser.fetch_bookmarks`.
+
+    Entries are keyed on the browser, the profile files and the options of
+    the fetch, and hold the :py:func:`_fingerprint` (size and modification
+    time) of the files they were read from. A cached entry is only returned
+    while none of the files or their ``-wal`` and ``-journal`` files have
+    changed, so reusing it does not copy or query anything.
+
+    Every call gets its own copy of the cached :py:class:`Outputs`, which can
+    be modified freely.
+
+    :param max_entries: (optional) maximum number of cached fetches, the
+        least recently used ones are evicted first. Default value set to 32.
+    :type max_entries: int
+    :param max_rows: (optional) maximum total number of history and bookmark
+        rows held by the cache. Fetches with more rows than this are not
+        cached. Default value set to None (unbounded).
+    :type max_rows: int
+    :param ttl: (optional) number of seconds after which an entry expires even
+        if its files have not changed. Default value set to None (entries
+        never expire).
+    :type ttl: float
+
+    Examples:
+
+    >>> Browser.fetch_cache = FetchCache(max_rows=1000000, ttl=300)
+    """
+
+    hits: int
+    """Number of fetches served from the cache."""
+
+    misses: int
+    """Number of fetches which were not cached or whose entry was stale."""
+
+    def __init__(self, max_entries=32, max_rows=None, ttl=None):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # key -> (fingerprint, time of the fetch, outputs, number of rows)
+        self._entries: typing.Dict[Any, tuple] = OrderedDict()
+        self._rows = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _copy(outputs):
+        copy = Outputs(outputs.fetch_type, outputs.columnar, outputs.tz)
+        copy.histories.extend(outputs.histories)
+        copy.bookmarks.extend(outputs.bookmarks)
+        return copy
+
+    def _remove(self, key):
+        _, _, _, rows = self._entries.pop(key)
+        self._rows -= rows
+
+    def get(self, key, fingerprint):
+        """Returns a copy of the :py:class:`Outputs` cached for ``key``, or
+        :py:class:`None` if there is none, it was read from files with another
+        ``fingerprint`` or it expired.
+
+        :rtype: union[:py:class:`Outputs`, None]
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                cached_fingerprint, fetched_at, outputs, _ = entry
+                expired = (
+                    self.ttl is not None and time.monotonic() - fetched_at > self.ttl
+                )
+                if cached_fingerprint == fingerprint and not expired:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._copy(outputs)
+                self._remove(key)
+            self.misses += 1
+            return None
+
+    def put(self, key, fingerprint, outputs):
+        """Caches a copy of ``outputs`` for ``key``, evicting the least
+        recently used entries to stay within :py:attr:`max_entries` and
+        :py:attr:`max_rows`."""
+        rows = len(outputs.histories) + len(outputs.bookmarks)
+        if self.max_rows is not None and rows > self.max_rows:
+            return
+        entry = (fingerprint, time.monotonic(), self._copy(outputs), rows)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._rows += rows
+            while len(self._entries) > self.max_entries or (
+                self.max_rows is not None and self._rows > self.max_rows
+            ):
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        """Removes all entries from the cache. The counters are kept."""
+        with self._lock:
+            self._entries.clear()
+            self._rows = 0
+
 
 class Browser(abc.ABC):
     """A generic class to support all major browsers with minimal
@@ -48,11 +656,12 @@ class Browser(abc.ABC):
     * :py:class:`bookmarks_parser`
     * :py:class:`profile_support`
     * :py:class:`profile_dir_prefixes`
-    * :py:class:`_local_tz`
+    * :py:class:`tz`
     * :py:class:`aliases`: A tuple containing other names for the browser in lowercase
 
     :param plat: the current platform. A value of :py:class:`None` means the platform
        will be inferred from the system.
+    :param tz: the timezone of the returned datetimes, overriding :py:attr:`tz`.
 
     Examples:
 
@@ -68,8 +677,8 @@ class Browser(abc.ABC):
     ...     \"\"\"
     ...     linux_path = 'browser'
     ...
-    ... vars(CustomBrowser())
-    {'profile_dir_prefixes': [], 'history_dir': PosixPath('/home/username/browser')}
+    ... CustomBrowser().history_dir
+    PosixPath('/home/username/browser')
     """
 
     windows_path: typing.Optional[str] = None  #: browser path on Windows.
@@ -80,27 +689,117 @@ class Browser(abc.ABC):
     """Boolean indicating whether the browser supports multiple profiles."""
 
     profile_dir_prefixes: typing.Optional[typing.List[typing.Any]] = None
-    """List of possible prefixes for the profile directories.
-    Keep empty to check all subdirectories in the browser path.
+    """List of possible prefixes for the profile directories, as glob
+    patterns (like ``Profile*``) matched against the directories directly in
+    the browser path. Keep empty to check all subdirectories in the browser
+    path.
     """
 
+    profile_max_depth: int = 2
+    """Number of directory levels below the browser path searched for
+    profiles by :py:meth:`profiles`."""
+
+    profile_skip_dirs: typing.FrozenSet[str] = frozenset(
+        {
+            "Cache",
+            "Code Cache",
+            "GPUCache",
+            "GrShaderCache",
+            "ShaderCache",
+            "Service Worker",
+            "Extensions",
+            "IndexedDB",
+            "Local Storage",
+            "Session Storage",
+            "File System",
+            "blob_storage",
+            "Crashpad",
+            "Safe Browsing",
+            "cache2",
+            "crashes",
+            "datareporting",
+            "minidumps",
+            "startupCache",
+            "storage",
+            "thumbnails",
+        }
+    )
+    """Names of directories which never contain profiles, like caches. They
+    are not searched by :py:meth:`profiles`."""
+
+    profile_registry: typing.Optional[str] = None
+    """Name of the file in which the browser lists its profiles (like
+    Chromium's ``Local State``), looked up in the browser path and its parent
+    directory. If set, :py:meth:`registered_profiles` must parse it."""
+
     bookmarks_file: typing.Optional[str] = None
     """Name of the (SQLite, JSON or PLIST) file which stores the bookmarks."""
 
-    _local_tz: typing.Optional[datetime.tzinfo] = (
-        datetime.datetime.now().astimezone().tzinfo
-    )
-    """Gets a datetime object of the current time as per the users timezone."""
+    tz: typing.Optional[datetime.tzinfo] = None
+    """Timezone of the returned datetimes, for example a
+    :py:class:`zoneinfo.ZoneInfo`. A value of :py:class:`None` means the
+    system's local timezone. Either way, every datetime gets the UTC offset
+    in effect at that time, so visits on both sides of a DST transition are
+    correct."""
 
     history_dir: Path
     """History directory."""
 
+    fetch_size: int = 1000
+    """Number of rows pulled from the SQLite cursor at a time by
+    :py:meth:`iter_history`."""
+
+    snapshot: str = "auto"
+    """Default strategy used to snapshot the history and bookmark files before
+    they are read. One of :py:data:`SNAPSHOT_STRATEGIES`, see
+    :py:meth:`snapshot_file`."""
+
+    snapshot_dir: typing.Optional[str] = None
+    """Directory in which snapshots are created, for example a tmpfs mount.
+    A value of :py:class:`None` uses the system's temporary directory."""
+
+    fetch_cache: typing.Optional[FetchCache] = None
+    """:py:class:`FetchCache` used by :py:meth:`fetch_history` and
+    :py:meth:`fetch_bookmarks` to return the previous result while the
+    profile files have not changed. A value of :py:class:`None` disables
+    caching. Set it on :py:class:`Browser` to share a cache between all
+    browsers."""
+
     aliases: tuple = ()
     """Gets possible names (lower-cased) used to refer to the browser type.
     Useful for making the browser detectable as a default browser which may be
     named in various forms on different platforms. Do not include :py:class:`name`
     in this list"""
 
+    history_epoch: typing.Optional[datetime.datetime] = None
+    """Start of the epoch of the visit timestamps stored in the
+    ``history_file``, as a timezone-aware datetime. If set, along with
+    :py:attr:`history_time_unit`, the ``visit_time`` returned by the
+    :py:attr:`history_SQL` must be the stored visit timestamp itself.
+    Timestamps are then decoded with arithmetic instead of string parsing
+    (keeping their microseconds), and the ``since`` and ``until`` arguments
+    of :py:meth:`fetch_history` are compared with them in SQL, which lets
+    SQLite use an index on the column instead of reading the entire
+    history."""
+
+    history_time_unit: datetime.timedelta = datetime.timedelta(microseconds=1)
+    """Unit of the visit timestamps stored in the ``history_file``, see
+    :py:attr:`history_epoch`."""
+
+    history_rev_host: bool = False
+    """Boolean indicating whether the :py:attr:`history_SQL` also returns the
+    reversed host name of every URL (like ``moz_places.rev_host``) as a
+    ``rev_host`` column. If set, the domains of a :py:class:`UrlFilter` are
+    looked up using it instead of being extracted from the URL."""
+
+    history_visit_id: bool = False
+    """Boolean indicating whether the :py:attr:`history_SQL` also returns an
+    identifier of every visit which is unique within the ``history_file``
+    (like the ``rowid`` of ``moz_historyvisits``) as a ``visit_id`` column.
+    It orders the visits made at the same time when paging through the
+    history with :py:meth:`iter_history_keyset`, which uses the URL
+    otherwise."""
+
     @property
     @abc.abstractmethod
     def name(self) -> str:
@@ -116,14 +815,32 @@ class Browser(abc.ABC):
     def history_SQL(self) -> str:
         """SQL query required to extract history from the ``history_file``.
         The query must return two columns: ``visit_time`` and ``url``.
-        The ``visit_time`` must be processed using the `datetime`_
-        function with the modifier ``localtime``.
+        The ``visit_time`` must be the timestamp stored in the database if
+        :py:attr:`history_epoch` is set. Otherwise it must be processed using
+        the `datetime`_ function with the modifier ``localtime``. The query
+        should not contain an ``ORDER BY`` clause, rows are ordered as needed
+        when the history is fetched. See :py:attr:`history_rev_host` and
+        :py:attr:`history_visit_id` for the optional ``rev_host`` and
+        ``visit_id`` columns.
 
             .. _datetime: https://www.sqlitetutorial.net/sqlite-date-functions/sqlite-datetime-function/
         """  # pylint: disable=line-too-long # noqa: E501
 
-    def __init__(self, plat: typing.Optional[utils.Platform] = None):
-        self.profile_dir_prefixes = []
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # the index of utils.get_browsers is built again with the new class
+        utils._browser_index = None
+
+    def __init__(
+        self,
+        plat: typing.Optional[utils.Platform] = None,
+        tz: typing.Optional[datetime.tzinfo] = None,
+    ):
+        self.profile_dir_prefixes = list(self.profile_dir_prefixes or [])
+        self._snapshot_fingerprints: typing.Dict[str, tuple] = {}
+        if tz is not None:
+            self.tz = tz
+        self._timezone_converter = _TimezoneConverter(self.tz)
         if plat is None:
             plat = utils.get_platform()
         homedir = Path.home()
@@ -151,11 +868,107 @@ class Browser(abc.ABC):
     ):  # pylint: disable=assignment-from-no-return
         """A function to parse bookmarks and convert to readable format."""
 
+    def registered_profiles(self, registry_path) -> typing.List[str]:
+        """Parses the :py:attr:`profile_registry` file of the browser.
+
+        :param registry_path: the path of the :py:attr:`profile_registry`
+        :type registry_path: str
+        :return: the profile directories listed in the file, relative to the
+            directory containing it (or absolute).
+        :rtype: list(str)
+        """
+        raise NotImplementedError()
+
+    def _is_profile_dir(self, profile_dir):
+        """Checks a profile directory (relative to :py:attr:`history_dir`)
+        against :py:attr:`profile_dir_prefixes`."""
+        top_dir = Path(profile_dir).parts[:1]
+        return not top_dir or any(
+            fnmatch.fnmatchcase(top_dir[0], prefix)
+            for prefix in self.profile_dir_prefixes
+        )
+
+    def _read_profile_registry(self, profile_file):
+        """Returns the profile directories listed by the
+        :py:attr:`profile_registry` which contain ``profile_file``, along with
+        the paths which were looked at. Returns :py:class:`None` if there is no
+        registry or it cannot be read."""
+        if self.profile_registry is None:
+            return None
+        history_dir = str(self.history_dir)
+        for registry_dir in (history_dir, os.path.dirname(history_dir)):
+            registry_path = os.path.join(registry_dir, self.profile_registry)
+            if os.path.isfile(registry_path):
+                break
+        else:
+            return None
+        try:
+            registered = self.registered_profiles(registry_path)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            utils.logger.info("Could not read %s: %s", registry_path, e)
+            return None
+        profile_dirs = []
+        watched = [registry_path]
+        for registered_dir in registered:
+            profile_dir = os.path.relpath(
+                os.path.join(registry_dir, registered_dir), history_dir
+            )
+            if profile_dir == os.curdir:
+                profile_dir = ""
+            if profile_dir.startswith(os.pardir) or not self._is_profile_dir(
+                profile_dir
+            ):
+                continue
+            watched.append(os.path.join(history_dir, profile_dir))
+            if os.path.isfile(os.path.join(history_dir, profile_dir, profile_file)):
+                profile_dirs.append(profile_dir)
+        if not profile_dirs:
+            return None
+        return profile_dirs, watched
+
+    def _scan_profiles(self, profile_file):
+        """Returns the directories containing ``profile_file`` up to
+        :py:attr:`profile_max_depth` levels below :py:attr:`history_dir`,
+        along with the directories which were scanned.
+
+        Only the directories matching :py:attr:`profile_dir_prefixes` are
+        searched, and :py:attr:`profile_skip_dirs` are pruned."""
+        history_dir = str(self.history_dir)
+        profile_dirs = []
+        scanned = []
+        pending = [("", 0)]
+        while pending:
+            profile_dir, depth = pending.pop()
+            path = os.path.join(history_dir, profile_dir)
+            scanned.append(path)
+            try:
+                entries = list(os.scandir(path))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.name == profile_file and entry.is_file():
+                    profile_dirs.append(profile_dir)
+                elif (
+                    depth < self.profile_max_depth
+                    and entry.name not in self.profile_skip_dirs
+                    and entry.is_dir(follow_symlinks=False)
+                ):
+                    sub_dir = os.path.join(profile_dir, entry.name)
+                    if depth > 0 or self._is_profile_dir(sub_dir):
+                        pending.append((sub_dir, depth + 1))
+        return profile_dirs, scanned
+
     def profiles(self, profile_file) -> typing.List[str]:
         """Returns a list of profile directories. If the browser is supported
         on the current
         platform but is not installed an empty list will be returned
 
+        The profiles listed in the :py:attr:`profile_registry` are used if it
+        exists. Otherwise the browser path is searched (see
+        :py:attr:`profile_max_depth`, :py:attr:`profile_dir_prefixes` and
+        :py:attr:`profile_skip_dirs`). The result is cached until one of the
+        directories it was found in changes.
+
         :param profile_file: file to search for in the profile directories.
             This should be either ``history_file`` or ``bookmarks_file``.
         :type profile_file: str
@@ -168,17 +981,27 @@ class Browser(abc.ABC):
             return []
         if not self.profile_support:
             return ["."]
-        profile_dirs = []
-        for files in os.walk(str(self.history_dir)):
-            for item in files[2]:
-                if os.path.split(os.path.join(files[0], item))[-1] == profile_file:
-                    path = str(files[0]).split(str(self.history_dir), maxsplit=1)[-1]
-                    if path.startswith(os.sep):
-                        path = path[1:]
-                    if path.endswith(os.sep):
-                        path = path[:-1]
-                    profile_dirs.append(path)
-        return profile_dirs
+        key = (
+            type(self),
+            str(self.history_dir),
+            profile_file,
+            tuple(self.profile_dir_prefixes or ()),
+            self.profile_max_depth,
+        )
+        cached = _PROFILES_CACHE.get(key)
+        if cached is not None:
+            watched, mtimes, profile_dirs = cached
+            if mtimes is not None and _mtimes(watched) == mtimes:
+                return list(profile_dirs)
+        found = self._read_profile_registry(profile_file)
+        if found is None:
+            found = self._scan_profiles(profile_file)
+        profile_dirs, watched = found
+        # the registry can change without changing the directory listing
+        watched = [str(self.history_dir)] + watched
+        profile_dirs = sorted(profile_dirs)
+        _PROFILES_CACHE[key] = (watched, _mtimes(watched), profile_dirs)
+        return list(profile_dirs)
 
     def history_path_profile(self, profile_dir: Path) -> typing.Optional[Path]:
         """Returns path of the history file for the given ``profile_dir``
@@ -215,10 +1038,13 @@ class Browser(abc.ABC):
 
         :rtype: list(:py:class:`pathlib.Path`)
         """
-        return [
-            self.history_dir / profile_dir / profile_file
-            for profile_dir in self.profiles(profile_file=profile_file)
-        ]
+        with stats.span("discovery", self.name) as span:
+            paths = [
+                self.history_dir / profile_dir / profile_file
+                for profile_dir in self.profiles(profile_file=profile_file)
+            ]
+            span.rows = len(paths)
+        return paths
 
     def history_profiles(self, profile_dirs):
         """Returns history of profiles given by `profile_dirs`.
@@ -236,16 +1062,828 @@ class Browser(abc.ABC):
         ]
         return self.fetch_history(history_paths)
 
-    def fetch_history(self, history_paths=None, sort=True, desc=False):
+    def snapshot_file(self, path, tmpdirname, strategy=None):
+        """Takes a snapshot of the history or bookmark file at ``path`` which
+        can be read while the browser keeps using the original.
+
+        The following strategies are supported:
+
+        * ``copy``: copy the file to ``tmpdirname``, along with its ``-wal``
+          and ``-journal`` files. These hold the latest writes of the browser
+          and are applied to the copy, so that no recent visits are missed.
+        * ``clone``: like ``copy``, but the files are cloned with a reflink or
+          ``copy_file_range``, which is nearly free on copy-on-write
+          filesystems. Falls back to copying if cloning is not supported.
+        * ``backup``: copy an SQLite database with the SQLite online backup
+          API, which gives a consistent snapshot even while the database is
+          being written to. Falls back to ``copy`` for files that are not
+          SQLite databases or cannot be read.
+        * ``direct``: don't take a snapshot, the original file is read
+          (without its ``-wal`` file). This must only be used when the
+          browser is not running.
+        * ``auto``: ``direct`` if the file does not look like it is in use by
+          the browser, otherwise ``clone``.
+
+        :param path: path of the file.
+        :type path: :py:class:`pathlib.Path`
+        :param tmpdirname: directory in which the snapshot is created.
+        :type tmpdirname: str
+        :param strategy: (optional) one of :py:data:`SNAPSHOT_STRATEGIES`.
+            Defaults to :py:attr:`snapshot`.
+        :type strategy: str
+        :return: path of the snapshot (which is ``path`` itself for ``direct``)
+        :rtype: str
+
+        Use :py:meth:`snapshot_staleness` to check how up to date the snapshot
+        is.
+        """
+        if strategy is None:
+            strategy = self.snapshot
+        if strategy not in SNAPSHOT_STRATEGIES:
+            raise ValueError(
+                f"Invalid snapshot strategy {strategy}. Should be one of "
+                f"{', '.join(SNAPSHOT_STRATEGIES)}"
+            )
+        path = os.path.abspath(path)
+        with stats.span("snapshot", self.name, path) as span:
+            snapshot_path = self._snapshot_file(path, tmpdirname, strategy)
+            span.nbytes = 0
+            if snapshot_path != path:
+                for suffix in ("",) + _SIDECAR_SUFFIXES:
+                    if os.path.exists(snapshot_path + suffix):
+                        span.nbytes += os.path.getsize(snapshot_path + suffix)
+        return snapshot_path
+
+    def _snapshot_file(self, path, tmpdirname, strategy):
+        """Takes a snapshot of the file at the absolute ``path`` with
+        ``strategy``, see :py:meth:`snapshot_file`."""
+        if strategy == "auto":
+            strategy = "clone" if _in_use(path) else "direct"
+        if strategy == "direct":
+            # the sidecar files are not read when the original is opened
+            self._snapshot_fingerprints[path] = _fingerprint(path)[:1]
+            return path
+        snapshot_path = os.path.join(tmpdirname, os.path.basename(path))
+        if strategy == "backup":
+            fingerprint = _fingerprint(path)
+            try:
+                with open(path, "rb") as db_file:
+                    assert db_file.read(16) == _SQLITE_HEADER
+                # without a browser using the database, nothing can change
+                # during the backup. Opening it as immutable then avoids
+                # leaving -wal and -shm files next to it.
+                params = "mode=ro" if _in_use(path) else "mode=ro&immutable=1"
+                src = sqlite3.connect(f"file:{path}?{params}", uri=True)
+                dst = sqlite3.connect(snapshot_path)
+                try:
+                    src.backup(dst)
+                    self._snapshot_fingerprints[path] = fingerprint
+                    return snapshot_path
+                finally:
+                    dst.close()
+                    src.close()
+            # Connection.backup needs Python 3.7
+            except (AssertionError, AttributeError, sqlite3.Error) as e:
+                utils.logger.info(
+                    "Could not back up %s, copying it instead: %s", path, e
+                )
+                if os.path.exists(snapshot_path):
+                    os.remove(snapshot_path)
+        copy_file = _clone_or_copy if strategy == "clone" else shutil.copy2
+        self._snapshot_fingerprints[path] = _copy_consistent(
+            path, snapshot_path, copy_file
+        )
+        return snapshot_path
+
+    def snapshot_staleness(self, path) -> typing.Optional[datetime.timedelta]:
+        """Returns how far the last snapshot taken of the file at ``path`` is
+        behind the file itself.
+
+        This is the time between the last write contained in the snapshot and
+        the last write to the file or its ``-wal`` and ``-journal`` files.
+        It is zero if the snapshot is up to date, and grows if the browser
+        wrote to the file after the snapshot was taken or if the snapshot did
+        not include the ``-wal`` file (which is the case for ``direct``).
+
+        :param path: path of the history or bookmark file.
+        :type path: :py:class:`pathlib.Path`
+        :return: the staleness or :py:class:`None` if no snapshot of ``path``
+            has been taken.
+        :rtype: union[:py:class:`datetime.timedelta`, None]
+        """
+        captured = self._snapshot_fingerprints.get(os.path.abspath(path))
+        if not captured:
+            return None
+        last_captured = max(mtime_ns for _, _, mtime_ns in captured)
+        last_written = max(mtime_ns for _, _, mtime_ns in _fingerprint(path))
+        return datetime.timedelta(
+            microseconds=max(0, last_written - last_captured) // 1000
+        )
+
+    def _iter_profiles(
+        self, paths, parse, workers, sort, desc, snapshot_dir, limit=None
+    ):
+        """Yields the rows of ``parse(path, tmpdirname, sort, desc)`` for every
+        path in ``paths``, up to ``limit`` rows in total.
+
+        Each profile gets its own temporary directory, created in
+        ``snapshot_dir`` (or :py:attr:`snapshot_dir` if it is not given).
+        If ``sort`` is set, ``parse`` returns a sorted run per profile and the
+        runs are combined with a k-way merge, otherwise the profiles are
+        yielded one after the other in the order of ``paths``.
+
+        If ``workers`` is greater than 1, that many profiles are parsed
+        concurrently by a pool of threads and the rows of a profile are
+        collected in its worker.
+        """
+        if snapshot_dir is None:
+            snapshot_dir = self.snapshot_dir
+        combine = partial(heapq.merge, reverse=desc) if sort else itertools.chain
+        with tempfile.TemporaryDirectory(dir=snapshot_dir) as tmpdirname:
+
+            def parse_profile(path):
+                return parse(path, tempfile.mkdtemp(dir=tmpdirname), sort, desc)
+
+            if workers <= 1:
+                yield from itertools.islice(combine(*map(parse_profile, paths)), limit)
+                return
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                rows = _iter_concurrently(
+                    executor,
+                    lambda path: list(parse_profile(path)),
+                    paths,
+                    sort,
+                    desc,
+                )
+                try:
+                    yield from itertools.islice(rows, limit)
+                finally:
+                    rows.close()
+
+    def _native_time(self, timestamp):
+        """Converts a :py:class:`datetime.datetime` to the units of
+        :py:attr:`history_epoch` and :py:attr:`history_time_unit`. Naive
+        datetimes are taken to be in the local timezone."""
+        ticks, remainder = divmod(
+            timestamp.astimezone() - self.history_epoch, self.history_time_unit
+        )
+        if remainder:
+            return (timestamp.astimezone() - self.history_epoch) / (
+                self.history_time_unit
+            )
+        return ticks
+
+    def _history_conditions(self, since, until, url_filter):
+        """Returns the SQL conditions on :py:attr:`history_SQL` for the
+        ``since`` and ``until`` bounds (if :py:attr:`history_epoch` is set)
+        and the ``url_filter``, along with their parameters."""
+        conditions = []
+        params = []
+        if self.history_epoch is not None:
+            if since is not None:
+                conditions.append("visit_time >= ?")
+                params.append(self._native_time(since))
+            if until is not None:
+                conditions.append("visit_time < ?")
+                params.append(self._native_time(until))
+        if url_filter:
+            condition, filter_params = url_filter.where(self.history_rev_host)
+            conditions.append(condition)
+            params.extend(filter_params)
+        return conditions, params
+
+    def _history_query(
+        self, sort, desc, since=None, until=None, url_filter=None, limit=None
+    ):
+        """Returns a query selecting ``visit_time`` and ``url`` from
+        :py:attr:`history_SQL` and its parameters, with the ``since`` and
+        ``until`` bounds on ``visit_time`` if :py:attr:`history_epoch` is
+        set and the conditions of the ``url_filter``, ordered by
+        ``visit_time`` (and then ``url``) if ``sort`` is set and returning at
+        most ``limit`` rows."""
+        conditions, params = self._history_conditions(since, until, url_filter)
+        query = f"SELECT visit_time, url FROM ({self.history_SQL.strip().rstrip(';')})"
+        if conditions:
+            query += f" WHERE {' AND '.join(conditions)}"
+        if sort:
+            order = "DESC" if desc else "ASC"
+            query += f" ORDER BY visit_time {order}, url {order}"
+        if limit is not None:
+            # with an index on visit_time, SQLite only reads about ``limit``
+            # rows. Without the native timestamps, the bounds are only
+            # applied afterwards in Python and all rows are needed.
+            if self.history_epoch is not None or (since is None and until is None):
+                query += " LIMIT ?"
+                params.append(limit)
+        return query, params
+
+    def _history_keyset_query(self, desc, since, until, url_filter, after):
+        """Returns a query selecting ``visit_time``, ``url`` and the visit id
+        (or the URL again) from :py:attr:`history_SQL` in keyset order, along
+        with its parameters. See :py:meth:`_history_query` for ``since``,
+        ``until`` and ``url_filter``.
+
+        If ``after`` (a page key) is given, only the visits from its time on
+        (or up to it, if ``desc`` is set) are selected, so that SQLite can
+        seek to it with an index on ``visit_time``. The stored timestamps can
+        be fractional, so the bound has a microsecond of slack and the exact
+        position is checked by :py:meth:`_iter_history_keyset_profile`."""
+        conditions, params = self._history_conditions(since, until, url_filter)
+        if after is not None and self.history_epoch is not None:
+            position = _UNIX_EPOCH + _MICROSECOND * after[0]
+            if desc:
+                conditions.append("visit_time <= ?")
+                params.append(self._native_time(position + _MICROSECOND))
+            else:
+                conditions.append("visit_time >= ?")
+                params.append(self._native_time(position - _MICROSECOND))
+        visit_id = "visit_id" if self.history_visit_id else "url"
+        query = (
+            f"SELECT visit_time, url, {visit_id} "
+            f"FROM ({self.history_SQL.strip().rstrip(';')})"
+        )
+        if conditions:
+            query += f" WHERE {' AND '.join(conditions)}"
+        order = "DESC" if desc else "ASC"
+        query += f" ORDER BY visit_time {order}, {visit_id} {order}"
+        return query, params
+
+    def _history_export_query(
+        self, sort, desc, since, until, url_filter, limit, separator
+    ):
+        """Returns a query selecting the visits of :py:attr:`history_SQL` as
+        ``(timestamp, url)`` rows where the timestamp is already formatted
+        like :py:meth:`datetime.datetime.isoformat` with ``separator`` in
+        :py:attr:`tz`, along with its parameters. See :py:meth:`_history_query`
+        for the other arguments.
+
+        The UTC offsets are looked up in the ``temp.utc_offsets`` table (see
+        :py:func:`_utc_offsets`), which must be created on the connection.
+        This needs :py:attr:`history_epoch`."""
+        conditions, params = self._history_conditions(since, until, url_filter)
+        offset = (self.history_epoch - _UNIX_EPOCH) // _MICROSECOND
+        unit = self.history_time_unit // _MICROSECOND
+        # fractional timestamps are rounded like _decode_times does
+        utc = (
+            f"CASE typeof(visit_time) WHEN 'integer' "
+            f"THEN {offset} + visit_time * {unit} "
+            f"ELSE CAST(round({offset} + visit_time * {unit}) AS INTEGER) END"
+        )
+        query = (
+            f"SELECT {utc} AS utc, visit_time, url "
+            f"FROM ({self.history_SQL.strip().rstrip(';')})"
+        )
+        if conditions:
+            query += f" WHERE {' AND '.join(conditions)}"
+        # CROSS JOIN keeps the visits as the outer loop, so that every visit
+        # looks up its offset once
+        query = (
+            f"SELECT utc + shift AS local, suffix, visit_time, url FROM ({query}) "
+            "CROSS JOIN temp.utc_offsets ON start = "
+            "(SELECT max(start) FROM temp.utc_offsets WHERE start <= utc)"
+        )
+        fraction = "((local % 1000000 + 1000000) % 1000000)"
+        timestamp = (
+            f"strftime('%Y-%m-%d{separator}%H:%M:%S', "
+            f"(local - {fraction}) / 1000000, 'unixepoch') "
+            f"|| CASE {fraction} WHEN 0 THEN '' "
+            f"ELSE printf('.%06d', {fraction}) END || suffix"
+        )
+        query = f"SELECT {timestamp}, url FROM ({query})"
+        if sort:
+            order = "DESC" if desc else "ASC"
+            query += f" ORDER BY visit_time {order}, url {order}"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        return query, params
+
+    def _decode_times(self, timestamps):
+        """Converts a batch of ``visit_time`` values returned by
+        :py:attr:`history_SQL` to timezone-aware datetimes.
+
+        Timestamps stored since :py:attr:`history_epoch` are decoded with
+        integer arithmetic, which is much faster than formatting and parsing
+        strings and keeps their microseconds, and then converted to
+        :py:attr:`tz`.
+
+        :rtype: list(:py:class:`datetime.datetime`)
+        """
+        if self.history_epoch is None:
+            # naive datetimes are in the system's local timezone
+            return [
+                datetime.datetime.strptime(d, "%Y-%m-%d %H:%M:%S").astimezone(self.tz)
+                for d in timestamps
+            ]
+        offset = (self.history_epoch - _UNIX_EPOCH) // _MICROSECOND
+        unit = self.history_time_unit // _MICROSECOND
+        return self._timezone_converter.datetimes(
+            round(offset + unit * timestamp) for timestamp in timestamps
+        )
+
+    def _iter_history_profile(
+        self,
+        history_path,
+        tmpdirname,
+        sort,
+        desc,
+        snapshot=None,
+        since=None,
+        until=None,
+        url_filter=None,
+        limit=None,
+    ):
+        """Yields the history of a single profile after taking a ``snapshot``
+        of its ``history_path`` in ``tmpdirname``."""
+        snapshot_path = self.snapshot_file(history_path, tmpdirname, snapshot)
+        query = stats.Span("query", self.name, history_path)
+        decode = stats.Span("decode", self.name, history_path)
+        decode.rows = 0
+        conn = sqlite3.connect(
+            f"file:{snapshot_path}?mode=ro&immutable=1&nolock=1", uri=True
+        )
+        try:
+            start = time.perf_counter()
+            cursor = conn.cursor()
+            cursor.execute(
+                *self._history_query(sort, desc, since, until, url_filter, limit)
+            )
+            query.seconds += time.perf_counter() - start
+            rows = itertools.chain.from_iterable(
+                self._decoded_batches(cursor, query, decode)
+            )
+            if self.history_epoch is None and (since or until):
+                # the timestamps cannot be compared in SQL
+                rows = _time_range(rows, since, until)
+            yield from itertools.islice(rows, limit)
+        finally:
+            conn.close()
+            query.rows = decode.rows
+            stats.record(query)
+            stats.record(decode)
+
+    def _decoded_batches(self, cursor, query, decode):
+        """Yields the ``(visit_time, url)`` rows of ``cursor`` in batches of
+        :py:attr:`fetch_size`, with the times decoded by
+        :py:meth:`_decode_times`. The time spent fetching and decoding the
+        rows is added to the ``query`` and ``decode`` spans."""
+        batches = _fetch_batches(cursor, self.fetch_size)
+        while True:
+            start = time.perf_counter()
+            batch = next(batches, None)
+            fetched = time.perf_counter()
+            query.seconds += fetched - start
+            if batch is None:
+                return
+            datetimes = self._decode_times([visit_time for visit_time, _ in batch])
+            decode.seconds += time.perf_counter() - fetched
+            decode.rows += len(batch)
+            yield zip(datetimes, (url for _, url in batch))
+
+    def _iter_history_keyset_profile(
+        self,
+        history_path,
+        tmpdirname,
+        sort,
+        desc,
+        snapshot=None,
+        since=None,
+        until=None,
+        url_filter=None,
+        after=None,
+    ):
+        """Yields the ``(key, (datetime, url))`` history rows of a single
+        profile in keyset order, starting after the page key ``after``. See
+        :py:meth:`iter_history_keyset`."""
+        snapshot_path = self.snapshot_file(history_path, tmpdirname, snapshot)
+        conn = sqlite3.connect(
+            f"file:{snapshot_path}?mode=ro&immutable=1&nolock=1", uri=True
+        )
+        profile = str(history_path)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                *self._history_keyset_query(desc, since, until, url_filter, after)
+            )
+            rows = (
+                (
+                    ((visit_time - _UNIX_EPOCH) // _MICROSECOND, self.name)
+                    + (profile, visit_id),
+                    (visit_time, url),
+                )
+                for batch in _fetch_batches(cursor, self.fetch_size)
+                for visit_time, (_, url, visit_id) in zip(
+                    self._decode_times([row[0] for row in batch]), batch
+                )
+            )
+            if self.history_epoch is None and (since or until):
+                # the timestamps cannot be compared in SQL
+                rows = (
+                    row
+                    for row in rows
+                    if (since is None or row[1][0] >= since.astimezone())
+                    and (until is None or row[1][0] < until.astimezone())
+                )
+            if after is not None:
+                # skip the rows up to the exact position of the previous page
+                if desc:
+                    rows = itertools.dropwhile(lambda row: row[0] >= after, rows)
+                else:
+                    rows = itertools.dropwhile(lambda row: row[0] <= after, rows)
+            yield from rows
+        finally:
+            conn.close()
+
+    def _iter_history_after_id(self, history_paths, after_id=None, ranges=()):
+        """Yields the history of ``history_paths`` whose visit id (see
+        :py:attr:`history_visit_id`) is greater than ``after_id`` or in one of
+        the ``(first, last)`` ``ranges`` of ids, one
+        ``(visit_id, (datetime, url))`` tuple at a time. The visits of every
+        range and then the ones after ``after_id`` are yielded in order of
+        their ids. This is how :py:class:`browser_history.store.HistoryStore`
+        reads the visits added since it was last refreshed."""
+        return self._iter_profiles(
+            history_paths,
+            partial(
+                self._iter_history_after_id_profile, after_id=after_id, ranges=ranges
+            ),
+            1,
+            False,
+            False,
+            None,
+        )
+
+    def _iter_history_after_id_profile(
+        self, history_path, tmpdirname, sort, desc, after_id=None, ranges=()
+    ):
+        """Yields the ``(visit_id, (datetime, url))`` history rows of a single
+        profile in ``ranges`` and after ``after_id``. See
+        :py:meth:`_iter_history_after_id`."""
+        snapshot_path = self.snapshot_file(history_path, tmpdirname)
+        conn = sqlite3.connect(
+            f"file:{snapshot_path}?mode=ro&immutable=1&nolock=1", uri=True
+        )
+        select = (
+            "SELECT visit_time, url, visit_id "
+            f"FROM ({self.history_SQL.strip().rstrip(';')})"
+        )
+        # a query per range, so that SQLite seeks to every range by id
+        conditions = [
+            ("visit_id BETWEEN ? AND ?", [first, last]) for first, last in ranges
+        ]
+        if after_id is None:
+            conditions.append(("1", []))
+        else:
+            conditions.append(("visit_id > ?", [after_id]))
+        try:
+            cursor = conn.cursor()
+            for condition, params in conditions:
+                cursor.execute(f"{select} WHERE {condition} ORDER BY visit_id", params)
+                for batch in _fetch_batches(cursor, self.fetch_size):
+                    datetimes = self._decode_times([row[0] for row in batch])
+                    yield from (
+                        (visit_id, (visit_time, url))
+                        for visit_time, (_, url, visit_id) in zip(datetimes, batch)
+                    )
+        finally:
+            conn.close()
+
+    def _iter_bookmarks_profile(
+        self, bookmarks_path, tmpdirname, sort, desc, snapshot=None
+    ):
+        """Yields the bookmarks of a single profile after taking a ``snapshot``
+        of its ``bookmarks_path`` in ``tmpdirname``."""
+        if not os.path.exists(bookmarks_path):
+            return
+        snapshot_path = self.snapshot_file(bookmarks_path, tmpdirname, snapshot)
+        with stats.span("parse", self.name, bookmarks_path) as span:
+            bookmarks = self.bookmarks_parser(snapshot_path)
+            span.rows = len(bookmarks)
+        if sort:
+            with stats.span("sort", self.name, bookmarks_path) as span:
+                bookmarks = sorted(bookmarks, reverse=desc)
+                span.rows = len(bookmarks)
+        yield from bookmarks
+
+    def iter_history(
+        self,
+        history_paths=None,
+        workers=1,
+        sort=False,
+        desc=False,
+        snapshot=None,
+        snapshot_dir=None,
+        since=None,
+        until=None,
+        url_filter=None,
+        limit=None,
+    ):
+        """Yields history of all available profiles stored in SQL, one
+        ``(datetime, url)`` tuple at a time.
+
+        Rows are pulled from the SQLite cursor in batches of
+        :py:attr:`fetch_size` so that memory usage does not grow with the
+        size of the history. Unless ``sort`` is set, the rows are yielded in
+        the order returned by :py:attr:`history_SQL`, profile by profile.
+
+        If ``sort`` is set, every profile is queried in order and the sorted
+        runs are merged as they are read, so the output is sorted without
+        holding the history in memory. This needs the history files of all
+        profiles to be open at the same time.
+
+        A snapshot of every history file is taken before it is queried (see
+        :py:meth:`snapshot_file`). The snapshots are removed once the
+        generator is exhausted or closed.
+
+        :param history_paths: (optional) a list of history files.
+        :type history_paths: list(:py:class:`pathlib.Path`)
+        :param workers: (optional) number of profiles to fetch concurrently.
+            Each profile fetched by a worker is held in memory until it is
+            yielded. Default value set to 1.
+        :type workers: int
+        :param sort: (optional) flag to specify if the output should be
+            sorted. Default value set to False.
+        :type sort: boolean
+        :param desc: (optional)  flag to specify asc/desc
+            (Applicable if sort is True) Default value set to False.
+        :type desc: boolean
+        :param snapshot: (optional) strategy used to snapshot the files, one
+            of :py:data:`SNAPSHOT_STRATEGIES`. Defaults to :py:attr:`snapshot`.
+        :type snapshot: str
+        :param snapshot_dir: (optional) directory in which the snapshots are
+            created. Defaults to :py:attr:`snapshot_dir`.
+        :type snapshot_dir: str
+        :param since: (optional) only return visits made at or after this
+            time. Naive datetimes are taken to be in the local timezone.
+        :type since: :py:class:`datetime.datetime`
+        :param until: (optional) only return visits made before this time.
+        :type until: :py:class:`datetime.datetime`
+        :param url_filter: (optional) only return visits to the URLs matching
+            this filter.
+        :type url_filter: :py:class:`UrlFilter`
+        :param limit: (optional) maximum number of visits to return. If
+            ``sort`` is set, these are the first visits in the sort order, so
+            ``desc=True`` gives the latest ones. Every profile is only queried
+            for that many rows, which SQLite can read from an index without
+            going through the entire history.
+        :type limit: int
+        :rtype: iterator(tuple(:py:class:`datetime.datetime`, str))
+        """
+        if history_paths is None:
+            history_paths = self.paths(profile_file=self.history_file)
+        return self._iter_profiles(
+            history_paths,
+            partial(
+                self._iter_history_profile,
+                snapshot=snapshot,
+                since=since,
+                until=until,
+                url_filter=url_filter,
+                limit=limit,
+            ),
+            workers,
+            sort,
+            desc,
+            snapshot_dir,
+            limit,
+        )
+
+    def _iter_history_export_profile(
+        self,
+        history_path,
+        tmpdirname,
+        sort,
+        desc,
+        snapshot=None,
+        since=None,
+        until=None,
+        url_filter=None,
+        limit=None,
+        separator="T",
+    ):
+        """Yields the history of a single profile in batches of
+        ``(timestamp, url)`` rows formatted by SQLite, after taking a
+        ``snapshot`` of its ``history_path`` in ``tmpdirname``. See
+        :py:meth:`_history_export_query`."""
+        snapshot_path = self.snapshot_file(history_path, tmpdirname, snapshot)
+        query = stats.Span("query", self.name, history_path)
+        query.rows = 0
+        conn = sqlite3.connect(
+            f"file:{snapshot_path}?mode=ro&immutable=1&nolock=1", uri=True
+        )
+        try:
+            start = time.perf_counter()
+            conn.execute(
+                "CREATE TEMP TABLE utc_offsets "
+                "(start INTEGER PRIMARY KEY, shift INTEGER, suffix TEXT)"
+            )
+            first, last = conn.execute(
+                "SELECT min(visit_time), max(visit_time) "
+                f"FROM ({self.history_SQL.strip().rstrip(';')})"
+            ).fetchone()
+            if first is not None:
+                offset = (self.history_epoch - _UNIX_EPOCH) // _MICROSECOND
+                unit = self.history_time_unit // _MICROSECOND
+                conn.executemany(
+                    "INSERT INTO utc_offsets VALUES (?, ?, ?)",
+                    _utc_offsets(
+                        self.tz,
+                        round(offset + unit * first),
+                        round(offset + unit * last),
+                    ),
+                )
+            cursor = conn.execute(
+                *self._history_export_query(
+                    sort, desc, since, until, url_filter, limit, separator
+                )
+            )
+            batches = _fetch_batches(cursor, self.fetch_size)
+            while True:
+                batch = next(batches, None)
+                query.seconds += time.perf_counter() - start
+                if batch is None:
+                    return
+                query.rows += len(batch)
+                yield batch
+                start = time.perf_counter()
+        finally:
+            conn.close()
+            stats.record(query)
+
+    def iter_history_keyset(
+        self,
+        history_paths=None,
+        after=None,
+        desc=False,
+        workers=1,
+        snapshot=None,
+        snapshot_dir=None,
+        since=None,
+        until=None,
+        url_filter=None,
+    ):
+        """Yields the history of all available profiles in keyset order, one
+        ``(key, (datetime, url))`` tuple at a time, where ``key`` is the page
+        key ``(timestamp, browser name, history path, visit id)`` of the
+        visit. The timestamp is in microseconds since the Unix epoch and the
+        visit id is the URL if :py:attr:`history_visit_id` is not set.
+
+        Every visit has a distinct key, so the history can be paged through
+        by passing the key of the last visit of a page as ``after``. Each
+        profile then resumes from it with a condition on ``visit_time`` in
+        SQL, instead of reading and skipping the previous pages. This is used
+        by :py:meth:`fetch_history_page`.
+
+        :param history_paths: (optional) a list of history files.
+        :type history_paths: list(:py:class:`pathlib.Path`)
+        :param after: (optional) page key after which the visits start (or
+            before which, if ``desc`` is set).
+        :type after: tuple(int, str, str, int or str)
+        :param desc: (optional) flag to return the latest visits first.
+            Default value set to False.
+        :type desc: boolean
+        :param workers: (optional) number of profiles to fetch concurrently,
+            see :py:meth:`iter_history`. Default value set to 1.
+        :type workers: int
+        :param snapshot: (optional) strategy used to snapshot the files, one
+            of :py:data:`SNAPSHOT_STRATEGIES`. Defaults to :py:attr:`snapshot`.
+        :type snapshot: str
+        :param snapshot_dir: (optional) directory in which the snapshots are
+            created. Defaults to :py:attr:`snapshot_dir`.
+        :type snapshot_dir: str
+        :param since: (optional) only return visits made at or after this
+            time. Naive datetimes are taken to be in the local timezone.
+        :type since: :py:class:`datetime.datetime`
+        :param until: (optional) only return visits made before this time.
+        :type until: :py:class:`datetime.datetime`
+        :param url_filter: (optional) only return visits to the URLs matching
+            this filter.
+        :type url_filter: :py:class:`UrlFilter`
+        :rtype: iterator(tuple(tuple, tuple(:py:class:`datetime.datetime`, str)))
+        """
+        if history_paths is None:
+            history_paths = self.paths(profile_file=self.history_file)
+        return self._iter_profiles(
+            history_paths,
+            partial(
+                self._iter_history_keyset_profile,
+                snapshot=snapshot,
+                since=since,
+                until=until,
+                url_filter=url_filter,
+                after=after,
+            ),
+            workers,
+            True,
+            desc,
+            snapshot_dir,
+        )
+
+    def iter_bookmarks(
+        self,
+        bookmarks_paths=None,
+        workers=1,
+        sort=False,
+        desc=False,
+        snapshot=None,
+        snapshot_dir=None,
+        limit=None,
+    ):
+        """Yields bookmarks of all available profiles, one
+        ``(datetime, url, title, folder)`` tuple at a time.
+
+        Like :py:meth:`iter_history`, a snapshot of every bookmark file is
+        taken before it is parsed by :py:meth:`bookmarks_parser`.
+        If ``sort`` is set, the bookmarks of every profile are sorted and then
+        merged.
+
+        :param bookmarks_paths: (optional) a list of bookmark files.
+        :type bookmarks_paths: list(:py:class:`pathlib.Path`)
+        :param workers: (optional) number of profiles to fetch concurrently.
+            Default value set to 1.
+        :type workers: int
+        :param sort: (optional) flag to specify if the output should be
+            sorted. Default value set to False.
+        :type sort: boolean
+        :param desc: (optional)  flag to specify asc/desc
+            (Applicable if sort is True) Default value set to False.
+        :type desc: boolean
+        :param snapshot: (optional) strategy used to snapshot the files, one
+            of :py:data:`SNAPSHOT_STRATEGIES`. Defaults to :py:attr:`snapshot`.
+        :type snapshot: str
+        :param snapshot_dir: (optional) directory in which the snapshots are
+            created. Defaults to :py:attr:`snapshot_dir`.
+        :type snapshot_dir: str
+        :param limit: (optional) maximum number of bookmarks to return.
+        :type limit: int
+        :rtype: iterator(tuple(:py:class:`datetime.datetime`, str, str, str))
+        """
+        assert (
+            self.bookmarks_file is not None
+        ), "Bookmarks are not supported for {} browser".format(self.name)
+        if bookmarks_paths is None:
+            bookmarks_paths = self.paths(profile_file=self.bookmarks_file)
+        return self._iter_profiles(
+            bookmarks_paths,
+            partial(self._iter_bookmarks_profile, snapshot=snapshot),
+            workers,
+            sort,
+            desc,
+            snapshot_dir,
+            limit,
+        )
+
+    def _fetch_cached(self, fetch_type, profile_file, paths, options, fetch):
+        """Returns ``fetch(paths)``, or its result cached in
+        :py:attr:`fetch_cache` for the same ``fetch_type``, ``paths`` (all
+        ``profile_file`` files if not given) and ``options`` if the files at
+        ``paths`` have not changed since."""
+        cache = self.fetch_cache
+        if cache is None or profile_file is None:
+            return fetch(paths)
+        if paths is None:
+            paths = self.paths(profile_file=profile_file)
+        paths = [os.path.abspath(path) for path in paths]
+        key = (self.name, fetch_type, tuple(paths), self.tz, options)
+        fingerprint = tuple(_fingerprint(path) for path in paths)
+        outputs = cache.get(key, fingerprint)
+        if outputs is None:
+            outputs = fetch(paths)
+            cache.put(key, fingerprint, outputs)
+        return outputs
+
+    def fetch_history(
+        self,
+        history_paths=None,
+        sort=True,
+        desc=False,
+        workers=1,
+        snapshot=None,
+        snapshot_dir=None,
+        since=None,
+        until=None,
+        url_filter=None,
+        columnar=False,
+        limit=None,
+    ):
         """Returns history of all available profiles stored in SQL.
 
         The returned datetimes are timezone-aware with the local timezone set
         by default.
 
-        The history files are first copied to a temporary location and then
+        A snapshot of the history files is taken (by default they are copied
+        to a temporary location if the browser is using them) and then
         queried, this might lead to some additional overhead and results
         returned might not be the latest if the browser is in use. This is
         done because the SQlite files are locked by the browser when in use.
+        See :py:meth:`snapshot_file` for the available strategies.
+        If :py:attr:`fetch_cache` is set, the previous result is returned
+        instead while the history files have not changed.
+
+        This is built on top of :py:meth:`iter_history`, use that directly
+        when the rows do not need to be held in memory all at once. Every
+        profile is queried in sorted order and the profiles are merged, so
+        the history is never sorted in Python.
 
         :param history_paths: (optional) a list of history files.
         :type history_paths: list(:py:class:`pathlib.Path`)
@@ -255,49 +1893,283 @@ class Browser(abc.ABC):
         :param desc: (optional)  flag to specify asc/desc
             (Applicable if sort is True) Default value set to False.
         :type asc: boolean
+        :param workers: (optional) number of profiles to fetch concurrently.
+            Default value set to 1.
+        :type workers: int
+        :param snapshot: (optional) strategy used to snapshot the files, one
+            of :py:data:`SNAPSHOT_STRATEGIES`. Defaults to :py:attr:`snapshot`.
+        :type snapshot: str
+        :param snapshot_dir: (optional) directory in which the snapshots are
+            created. Defaults to :py:attr:`snapshot_dir`.
+        :type snapshot_dir: str
+        :param since: (optional) only return visits made at or after this
+            time. Naive datetimes are taken to be in the local timezone.
+        :type since: :py:class:`datetime.datetime`
+        :param until: (optional) only return visits made before this time.
+        :type until: :py:class:`datetime.datetime`
+        :param url_filter: (optional) only return visits to the URLs matching
+            this filter.
+        :type url_filter: :py:class:`UrlFilter`
+        :param columnar: (optional) flag to return the history as compact
+            :py:class:`ColumnarRows`. Default value set to False.
+        :type columnar: boolean
+        :param limit: (optional) maximum number of visits to return, see
+            :py:meth:`iter_history`.
+        :type limit: int
         :return: Object of class :py:class:`browser_history.generic.Outputs`
             with the data member histories set to
             list(tuple(:py:class:`datetime.datetime`, str)).
             If the browser is not installed, this object will be empty.
         :rtype: :py:class:`browser_history.generic.Outputs`
         """
+
+        def fetch(paths):
+            output_object = Outputs("history", columnar, self.tz)
+            output_object.histories.extend(
+                self.iter_history(
+                    paths,
+                    workers,
+                    sort,
+                    desc,
+                    snapshot=snapshot,
+                    snapshot_dir=snapshot_dir,
+                    since=since,
+                    until=until,
+                    url_filter=url_filter,
+                    limit=limit,
+                )
+            )
+            return output_object
+
+        options = (
+            sort,
+            desc,
+            snapshot,
+            since,
+            until,
+            repr(url_filter),
+            columnar,
+            limit,
+        )
+        with stats.span("fetch_history", self.name) as span:
+            outputs = self._fetch_cached(
+                "history", self.history_file, history_paths, options, fetch
+            )
+            span.rows = len(outputs.histories)
+        return outputs
+
+    def export_history(
+        self,
+        out_file,
+        output_format="csv",
+        history_paths=None,
+        sort=True,
+        desc=False,
+        snapshot=None,
+        snapshot_dir=None,
+        since=None,
+        until=None,
+        url_filter=None,
+        limit=None,
+    ):
+        """Writes history of all available profiles to ``out_file`` formatted
+        as ``output_format``, exactly like :py:meth:`Outputs.write` would for
+        the rows of :py:meth:`iter_history`.
+
+        For CSV and JSON Lines, SQLite formats the timestamps itself (with the
+        UTC offsets of :py:attr:`tz` computed beforehand) and the rows are
+        written from the cursor in batches, without creating datetimes or
+        tuples of them in Python. This needs :py:attr:`history_epoch`, and
+        when the output is sorted, a single profile to merge. Otherwise the
+        rows are read with :py:meth:`iter_history` and written by
+        :py:meth:`Outputs.write`.
+
+        :param out_file: a file object opened for writing text.
+        :param output_format: (optional) One the formats in `csv`, `json`,
+            `jsonl`. Default value set to csv.
+        :type output_format: str
+        :param history_paths: (optional) a list of history files.
+        :type history_paths: list(:py:class:`pathlib.Path`)
+        :param sort: (optional) flag to specify if the output should be
+            sorted. Default value set to True.
+        :type sort: boolean
+        :param desc: (optional)  flag to specify asc/desc
+            (Applicable if sort is True) Default value set to False.
+        :type desc: boolean
+        :param snapshot: (optional) strategy used to snapshot the files, one
+            of :py:data:`SNAPSHOT_STRATEGIES`. Defaults to :py:attr:`snapshot`.
+        :type snapshot: str
+        :param snapshot_dir: (optional) directory in which the snapshots are
+            created. Defaults to :py:attr:`snapshot_dir`.
+        :type snapshot_dir: str
+        :param since: (optional) only return visits made at or after this
+            time. Naive datetimes are taken to be in the local timezone.
+        :type since: :py:class:`datetime.datetime`
+        :param until: (optional) only return visits made before this time.
+        :type until: :py:class:`datetime.datetime`
+        :param url_filter: (optional) only return visits to the URLs matching
+            this filter.
+        :type url_filter: :py:class:`UrlFilter`
+        :param limit: (optional) maximum number of visits to write, see
+            :py:meth:`iter_history`.
+        :type limit: int
+        """
         if history_paths is None:
             history_paths = self.paths(profile_file=self.history_file)
-        output_object = Outputs(fetch_type="history")
-        with tempfile.TemporaryDirectory() as tmpdirname:
+        output_format = output_format.lower()
+        if (
+            self.history_epoch is None
+            or output_format not in ("csv", "jsonl")
+            or (sort and len(history_paths) > 1)
+        ):
+            rows = self.iter_history(
+                history_paths,
+                sort=sort,
+                desc=desc,
+                snapshot=snapshot,
+                snapshot_dir=snapshot_dir,
+                since=since,
+                until=until,
+                url_filter=url_filter,
+                limit=limit,
+            )
+            try:
+                Outputs("history", tz=self.tz, rows=rows).write(out_file, output_format)
+            finally:
+                rows.close()
+            return
+
+        fields = Outputs("history").field_map["history"]["fields"]
+        if output_format == "csv":
+            # like the datetimes written by the csv module
+            separator = " "
+            writer = csv.writer(out_file)
+            writer.writerow(fields)
+        else:
+            separator = "T"
+            keys = [json.dumps(field).replace("%", "%%") for field in fields]
+            template = '{%s: "%%s", %s: %%s}' % tuple(keys)
+            leading = ""
+        written = 0
+        if snapshot_dir is None:
+            snapshot_dir = self.snapshot_dir
+        with tempfile.TemporaryDirectory(dir=snapshot_dir) as tmpdirname:
             for history_path in history_paths:
-                copied_history_path = shutil.copy2(history_path.absolute(), tmpdirname)
-                conn = sqlite3.connect(
-                    f"file:{copied_history_path}?mode=ro&immutable=1&nolock=1", uri=True
+                if limit is not None and written >= limit:
+                    break
+                batches = self._iter_history_export_profile(
+                    history_path,
+                    tempfile.mkdtemp(dir=tmpdirname),
+                    sort,
+                    desc,
+                    snapshot,
+                    since,
+                    until,
+                    url_filter,
+                    None if limit is None else limit - written,
+                    separator,
                 )
-                cursor = conn.cursor()
-                cursor.execute(self.history_SQL)
-                date_histories = [
-                    (
-                        datetime.datetime.strptime(d, "%Y-%m-%d %H:%M:%S").replace(
-                            tzinfo=self._local_tz
-                        ),
-                        url,
-                    )
-                    for d, url in cursor.fetchall()
-                ]
-                output_object.histories.extend(date_histories)
-                if sort:
-                    output_object.histories.sort(reverse=desc)
-                conn.close()
-        return output_object
-
-    def fetch_bookmarks(self, bookmarks_paths=None, sort=True, desc=False):
+                try:
+                    for batch in batches:
+                        written += len(batch)
+                        if output_format == "csv":
+                            writer.writerows(batch)
+                            continue
+                        try:
+                            records = [
+                                template % (timestamp, _encode_json_string(url))
+                                for timestamp, url in batch
+                            ]
+                        except TypeError:
+                            records = [
+                                template % (timestamp, json.dumps(url))
+                                for timestamp, url in batch
+                            ]
+                        out_file.write(leading)
+                        out_file.write("\n".join(records))
+                        leading = "\n"
+                finally:
+                    batches.close()
+
+    def fetch_history_page(
+        self,
+        page_size=500,
+        token=None,
+        desc=False,
+        history_paths=None,
+        since=None,
+        until=None,
+        url_filter=None,
+    ):
+        """Returns a page of the history of all available profiles along with
+        a continuation token for the next page.
+
+        The token is opaque and encodes the position of the last visit of the
+        page. Passing it back resumes right after that visit: every profile is
+        queried from there on (see :py:meth:`iter_history_keyset`) instead of
+        fetching the history again and skipping the previous pages. Visits
+        added to the history in the meantime show up on the page where they
+        belong in the order, pages already returned do not change.
+
+        :param page_size: (optional) maximum number of visits in the page.
+            Default value set to 500.
+        :type page_size: int
+        :param token: (optional) token returned with the previous page.
+            Defaults to the first page.
+        :type token: str
+        :param desc: (optional) flag to page through the latest visits first.
+            The same value must be used for all pages. Default value set to
+            False.
+        :type desc: boolean
+        :param history_paths: (optional) a list of history files.
+        :type history_paths: list(:py:class:`pathlib.Path`)
+        :param since: (optional) only return visits made at or after this
+            time. Naive datetimes are taken to be in the local timezone.
+        :type since: :py:class:`datetime.datetime`
+        :param until: (optional) only return visits made before this time.
+        :type until: :py:class:`datetime.datetime`
+        :param url_filter: (optional) only return visits to the URLs matching
+            this filter.
+        :type url_filter: :py:class:`UrlFilter`
+        :return: Object of class :py:class:`browser_history.generic.Outputs`
+            with the data member histories set to the visits of the page, and
+            the token of the next page or ``None`` if this is the last one.
+        :rtype: tuple(:py:class:`browser_history.generic.Outputs`, str)
+        """
+        after = _decode_page_token(token) if token is not None else None
+        run = self.iter_history_keyset(
+            history_paths,
+            after,
+            desc,
+            since=since,
+            until=until,
+            url_filter=url_filter,
+        )
+        return _history_page([run], page_size, desc, self.tz)
+
+    def fetch_bookmarks(
+        self,
+        bookmarks_paths=None,
+        sort=True,
+        desc=False,
+        workers=1,
+        snapshot=None,
+        snapshot_dir=None,
+        columnar=False,
+    ):
         """Returns bookmarks of all available profiles stored in SQL or JSON
         or plist.
 
         The returned datetimes are timezone-aware with the local timezone set
         by default.
 
-        The bookmark files are first copied to a temporary location and then
-        queried, this might lead to some additional overhead and results
-        returned might not be the latest if the browser is in use. This is
-        done because the SQlite files are locked by the browser when in use.
+        A snapshot of the bookmark files is taken and then queried, this
+        might lead to some additional overhead and results returned might not
+        be the latest if the browser is in use. This is done because the
+        SQlite files are locked by the browser when in use.
+        See :py:meth:`snapshot_file` for the available strategies.
+        If :py:attr:`fetch_cache` is set, the previous result is returned
+        instead while the bookmark files have not changed.
 
         :param bookmarks_paths: (optional) a list of bookmark files.
         :type bookmarks_paths: list(:py:class:`pathlib.Path`)
@@ -307,30 +2179,38 @@ class Browser(abc.ABC):
         :param desc: (optional)  flag to specify asc/desc
             (Applicable if sort is True) Default value set to False.
         :type asc: boolean
+        :param workers: (optional) number of profiles to fetch concurrently.
+            Default value set to 1.
+        :type workers: int
+        :param snapshot: (optional) strategy used to snapshot the files, one
+            of :py:data:`SNAPSHOT_STRATEGIES`. Defaults to :py:attr:`snapshot`.
+        :type snapshot: str
+        :param snapshot_dir: (optional) directory in which the snapshots are
+            created. Defaults to :py:attr:`snapshot_dir`.
+        :type snapshot_dir: str
+        :param columnar: (optional) flag to return the bookmarks as compact
+            :py:class:`ColumnarRows`. Default value set to False.
+        :type columnar: boolean
         :return: Object of class :py:class:`browser_history.generic.Outputs`
             with the attribute bookmarks set to a list of
             (timestamp, url, title, folder) tuples
         :rtype: :py:class:`browser_history.generic.Outputs`
         """
 
-        assert (
-            self.bookmarks_file is not None
-        ), "Bookmarks are not supported for {} browser".format(self.name)
-        if bookmarks_paths is None:
-            bookmarks_paths = self.paths(profile_file=self.bookmarks_file)
-        output_object = Outputs(fetch_type="bookmarks")
-        with tempfile.TemporaryDirectory() as tmpdirname:
-            for bookmarks_path in bookmarks_paths:
-                if not os.path.exists(bookmarks_path):
-                    continue
-                copied_bookmark_path = shutil.copy2(
-                    bookmarks_path.absolute(), tmpdirname
-                )
-                date_bookmarks = self.bookmarks_parser(copied_bookmark_path)
-                output_object.bookmarks.extend(date_bookmarks)
-            if sort:
-                output_object.bookmarks.sort(reverse=desc)
-        return output_object
+        def fetch(paths):
+            output_object = Outputs("bookmarks", columnar, self.tz)
+            output_object.bookmarks.extend(
+                self.iter_bookmarks(paths, workers, sort, desc, snapshot, snapshot_dir)
+            )
+            return output_object
+
+        options = (sort, desc, snapshot, columnar)
+        with stats.span("fetch_bookmarks", self.name) as span:
+            outputs = self._fetch_cached(
+                "bookmarks", self.bookmarks_file, bookmarks_paths, options, fetch
+            )
+            span.rows = len(outputs.bookmarks)
+        return outputs
 
     @classmethod
     def is_supported(cls):
@@ -347,12 +2227,178 @@ class Browser(abc.ABC):
         return support_check.get(utils.get_platform()) is not None
 
 
+class _DateTimeEncoder(json.JSONEncoder):
+    """Custom JSON encoder to encode datetime objects"""
+
+    # Override the default method
+    def default(self, o):
+        if isinstance(o, (datetime.date, datetime.datetime)):
+            return o.isoformat()
+        return super().default(o)
+
+
+# escapes a string like json.dumps does by default (ensure_ascii), in C when
+# the speedups of the json module are available
+_encode_json_string = json.encoder.encode_basestring_ascii
+
+
+def _json_records(template, width, entries, fallback):
+    """Yields every row of ``entries`` encoded as a JSON object with the
+    ``template``, which has a ``%s`` placeholder for each of the ``width``
+    values of a row.
+
+    The timestamp is rendered with :py:meth:`datetime.datetime.isoformat` and
+    the strings are escaped directly, instead of going through a dict and
+    :py:class:`_DateTimeEncoder` for every row. Rows with values of any other
+    type (or another width) are encoded by ``fallback`` instead.
+    """
+    encode = _encode_json_string
+    for entry in entries:
+        try:
+            if len(entry) != width:
+                raise TypeError
+            record = template % (
+                (f'"{entry[0].isoformat()}"',) + tuple(map(encode, entry[1:]))
+            )
+        except (AttributeError, TypeError):
+            record = fallback(entry)
+        yield record
+
+
+class ColumnarRows(Sequence):
+    """A compact, column oriented sequence of history or bookmark rows.
+
+    Instead of one tuple holding a :py:class:`datetime.datetime` and strings
+    per row, the timestamps are stored as 64-bit integers (microseconds since
+    the Unix epoch, in UTC) in an :py:class:`array.array`. Every other column
+    is an array of indices into a table of unique strings, so a URL visited a
+    thousand times is only stored once. This takes several times less memory
+    than a list of tuples.
+
+    Rows are only turned into tuples when they are accessed, so the object can
+    be used like the list it replaces. Naive datetimes added to it are taken
+    to be in the local timezone and all datetimes are returned in ``tz``.
+
+    :param width: number of items in a row, the timestamp included.
+    :type width: int
+    :param tz: (optional) timezone of the returned datetimes. Defaults to the
+        system's local timezone.
+    :type tz: :py:class:`datetime.tzinfo`
+    """
+
+    def __init__(self, width, tz=None):
+        self.width = width
+        self.tz = tz
+        #: timestamps in microseconds since the Unix epoch
+        self.timestamps = array("q")
+        #: the other columns, as indices into :py:attr:`strings`
+        self.columns = [array("i") for _ in range(width - 1)]
+        #: table of the unique strings of all columns
+        self.strings: List[typing.Optional[str]] = []
+        self._string_ids: Dict[typing.Optional[str], int] = {}
+        self._converter = _TimezoneConverter(tz)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __eq__(self, other):
+        if isinstance(other, Sequence) and not isinstance(other, str):
+            return len(self) == len(other) and list(self) == list(other)
+        return NotImplemented
+
+    def _string_id(self, value):
+        try:
+            return self._string_ids[value]
+        except KeyError:
+            string_id = self._string_ids[value] = len(self.strings)
+            self.strings.append(value)
+            return string_id
+
+    def append(self, row):
+        """Adds a row at the end."""
+        timestamp = row[0]
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.astimezone()
+        self.timestamps.append((timestamp - _UNIX_EPOCH) // _MICROSECOND)
+        for column, value in zip(self.columns, row[1:]):
+            column.append(self._string_id(value))
+
+    def extend(self, rows):
+        """Adds all ``rows`` at the end."""
+        if not isinstance(rows, ColumnarRows):
+            for row in rows:
+                self.append(row)
+            return
+        string_ids = array("i", map(self._string_id, rows.strings))
+        self.timestamps.extend(rows.timestamps)
+        for column, other_column in zip(self.columns, rows.columns):
+            column.extend(string_ids[string_id] for string_id in other_column)
+
+    def _rows(self, start, stop):
+        strings = self.strings
+        return zip(
+            self._converter.datetimes(self.timestamps[start:stop]),
+            *(
+                [strings[string_id] for string_id in column[start:stop]]
+                for column in self.columns
+            ),
+        )
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("row index out of range")
+        return next(self._rows(index, index + 1))
+
+    def __iter__(self):
+        for start in range(0, len(self), 1000):
+            yield from self._rows(start, start + 1000)
+
+    def sort(self, reverse=False):
+        """Sorts the rows in place, in the same order as a list of the row
+        tuples would be sorted.
+
+        The rows are sorted on their integer timestamps, only the rows with
+        equal timestamps are ordered by their strings."""
+        timestamps = self.timestamps
+        strings = self.strings
+        columns = self.columns
+        order = sorted(range(len(self)), key=timestamps.__getitem__, reverse=reverse)
+
+        def row_strings(index):
+            return [strings[column[index]] for column in columns]
+
+        if len(set(timestamps)) < len(timestamps):
+            tied_order = order
+            order = []
+            for _, group in itertools.groupby(tied_order, key=timestamps.__getitem__):
+                group = list(group)
+                if len(group) > 1:
+                    group.sort(key=row_strings, reverse=reverse)
+                order.extend(group)
+        self.timestamps = array("q", map(timestamps.__getitem__, order))
+        self.columns = [
+            array("i", map(column.__getitem__, order)) for column in columns
+        ]
+
+
 class Outputs:
     """
     A generic class to encapsulate history and bookmark outputs and to
     easily convert them to JSON, CSV or other formats.
 
     :param fetch_type: string argument to select history output or bookmarks output
+    :param columnar: (optional) flag to store the rows in compact
+        :py:class:`ColumnarRows` instead of lists of tuples. Default value set
+        to False.
+    :param tz: (optional) timezone of the datetimes of columnar rows, see
+        :py:class:`ColumnarRows`.
+    :param rows: (optional) the rows of ``fetch_type``, used as they are. This
+        can be a lazy iterator, which is then consumed by the first output
+        written, see :py:meth:`write`.
     """
 
     # type hint for histories and bookmarks have to be manually written for
@@ -368,10 +2414,24 @@ class Outputs:
     format_map: Dict[str, Callable]
     """Dictionary which maps output formats to their respective functions."""
 
-    def __init__(self, fetch_type):
+    writer_map: Dict[str, Callable]
+    """Dictionary which maps output formats to the functions writing them to a
+    file, see :py:meth:`write`."""
+
+    def __init__(self, fetch_type, columnar=False, tz=None, rows=None):
         self.fetch_type = fetch_type
-        self.histories = []
-        self.bookmarks = []
+        self.columnar = columnar
+        self.tz = tz
+        if columnar:
+            self.histories = ColumnarRows(2, tz)
+            self.bookmarks = ColumnarRows(4, tz)
+        else:
+            self.histories = []
+            self.bookmarks = []
+        if rows is not None and fetch_type == "history":
+            self.histories = rows
+        elif rows is not None and fetch_type == "bookmarks":
+            self.bookmarks = rows
         self.field_map = {
             "history": {"var": self.histories, "fields": ("Timestamp", "URL")},
             "bookmarks": {
@@ -384,6 +2444,11 @@ class Outputs:
             "json": self.to_json,
             "jsonl": partial(self.to_json, json_lines=True),
         }
+        self.writer_map = {
+            "csv": self.write_csv,
+            "json": self.write_json,
+            "jsonl": partial(self.write_json, json_lines=True),
+        }
 
     def sort_domain(self) -> typing.DefaultDict[Any, List[Any]]:
         """
@@ -439,7 +2504,10 @@ class Outputs:
             # fetch the required formatter and call it. The formatters are
             # instance methods so no need to pass any arguments
             formatter = self.format_map[output_format]
-            return formatter()
+            with stats.span(f"format.{output_format}") as span:
+                formatted = formatter()
+                span.nbytes = len(formatted.encode())
+            return formatted
         raise ValueError(
             f"Invalid format {output_format}. Should be one of \
             {self.format_map.keys()}"
@@ -467,19 +2535,24 @@ class Outputs:
         2020-01-01 00:00:00,https://google.com
         2020-01-01 00:00:00,https://example.com
 
+        """
+        with StringIO() as output:
+            self.write_csv(output)
+            return output.getvalue()
+
+    def write_csv(self, out_file):
+        """
+        Writes history or bookmarks to ``out_file`` in the format of
+        :py:meth:`to_csv`, one row at a time.
+
+        :param out_file: a file object opened for writing text.
         """
         # we will use csv module and let it do all the heavy lifting such as
         # special character escaping and correct line termination escape
         # sequences
-        # The catch is, we need to return a string but the csv module only
-        # works with files so we will use StringIO to build the csv in
-        # memory first
-        with StringIO() as output:
-            writer = csv.writer(output)
-            writer.writerow(self.field_map[self.fetch_type]["fields"])
-            for row in self.field_map[self.fetch_type]["var"]:
-                writer.writerow(row)
-            return output.getvalue()
+        writer = csv.writer(out_file)
+        writer.writerow(self.field_map[self.fetch_type]["fields"])
+        writer.writerows(self.field_map[self.fetch_type]["var"])
 
     def to_json(self, json_lines: bool = False) -> str:
         """
@@ -518,34 +2591,79 @@ class Outputs:
             ]
         }
         """
-        # custom json encoder for datetime objects
-        class DateTimeEncoder(json.JSONEncoder):
-            """Custom JSON encoder to encode datetime objects"""
-
-            # Override the default method
-            def default(self, o):
-                if isinstance(o, (datetime.date, datetime.datetime)):
-                    return o.isoformat()
-                return super().default(o)
+        with StringIO() as output:
+            self.write_json(output, json_lines)
+            return output.getvalue()
 
-        # fetch lines
-        lines = []
-        for entry in self.field_map[self.fetch_type]["var"]:
-            json_record = {}
-            for field, value in zip(self.field_map[self.fetch_type]["fields"], entry):
-                json_record[field] = value
-            lines.append(json_record)
+    def write_json(self, out_file, json_lines: bool = False):
+        """
+        Writes history or bookmarks to ``out_file`` in the format of
+        :py:meth:`to_json`, one record at a time.
 
+        :param out_file: a file object opened for writing text.
+        :param json_lines: flag to specify if the output should be JSON Lines.
+        """
+        fields = self.field_map[self.fetch_type]["fields"]
+        keys = [json.dumps(field).replace("%", "%%") for field in fields]
         if json_lines:
-            json_string = "\n".join(
-                [json.dumps(line, cls=DateTimeEncoder) for line in lines]
-            )
+            template = "{" + ", ".join(f"{key}: %s" for key in keys) + "}"
+
+            def fallback(entry):
+                return json.dumps(dict(zip(fields, entry)), cls=_DateTimeEncoder)
+
+            separator = "\n"
         else:
-            json_string = json.dumps(
-                {self.fetch_type: lines}, cls=DateTimeEncoder, indent=4
+            # the same layout as json.dumps({fetch_type: records}, indent=4)
+            template = (
+                "        {\n"
+                + ",\n".join(f"            {key}: %s" for key in keys)
+                + "\n        }"
             )
 
-        return json_string
+            def fallback(entry):
+                record_json = json.dumps(
+                    dict(zip(fields, entry)), cls=_DateTimeEncoder, indent=4
+                )
+                return "        " + record_json.replace("\n", "\n        ")
+
+            separator = ",\n"
+            out_file.write(f"{{\n    {json.dumps(self.fetch_type)}: [")
+        records = _json_records(
+            template, len(fields), self.field_map[self.fetch_type]["var"], fallback
+        )
+        leading = "" if json_lines else "\n"
+        # join the records in batches to make fewer, larger writes
+        for batch in iter(lambda: list(itertools.islice(records, 1000)), []):
+            out_file.write(leading)
+            out_file.write(separator.join(batch))
+            leading = separator
+        if not json_lines:
+            out_file.write("\n    ]\n}" if leading == separator else "]\n}")
+
+    def write(self, out_file, output_format: str = "csv"):
+        """
+        Writes history or bookmarks to ``out_file`` formatted as
+        ``output_format``. The output is written row by row, without building
+        it in memory first.
+
+        :param out_file: a file object opened for writing text.
+        :param output_format: One the formats in `csv`, `json`, `jsonl`
+        """
+        writer = self._writer(output_format)
+        with stats.span(f"write.{output_format.lower()}"):
+            writer(out_file)
+
+    def _writer(self, output_format):
+        """Returns the function of :py:attr:`writer_map` writing
+        ``output_format`` (in any case), raising a :py:class:`ValueError` if
+        there is none."""
+        output_format = output_format.lower()
+        if output_format not in self.writer_map:
+            raise ValueError(
+                f"Invalid format {output_format}. Should be one of "
+                f"{', '.join(self.writer_map.keys())}"
+            )
+        return self.writer_map[output_format]
 
     def save(self, filename, output_format="infer"):
         """
@@ -567,8 +2685,9 @@ class Outputs:
                     f"{', '.join(self.format_map.keys())}"
                 )
 
+        writer = self._writer(output_format)
         with open(filename, "w") as out_file:
-            out_file.write(self.formatted(output_format))
+            writer(out_file)
 
 
 class ChromiumBasedBrowser(Browser, abc.ABC):
@@ -577,24 +2696,36 @@ class ChromiumBasedBrowser(Browser, abc.ABC):
     """
 
     profile_dir_prefixes = ["Default*", "Profile*"]
+    profile_registry = "Local State"
 
     history_file = "History"
     bookmarks_file = "Bookmarks"
 
+    history_epoch = datetime.datetime(1601, 1, 1, tzinfo=datetime.timezone.utc)
+    history_visit_id = True
+
     history_SQL = """
             SELECT
-                datetime(
-                    visits.visit_time/1000000-11644473600, 'unixepoch', 'localtime'
-                ) as 'visit_time',
-                urls.url
+                visits.visit_time,
+                urls.url,
+                visits.rowid AS visit_id
             FROM
                 visits INNER JOIN urls ON visits.url = urls.id
             WHERE
                 visits.visit_duration > 0
-            ORDER BY
-                visit_time DESC
         """
 
+    def registered_profiles(self, registry_path):
+        """Returns the profile directories listed in the ``profile.info_cache``
+        of Chromium's ``Local State`` file.
+
+        :param registry_path: the path of the ``Local State`` file
+        :type registry_path: str
+        :rtype: list(str)
+        """
+        with open(registry_path, encoding="utf-8") as local_state:
+            return list(json.load(local_state)["profile"]["info_cache"])
+
     def bookmarks_parser(self, bookmark_path):
         """Returns bookmarks of a single profile for Chrome based browsers
         The returned datetimes are timezone-aware with the local timezone set
@@ -611,16 +2742,10 @@ class ChromiumBasedBrowser(Browser, abc.ABC):
                 if node == "children":
                     for child in bookmarks_json[node]:
                         if child["type"] == "url":
-                            d_t = datetime.datetime(
-                                1601, 1, 1, tzinfo=datetime.timezone.utc
-                            ) + datetime.timedelta(
-                                microseconds=int(child["date_added"])
-                            )
+                            (d_t,) = self._decode_times([int(child["date_added"])])
                             bookmarks_list.append(
                                 (
-                                    d_t.replace(microsecond=0).astimezone(
-                                        self._local_tz
-                                    ),
+                                    d_t.replace(microsecond=0),
                                     child["url"],
                                     child["name"],
                                     folder,
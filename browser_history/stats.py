@@ -0,0 +1,223 @@
+"""This module records where the time goes while fetching history and
+bookmarks.
+
+While a :py:class:`Stats` is active, the phases of fetching are recorded in it
+as :py:class:`Span` objects, per browser and profile:
+
+* ``discovery``: finding the profiles of a browser, see
+  :py:meth:`browser_history.generic.Browser.paths`.
+* ``snapshot``: taking a snapshot of a file, along with the bytes copied.
+* ``query``: running the history query and fetching its rows from SQLite.
+* ``decode``: converting the timestamps of the rows to datetimes.
+* ``parse`` and ``sort``: reading the bookmarks of a profile and sorting them.
+* ``fetch_history``, ``fetch_bookmarks``, ``get_history`` and
+  ``get_bookmarks``: the whole call, including the phases above and merging
+  the profiles and browsers.
+* ``format.<format>`` and ``write.<format>``: formatting the output, see
+  :py:meth:`browser_history.generic.Outputs.formatted` and
+  :py:meth:`browser_history.generic.Outputs.write`.
+
+Spans are nested: a ``fetch_history`` span includes the spans of its
+profiles. Rows which are read lazily (by the ``iter_*`` methods) are read
+while they are used, so the time spent reading them is also part of the
+spans of the code using them, like ``write.<format>`` in the CLI.
+
+Nothing is recorded while no :py:class:`Stats` is active, nor in the workers
+of a process pool.
+"""
+import json
+import time
+import typing
+
+_active: typing.List["Stats"] = []
+
+
+class Span:
+    """The time spent in a single phase.
+
+    :param phase: name of the phase, see :py:mod:`browser_history.stats`.
+    :param browser: (optional) name of the browser.
+    :param profile: (optional) path of the profile file.
+    """
+
+    __slots__ = ("phase", "browser", "profile", "seconds", "rows", "nbytes")
+
+    def __init__(self, phase, browser=None, profile=None):
+        self.phase = phase
+        self.browser = browser
+        self.profile = None if profile is None else str(profile)
+        self.seconds = 0.0
+        #: number of rows (or profiles, for ``discovery``) if known
+        self.rows: typing.Optional[int] = None
+        #: number of bytes copied or written if known
+        self.nbytes: typing.Optional[int] = None
+
+    def __repr__(self):
+        return (
+            f"Span({self.phase!r}, {self.browser!r}, {self.profile!r}, "
+            f"seconds={self.seconds}, rows={self.rows}, nbytes={self.nbytes})"
+        )
+
+
+class Stats:
+    """Collects the :py:class:`Span` objects of the phases of fetching while
+    it is active. It can be used as a context manager, which activates it
+    while in the context.
+
+    :param callback: (optional) function called with every :py:class:`Span`
+        as soon as it is recorded.
+    :type callback: callable
+
+    Examples:
+
+    >>> with Stats() as stats:
+    ...     outputs = get_history()
+    >>> print(stats.table())
+    """
+
+    def __init__(self, callback=None):
+        self.spans: typing.List[Span] = []
+        self.callback = callback
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        """Starts recording spans."""
+        _active.append(self)
+
+    def stop(self):
+        """Stops recording spans."""
+        if self in _active:
+            _active.remove(self)
+
+    def add(self, span):
+        """Records a finished ``span``."""
+        self.spans.append(span)
+        if self.callback is not None:
+            self.callback(span)
+
+    def summary(self) -> typing.List[typing.Dict[str, typing.Any]]:
+        """Returns the total time, rows and bytes of every phase of every
+        browser and profile, in the order they were first recorded, along
+        with the number of spans they add up.
+
+        :rtype: list(dict)
+        """
+        totals: typing.Dict[tuple, typing.Dict[str, typing.Any]] = {}
+        for span in self.spans:
+            key = (span.browser, span.profile, span.phase)
+            if key not in totals:
+                totals[key] = {
+                    "browser": span.browser,
+                    "profile": span.profile,
+                    "phase": span.phase,
+                    "spans": 0,
+                    "seconds": 0.0,
+                    "rows": None,
+                    "bytes": None,
+                }
+            total = totals[key]
+            total["spans"] += 1
+            total["seconds"] += span.seconds
+            for field, value in (("rows", span.rows), ("bytes", span.nbytes)):
+                if value is not None:
+                    total[field] = (total[field] or 0) + value
+        return list(totals.values())
+
+    def to_json(self) -> str:
+        """Returns the :py:meth:`summary` as JSON.
+
+        :rtype: str
+        """
+        return json.dumps(self.summary(), indent=4)
+
+    def table(self) -> str:
+        """Returns the :py:meth:`summary` as a table for people to read.
+
+        :rtype: str
+        """
+        header = ("Browser", "Phase", "Seconds", "Rows", "Bytes", "Profile")
+        lines = [header]
+        for total in self.summary():
+            lines.append(
+                (
+                    total["browser"] or "",
+                    total["phase"],
+                    f"{total['seconds']:.4f}",
+                    "" if total["rows"] is None else str(total["rows"]),
+                    "" if total["bytes"] is None else str(total["bytes"]),
+                    total["profile"] or "",
+                )
+            )
+        widths = [max(len(line[i]) for line in lines) for i in range(len(header))]
+        return "\n".join(
+            "  ".join(
+                value.rjust(width) if 2 <= i <= 4 else value.ljust(width)
+                for i, (value, width) in enumerate(zip(line, widths))
+            ).rstrip()
+            for line in lines
+        )
+
+
+def enabled() -> bool:
+    """Returns whether any :py:class:`Stats` is active.
+
+    :rtype: bool
+    """
+    return bool(_active)
+
+
+def record(span):
+    """Adds a finished ``span`` to the active :py:class:`Stats`."""
+    for stats in _active:
+        stats.add(span)
+
+
+class _Timer:
+    """Context manager returned by :py:func:`span`."""
+
+    def __init__(self, span):
+        self.span = span
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self.span
+
+    def __exit__(self, *exc_info):
+        self.span.seconds += time.perf_counter() - self.start
+        record(self.span)
+
+
+class _NoTimer:
+    """Context manager returned by :py:func:`span` while no :py:class:`Stats`
+    is active, the span is not recorded."""
+
+    def __init__(self, span):
+        self.span = span
+
+    def __enter__(self):
+        return self.span
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+def span(phase, browser=None, profile=None):
+    """Returns a context manager timing a :py:class:`Span` of ``phase``,
+    which is recorded when the context exits. The span is returned by
+    ``__enter__`` to set its rows and bytes.
+
+    >>> with stats.span("query", self.name, history_path) as query:
+    ...     query.rows = len(rows)
+
+    :rtype: context manager
+    """
+    if _active:
+        return _Timer(Span(phase, browser, profile))
+    return _NoTimer(Span(phase, browser, profile))
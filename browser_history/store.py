@@ -0,0 +1,410 @@
+"""This module defines a persistent store of the history of all browsers.
+
+The first time the store is refreshed, the entire history of every browser
+and profile is copied into it. Every refresh after that only reads the visits
+added since the last one stored for a profile, and skips the profiles whose
+history files have not changed at all.
+"""
+import datetime
+import itertools
+import os
+import sqlite3
+import time
+import typing
+from pathlib import Path
+
+import browser_history.utils as utils
+from browser_history import generic
+
+# version 2 stores the last visit id as the watermark of most browsers,
+# version 3 the ids of the visits and the pending ranges of ids
+_SCHEMA_VERSION = 3
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS profiles (
+        id INTEGER PRIMARY KEY,
+        browser TEXT NOT NULL,
+        path TEXT NOT NULL,
+        inode INTEGER,
+        size INTEGER,
+        fingerprint TEXT,
+        watermark INTEGER,
+        UNIQUE (browser, path)
+    );
+    CREATE TABLE IF NOT EXISTS visits (
+        profile INTEGER NOT NULL REFERENCES profiles (id),
+        visit_id INTEGER,
+        visit_time INTEGER NOT NULL,
+        url TEXT NOT NULL,
+        UNIQUE (profile, visit_id)
+    );
+    CREATE INDEX IF NOT EXISTS visits_time_index ON visits (visit_time, url);
+    -- the visits of browsers without visit ids are told apart by time and URL
+    CREATE UNIQUE INDEX IF NOT EXISTS visits_time_url_index
+        ON visits (profile, visit_time, url) WHERE visit_id IS NULL;
+    CREATE TABLE IF NOT EXISTS pending (
+        profile INTEGER NOT NULL REFERENCES profiles (id),
+        first_id INTEGER NOT NULL,
+        last_id INTEGER NOT NULL,
+        since INTEGER NOT NULL
+    );
+"""
+
+
+def default_store_path() -> Path:
+    """Returns the path of the store used by default:
+    ``browser-history/history.sqlite`` in ``$XDG_CACHE_HOME`` (``~/.cache`` if
+    it is not set).
+
+    :rtype: :py:class:`pathlib.Path`
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "browser-history" / "history.sqlite"
+
+
+def _micros(timestamp):
+    """Converts an aware datetime to microseconds since the Unix epoch."""
+    return (timestamp - generic._UNIX_EPOCH) // generic._MICROSECOND
+
+
+class _Gaps:
+    """Finds the ranges of visit ids which a refresh read the visits of, but
+    which were not returned by the browser's query. These visits were
+    deleted or left out of the history, maybe only for now.
+
+    :param pending: the ``(first_id, last_id, since)`` ranges which are read
+        again, where ``since`` is when they were first missed.
+    :param after_id: the id after which all visits are read, or ``None`` if
+        the profile is read from scratch.
+    :param now: the time of the refresh, in seconds since the Unix epoch.
+    """
+
+    def __init__(self, pending, after_id, now):
+        self.pending = pending
+        self.after_id = after_id
+        self.now = now
+        #: the largest visit id read, which is the next watermark
+        self.last_id = after_id
+        self.gaps = []
+        self.found = []
+
+    def add(self, visit_id):
+        """Records a visit read by the refresh. The visits of the pending
+        ranges come first, and then the later ones in order of their ids."""
+        if self.after_id is not None and visit_id <= self.after_id:
+            self.found.append(visit_id)
+            return
+        if self.last_id is not None and visit_id > self.last_id + 1:
+            self.gaps.append((self.last_id + 1, visit_id - 1, self.now))
+        self.last_id = visit_id
+
+    def ranges(self):
+        """Returns the ``(first_id, last_id, since)`` ranges of ids which were
+        not returned, the ones of the pending ranges keeping their
+        ``since``."""
+        found = sorted(self.found)
+        gaps = []
+        for first, last, since in self.pending:
+            next_id = first
+            for visit_id in found:
+                if first <= visit_id <= last:
+                    if visit_id > next_id:
+                        gaps.append((next_id, visit_id - 1, since))
+                    next_id = visit_id + 1
+            if next_id <= last:
+                gaps.append((next_id, last, since))
+        return gaps + self.gaps
+
+
+class HistoryStore:
+    """A persistent store of the history of all browsers and profiles, kept in
+    an SQLite database.
+
+    Visits are stored in UTC along with the browser and profile they were read
+    from. For every profile, the store keeps the id of its last visit (the
+    watermark) and a fingerprint of its history file. :py:meth:`refresh`
+    uses them to only query the visits added since the last refresh, even if
+    they were made earlier (like the visits imported by syncing another
+    device).
+
+    Browsers leave some visits out of their history until they are complete,
+    like the visits of Chromium's open tabs (which have no duration yet) or
+    the ones of Firefox whose page has no title yet. The ids below the
+    watermark whose visits were left out are kept as pending and read again
+    by every refresh, until their visits are stored or for
+    :py:attr:`pending_time`. Visits which are completed later than that are
+    missed until the profile is read again from scratch.
+
+    For browsers without
+    :py:attr:`browser_history.generic.Browser.history_visit_id`, the
+    watermark is the time of the last visit instead, and every refresh reads
+    the visits from :py:attr:`pending_time` before it again. Visits added
+    with an earlier time are missed until the profile is read again from
+    scratch.
+
+    Visits deleted in the browser are only removed from the store if the
+    history file shrinks or is replaced, which makes the store read the
+    profile again from scratch. Use :py:meth:`clear` to start over.
+
+    The store can be used as a context manager, which closes it on exit.
+
+    :param path: (optional) path of the store. Defaults to
+        :py:func:`default_store_path`.
+    :type path: str or :py:class:`pathlib.Path`
+
+    Examples:
+
+    >>> with HistoryStore() as store:
+    ...     store.refresh()
+    ...     history = list(store.iter_history())
+    """
+
+    pending_time: datetime.timedelta = datetime.timedelta(days=7)
+    """For how long the visits left out of the history of a browser are
+    looked for again, see :py:class:`HistoryStore`."""
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path is not None else default_store_path()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path))
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != _SCHEMA_VERSION:
+            # the store only holds copies, so just start over
+            self.conn.executescript(
+                "DROP TABLE IF EXISTS visits; DROP TABLE IF EXISTS pending; "
+                "DROP TABLE IF EXISTS profiles;"
+            )
+            self.conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+        self.conn.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Closes the database of the store."""
+        self.conn.close()
+
+    def clear(self):
+        """Removes everything from the store."""
+        with self.conn:
+            self.conn.execute("DELETE FROM visits")
+            self.conn.execute("DELETE FROM pending")
+            self.conn.execute("DELETE FROM profiles")
+
+    def _refresh_profile(self, browser, history_path):
+        """Stores the new visits of a single profile and returns how many
+        there were."""
+        stat = os.stat(history_path)
+        fingerprint = repr(generic._fingerprint(str(history_path)))
+        row = self.conn.execute(
+            "SELECT id, inode, size, fingerprint, watermark FROM profiles "
+            "WHERE browser = ? AND path = ?",
+            (browser.name, str(history_path)),
+        ).fetchone()
+        if row is None:
+            profile = self.conn.execute(
+                "INSERT INTO profiles (browser, path) VALUES (?, ?)",
+                (browser.name, str(history_path)),
+            ).lastrowid
+            watermark = None
+        else:
+            profile, inode, size, old_fingerprint, watermark = row
+            if fingerprint == old_fingerprint:
+                return 0
+            if stat.st_ino != inode or stat.st_size < size:
+                # the history was rewritten, visits might have been removed
+                self.conn.execute("DELETE FROM visits WHERE profile = ?", (profile,))
+                self.conn.execute("DELETE FROM pending WHERE profile = ?", (profile,))
+                watermark = None
+        if browser.history_visit_id:
+            watermark, new_visits = self._refresh_visits(
+                browser, history_path, profile, watermark
+            )
+        else:
+            watermark, new_visits = self._refresh_times(
+                browser, history_path, profile, watermark
+            )
+        self.conn.execute(
+            "UPDATE profiles SET inode = ?, size = ?, fingerprint = ?, watermark = ? "
+            "WHERE id = ?",
+            (stat.st_ino, stat.st_size, fingerprint, watermark, profile),
+        )
+        return new_visits
+
+    def _refresh_visits(self, browser, history_path, profile, watermark):
+        """Stores the visits of a single profile whose ids are above the
+        ``watermark`` or pending, and returns the new watermark and the number
+        of new visits. See :py:meth:`_refresh_profile`."""
+        now = int(time.time())
+        expired = now - self.pending_time.total_seconds()
+        pending = self.conn.execute(
+            "SELECT first_id, last_id, since FROM pending "
+            "WHERE profile = ? AND since >= ? ORDER BY first_id",
+            (profile, expired),
+        ).fetchall()
+        gaps = _Gaps(pending, watermark, now)
+        new_visits = 0
+        rows = browser._iter_history_after_id(
+            [history_path], watermark, [(first, last) for first, last, _ in pending]
+        )
+        while True:
+            batch = list(itertools.islice(rows, browser.fetch_size))
+            if not batch:
+                break
+            for visit_id, _ in batch:
+                gaps.add(visit_id)
+            new_visits += self.conn.executemany(
+                "INSERT OR IGNORE INTO visits VALUES (?, ?, ?, ?)",
+                [
+                    (profile, visit_id, _micros(timestamp), url)
+                    for visit_id, (timestamp, url) in batch
+                ],
+            ).rowcount
+        self.conn.execute("DELETE FROM pending WHERE profile = ?", (profile,))
+        self.conn.executemany(
+            "INSERT INTO pending VALUES (?, ?, ?, ?)",
+            [(profile,) + gap for gap in gaps.ranges()],
+        )
+        return gaps.last_id, new_visits
+
+    def _refresh_times(self, browser, history_path, profile, watermark):
+        """Stores the visits of a single profile made from
+        :py:attr:`pending_time` before the ``watermark`` time on, for browsers
+        without visit ids, and returns the new watermark and the number of new
+        visits. See :py:meth:`_refresh_profile`."""
+        since = None
+        if watermark is not None:
+            # visits left out of the history for now are read again
+            since = generic._UNIX_EPOCH + (
+                generic._MICROSECOND * watermark - self.pending_time
+            )
+        rows = browser.iter_history([history_path], since=since)
+        new_visits = 0
+        while True:
+            visits = [
+                (profile, None, _micros(timestamp), url)
+                for timestamp, url in itertools.islice(rows, browser.fetch_size)
+            ]
+            if not visits:
+                break
+            new_visits += self.conn.executemany(
+                "INSERT OR IGNORE INTO visits VALUES (?, ?, ?, ?)", visits
+            ).rowcount
+            latest = max(visit_time for _, _, visit_time, _ in visits)
+            watermark = latest if watermark is None else max(watermark, latest)
+        return watermark, new_visits
+
+    def refresh(self, browser_classes=None) -> int:
+        """Reads the visits added since the last refresh from all profiles of
+        the ``browser_classes`` into the store.
+
+        Profiles whose history files have not changed are not read at all.
+        Profiles which no longer exist are removed from the store.
+
+        :param browser_classes: (optional) browsers to refresh. Defaults to
+            all browsers from :py:func:`browser_history.utils.get_browsers`.
+        :type browser_classes: list(:py:class:`browser_history.generic.Browser`)
+        :return: the number of new visits.
+        :rtype: int
+        """
+        if browser_classes is None:
+            browser_classes = utils.get_browsers()
+        new_visits = 0
+        for browser_class in browser_classes:
+            try:
+                browser = browser_class()
+            except AssertionError:
+                utils.logger.info("%s browser is not supported", browser_class.name)
+                continue
+            history_paths = [
+                str(path) for path in browser.paths(profile_file=browser.history_file)
+            ]
+            with self.conn:
+                for history_path in history_paths:
+                    new_visits += self._refresh_profile(browser, history_path)
+                stale = self.conn.execute(
+                    "SELECT id, path FROM profiles WHERE browser = ?",
+                    (browser.name,),
+                ).fetchall()
+                for profile, path in stale:
+                    if path not in history_paths:
+                        self.conn.execute(
+                            "DELETE FROM visits WHERE profile = ?", (profile,)
+                        )
+                        self.conn.execute(
+                            "DELETE FROM pending WHERE profile = ?", (profile,)
+                        )
+                        self.conn.execute(
+                            "DELETE FROM profiles WHERE id = ?", (profile,)
+                        )
+        return new_visits
+
+    def iter_history(
+        self,
+        since=None,
+        until=None,
+        url_filter=None,
+        browsers=None,
+        desc=False,
+        tz: typing.Optional[datetime.tzinfo] = None,
+        limit=None,
+    ):
+        """Yields the stored history, sorted by time and then URL, one
+        ``(datetime, url)`` tuple at a time.
+
+        :param since: (optional) only return visits made at or after this
+            time. Naive datetimes are taken to be in the local timezone.
+        :type since: :py:class:`datetime.datetime`
+        :param until: (optional) only return visits made before this time.
+        :type until: :py:class:`datetime.datetime`
+        :param url_filter: (optional) only return visits to the URLs matching
+            this filter.
+        :type url_filter: :py:class:`browser_history.generic.UrlFilter`
+        :param browsers: (optional) names of the browsers whose visits are
+            returned. Defaults to all browsers.
+        :type browsers: list(str)
+        :param desc: (optional) flag to return the newest visits first.
+            Default value set to False.
+        :type desc: boolean
+        :param tz: (optional) timezone of the returned datetimes. Defaults to
+            the system's local timezone.
+        :type tz: :py:class:`datetime.tzinfo`
+        :param limit: (optional) maximum number of visits to return.
+        :type limit: int
+        :rtype: iterator(tuple(:py:class:`datetime.datetime`, str))
+        """
+        conditions = []
+        params = []
+        if since is not None:
+            conditions.append("visit_time >= ?")
+            params.append(_micros(since.astimezone()))
+        if until is not None:
+            conditions.append("visit_time < ?")
+            params.append(_micros(until.astimezone()))
+        if url_filter:
+            condition, filter_params = url_filter.where()
+            conditions.append(condition)
+            params.extend(filter_params)
+        if browsers is not None:
+            conditions.append(
+                "profile IN (SELECT id FROM profiles WHERE browser IN "
+                f"({', '.join('?' * len(browsers))}))"
+            )
+            params.extend(browsers)
+        query = "SELECT visit_time, url FROM visits"
+        if conditions:
+            query += f" WHERE {' AND '.join(conditions)}"
+        order = "DESC" if desc else "ASC"
+        query += f" ORDER BY visit_time {order}, url {order}"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        converter = generic._TimezoneConverter(tz)
+        cursor = self.conn.execute(query, params)
+        for batch in generic._fetch_batches(cursor, 1000):
+            yield from zip(
+                converter.datetimes([visit_time for visit_time, _ in batch]),
+                (url for _, url in batch),
+            )
@@ -2,11 +2,12 @@
 Module defines Platform class enumerates the popular Operating Systems.
 
 """
+import configparser
 import enum
-import inspect
 import logging
+import os
 import platform
-import subprocess
+from pathlib import Path
 from typing import Optional
 
 from . import generic
@@ -69,36 +70,170 @@ def get_platform_name(plat: Optional[Platform] = None) -> str:
     return "Unknown"
 
 
-def get_browsers():
-    """This method provides a list of all browsers implemented by
-    browser_history.
-
-    :return: A :py:class:`list` containing implemented browser classes
-        all inheriting from the super class
-        :py:class:`browser_history.generic.Browser`
+class _BrowserIndex:
+    """Index of the concrete browser classes by lower-cased name.
 
-    :rtype: :py:class:`list`
+    ``class_names`` maps the class names (used by :py:func:`get_browser`),
+    ``names`` the :py:attr:`browser_history.generic.Browser.name` and the
+    aliases of every browser, and ``aliases`` only the aliases. When several
+    browsers share a name, the first one in ``browsers`` is kept.
     """
 
+    def __init__(self, browsers):
+        self.browsers = browsers
+        self.class_names = {}
+        self.names = {}
+        self.aliases = {}
+        for browser in browsers:
+            self.class_names.setdefault(browser.__name__.lower(), browser)
+            self.names.setdefault(browser.name.lower(), browser)
+            for alias in browser.aliases:
+                self.names.setdefault(alias, browser)
+                self.aliases.setdefault(alias, browser)
+
+    def alias_prefix(self, name):
+        """Returns the browser with the longest alias which ``name`` starts
+        with, or ``None``. Only the prefixes of ``name`` are looked up, so
+        this does not depend on the number of aliases."""
+        for end in range(len(name), 0, -1):
+            browser = self.aliases.get(name[:end])
+            if browser is not None:
+                return browser
+        return None
+
+
+# built when first needed and reset whenever a subclass of Browser is defined,
+# see Browser.__init_subclass__
+_browser_index: Optional[_BrowserIndex] = None
+
+
+def _get_browser_index():
+    """Returns the :py:class:`_BrowserIndex` of all concrete subclasses of
+    :py:class:`browser_history.generic.Browser`, building it if a subclass
+    has been defined since it was last built."""
+    global _browser_index  # pylint: disable=global-statement
+
     # recursively get all concrete subclasses
     def get_subclasses(browser):
         # include browser itself in return list if it is concrete
         sub_classes = []
-        if not inspect.isabstract(browser):
+        if not browser.__abstractmethods__:
             sub_classes.append(browser)
 
         for sub_class in browser.__subclasses__():
             sub_classes.extend(get_subclasses(sub_class))
         return sub_classes
 
-    return get_subclasses(generic.Browser)
+    if _browser_index is None:
+        # the browsers are only imported once they are needed
+        from . import browsers  # noqa: F401
 
+        _browser_index = _BrowserIndex(get_subclasses(generic.Browser))
+    return _browser_index
 
-if get_platform() == Platform.WINDOWS:
-    import winreg  # type: ignore
+
+def get_browsers():
+    """This method provides a list of all browsers implemented by
+    browser_history. The subclasses of
+    :py:class:`browser_history.generic.Browser` are only searched again
+    after a new one is defined.
+
+    :return: A :py:class:`list` containing implemented browser classes
+        all inheriting from the super class
+        :py:class:`browser_history.generic.Browser`
+
+    :rtype: :py:class:`list`
+    """
+    return list(_get_browser_index().browsers)
+
+
+def _mimeapps_paths():
+    """Returns the ``mimeapps.list`` files which set the default applications,
+    in order of precedence, as given by the XDG MIME Applications
+    specification: the desktop specific and generic files of
+    ``$XDG_CONFIG_HOME``, ``$XDG_CONFIG_DIRS``, ``$XDG_DATA_HOME/applications``
+    and the ``applications`` directory of ``$XDG_DATA_DIRS``."""
+    home = Path.home()
+    config_home = os.environ.get("XDG_CONFIG_HOME") or str(home / ".config")
+    config_dirs = (os.environ.get("XDG_CONFIG_DIRS") or "/etc/xdg").split(":")
+    data_home = os.environ.get("XDG_DATA_HOME") or str(home / ".local/share")
+    data_dirs = (
+        os.environ.get("XDG_DATA_DIRS") or "/usr/local/share:/usr/share"
+    ).split(":")
+    desktops = os.environ.get("XDG_CURRENT_DESKTOP", "").lower().split(":")
+    names = [f"{desktop}-mimeapps.list" for desktop in desktops if desktop]
+    names.append("mimeapps.list")
+    directories = (
+        [config_home] + config_dirs + [os.path.join(data_home, "applications")]
+    )
+    directories += [os.path.join(data_dir, "applications") for data_dir in data_dirs]
+    return [
+        os.path.join(directory, name)
+        for directory in directories
+        if directory
+        for name in names
+    ]
+
+
+def _read_mimeapps(paths):
+    """Returns the desktop entry of the default handler of ``http`` URLs set in
+    the first of the ``mimeapps.list`` files ``paths`` which sets one, or
+    ``None``."""
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        parser = configparser.ConfigParser(
+            strict=False, interpolation=None, allow_no_value=True
+        )
+        # the keys are MIME types, which are case-sensitive
+        parser.optionxform = str  # type: ignore
+        try:
+            parser.read(path, encoding="utf-8")
+        except (configparser.Error, UnicodeDecodeError):
+            logger.info("Could not read %s", path)
+            continue
+        handlers = parser.get(
+            "Default Applications", "x-scheme-handler/http", fallback=None
+        )
+        for handler in (handlers or "").split(";"):
+            if handler.strip():
+                return handler.strip()
+    return None
+
+
+# (paths, their modification times, default browser) of the last call of
+# _default_browser_linux, from the files or from xdg-settings
+_mimeapps_cache: Optional[tuple] = None
 
 
 def _default_browser_linux():
+    global _mimeapps_cache  # pylint: disable=global-statement
+
+    paths = _mimeapps_paths()
+    mtimes = []
+    for path in paths:
+        try:
+            mtimes.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            mtimes.append(None)
+    if _mimeapps_cache is None or _mimeapps_cache[:2] != (paths, mtimes):
+        _mimeapps_cache = (paths, mtimes, _xdg_default_browser(paths))
+    return _mimeapps_cache[2]
+
+
+def _xdg_default_browser(paths):
+    """Returns the name of the default browser set in the ``mimeapps.list``
+    files ``paths``, or by ``xdg-settings`` if they do not set one."""
+    default = _read_mimeapps(paths)
+    if default is not None:
+        # like xdg-settings, without the ".desktop" suffix
+        return default.lower().replace(".desktop", "")
+
+    # the files do not say, xdg-settings might know (from the settings of the
+    # desktop environment). Imported here, like winreg below, to keep
+    # importing the package fast.
+    import subprocess
+
     try:
         cmd = "xdg-settings get default-web-browser".split()
         raw_result = subprocess.check_output(cmd, stderr=subprocess.DEVNULL)
@@ -112,6 +247,8 @@ def _default_browser_linux():
 
 
 def _default_browser_win():
+    import winreg  # type: ignore
+
     reg_path = (
         "Software\\Microsoft\\Windows\\Shell\\Associations\\"
         "UrlAssociations\\https\\UserChoice"
@@ -152,21 +289,19 @@ def default_browser():
         return None
 
     # ---- convert obtained default to something we understand ----
-    all_browsers = get_browsers()
+    browser_index = _get_browser_index()
 
     # first quick pass for direct matches
-    for browser in all_browsers:
-        if default == browser.name.lower() or default in browser.aliases:
-            return browser
-
-    # separate pass for deeper matches
-    for browser in all_browsers:
-        # look for alias matches even if the default name has "noise"
-        # for instance firefox on windows returns something like
-        # "firefoxurl-3EEDF34567DDE" but we only need "firefoxurl"
-        for alias in browser.aliases:
-            if alias in default:
-                return browser
+    browser = browser_index.names.get(default)
+    if browser is not None:
+        return browser
+
+    # look for alias matches even if the default name has "noise"
+    # for instance firefox on windows returns something like
+    # "firefoxurl-3EEDF34567DDE" but we only need "firefoxurl"
+    browser = browser_index.alias_prefix(default)
+    if browser is not None:
+        return browser
 
     # nothing was found
     logger.warning("Current default browser is not supported")
@@ -191,19 +326,14 @@ def get_browser(browser_name):
     if browser_name == "default":
         return default_browser()
     else:
-        browser_class = None
-        for browser in get_browsers():
-            if browser.__name__.lower() == browser_name.lower():
-                if browser.is_supported():
-                    browser_class = browser
-                    break
-                else:
-                    logger.error(
-                        "%s browser is not supported on %s",
-                        browser_name,
-                        get_platform_name(),
-                    )
-                    return
+        browser_class = _get_browser_index().class_names.get(browser_name.lower())
+        if browser_class is not None and not browser_class.is_supported():
+            logger.error(
+                "%s browser is not supported on %s",
+                browser_name,
+                get_platform_name(),
+            )
+            return
 
         if browser_class is None:
             logger.error(
@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+from benchmarks import fixtures, suite
+from browser_history import browsers
+
+
+def test_fixtures(tmp_path):
+    """Test the generated profiles are read by the browsers"""
+    fixtures.generate(tmp_path / "home", 2000, profiles=2, seed=1)
+    with suite.emulate(tmp_path / "home", "Linux"):
+        chromium = browsers.Chromium()
+        assert len(chromium.paths(profile_file="History")) == 2
+        his = chromium.fetch_history().histories
+        # visits without a duration are left out
+        assert 1500 < len(his) < 2000
+        assert his == sorted(his)
+        assert len(chromium.fetch_bookmarks().bookmarks) == 20
+
+        firefox = browsers.Firefox()
+        assert len(firefox.paths(profile_file="places.sqlite")) == 2
+        # visits of places without a title are left out
+        assert 1700 < len(firefox.fetch_history().histories) < 2000
+        assert 0 < len(firefox.fetch_bookmarks().bookmarks) <= 20
+    with suite.emulate(tmp_path / "home", "Darwin"):
+        his = browsers.Safari().fetch_history().histories
+        assert len(his) == 2000
+        assert all(url.startswith("https://") for _, url in his)
+
+    # the same seed generates the same profiles
+    fixtures.generate(tmp_path / "again", 2000, profiles=2, seed=1)
+    for path in ("Local State", "Default/Bookmarks", "Profile 1/History"):
+        assert (tmp_path / "home/.config/chromium" / path).read_bytes() == (
+            tmp_path / "again/.config/chromium" / path
+        ).read_bytes()
+
+
+def test_run_and_compare(tmp_path):
+    """Test running the benchmarks and comparing them with a baseline"""
+    fixtures.generate(tmp_path, 500, profiles=1)
+    results = suite.run(tmp_path, 500, repeat=2, only=["Safari.*", "all.write.csv"])
+    names = [(result["browser"], result["name"]) for result in results]
+    assert ("Safari", "discovery") in names
+    assert ("Safari", "fetch_history") in names
+    assert ("Safari", "export.csv") in names
+    assert names[-1] == ("all", "write.csv")
+    assert not any(browser == "Chromium" for browser, _ in names)
+    fetched = results[names.index(("Safari", "fetch_history"))]
+    assert fetched["rows"] == 500
+    assert fetched["size"] == 500
+    assert len(fetched["times"]) == 2
+    assert fetched["best"] <= fetched["median"]
+    json.dumps(results)
+
+    compared, regressed = suite.compare(results, results)
+    assert len(compared) == len(results)
+    assert regressed == []
+    baseline = [dict(result, best=result["best"] / 2) for result in results[:3]]
+    compared, regressed = suite.compare(results, baseline, threshold=1.5)
+    assert [ratio for _, ratio in compared] == pytest.approx([2.0] * 3)
+    assert [result for result, _ in regressed] == results[:3]
@@ -1,5 +1,12 @@
 import datetime
+import os
+import threading
+from io import StringIO
 from pathlib import Path
+from urllib.parse import urlparse
+
+import pytest
+from dateutil import tz
 
 from .context import browser_history
 from .utils import (  # noqa: F401; pylint: disable=unused-import
@@ -9,11 +16,29 @@ from .utils import (  # noqa: F401; pylint: disable=unused-import
     change_homedir,
     assert_histories_equal,
     assert_bookmarks_equal,
+    make_chromium_history,
+    add_chromium_visits,
 )
 
 
 # pylint: disable=redefined-outer-name,unused-argument
 
+# Firefox history query returning the visit times as strings, like browsers
+# without a history_epoch
+LEGACY_FIREFOX_HISTORY_SQL = """
+    SELECT
+        datetime(visit_date/1000000, 'unixepoch', 'localtime') AS visit_time,
+        url
+    FROM
+        moz_historyvisits
+    INNER JOIN
+        moz_places
+    ON
+        moz_historyvisits.place_id = moz_places.id
+    WHERE
+        visit_date IS NOT NULL AND url LIKE 'http%' AND title IS NOT NULL
+"""
+
 
 def test_firefox_linux(become_linux, change_homedir):  # noqa: F811
     """Test history is correct on Firefox for Linux"""
@@ -34,6 +59,7 @@ def test_firefox_linux(become_linux, change_homedir):  # noqa: F811
                 0,
                 29,
                 4,
+                790851,
                 tzinfo=datetime.timezone(datetime.timedelta(seconds=19800), "IST"),
             ),
             "https://www.mozilla.org/en-US/privacy/firefox/",
@@ -74,6 +100,7 @@ def test_firefox_linux(become_linux, change_homedir):  # noqa: F811
                 0,
                 29,
                 4,
+                790851,
                 tzinfo=datetime.timezone(datetime.timedelta(seconds=19800), "IST"),
             ),
             "https://www.mozilla.org/en-US/privacy/firefox/",
@@ -100,6 +127,7 @@ def test_chrome_linux(become_linux, change_homedir):  # noqa: F811
                 15,
                 34,
                 30,
+                444700,
                 tzinfo=datetime.timezone(datetime.timedelta(seconds=7200), "CEST"),
             ),
             "www.github.com",
@@ -140,6 +168,7 @@ def test_chrome_linux(become_linux, change_homedir):  # noqa: F811
                 15,
                 34,
                 30,
+                444700,
                 tzinfo=datetime.timezone(datetime.timedelta(seconds=7200), "CEST"),
             ),
             "www.github.com",
@@ -166,6 +195,7 @@ def test_chromium_linux(become_linux, change_homedir):  # noqa: F811
                 15,
                 34,
                 30,
+                444700,
                 tzinfo=datetime.timezone(datetime.timedelta(seconds=7200), "CEST"),
             ),
             "www.github.com",
@@ -212,6 +242,7 @@ def test_chromium_linux(become_linux, change_homedir):  # noqa: F811
                 15,
                 34,
                 30,
+                444700,
                 tzinfo=datetime.timezone(datetime.timedelta(seconds=7200), "CEST"),
             ),
             "www.github.com",
@@ -241,6 +272,7 @@ def test_firefox_windows(become_windows, change_homedir):  # noqa: F811
                 11,
                 43,
                 35,
+                505000,
                 tzinfo=datetime.timezone(
                     datetime.timedelta(seconds=10800), "E. Africa Standard Time"
                 ),
@@ -275,6 +307,7 @@ def test_firefox_windows(become_windows, change_homedir):  # noqa: F811
                 14,
                 2,
                 14,
+                571000,
                 tzinfo=datetime.timezone(
                     datetime.timedelta(seconds=10800), "E. Africa Standard Time"
                 ),
@@ -294,6 +327,7 @@ def test_firefox_windows(become_windows, change_homedir):  # noqa: F811
                 14,
                 2,
                 14,
+                571000,
                 tzinfo=datetime.timezone(
                     datetime.timedelta(seconds=10800),
                     "E. Africa Standard Time",
@@ -321,6 +355,7 @@ def test_edge_windows(become_windows, change_homedir):  # noqa: F811
                 10,
                 45,
                 3,
+                287293,
                 tzinfo=datetime.timezone(
                     datetime.timedelta(seconds=19800), "India Standard Time"
                 ),
@@ -349,6 +384,7 @@ def test_edge_windows(become_windows, change_homedir):  # noqa: F811
                 10,
                 45,
                 3,
+                287293,
                 tzinfo=datetime.timezone(
                     datetime.timedelta(seconds=19800), "India Standard Time"
                 ),
@@ -375,6 +411,7 @@ def test_safari_mac(become_mac, change_homedir):  # noqa: F811
                 23,
                 34,
                 28,
+                118028,
                 tzinfo=datetime.timezone(datetime.timedelta(seconds=19800), "IST"),
             ),
             "https://www.apple.com/in/",
@@ -391,6 +428,7 @@ def test_safari_mac(become_mac, change_homedir):  # noqa: F811
                 23,
                 35,
                 8,
+                555181,
                 tzinfo=datetime.timezone(datetime.timedelta(seconds=19800), "IST"),
             ),
             "https://pesos.github.io/",
@@ -416,6 +454,7 @@ def test_opera_windows(become_windows, change_homedir):  # noqa: F811
                 12,
                 4,
                 51,
+                760636,
                 tzinfo=datetime.timezone(
                     datetime.timedelta(seconds=10800), "E. Africa Standard Time"
                 ),
@@ -451,6 +490,7 @@ def test_opera_windows(become_windows, change_homedir):  # noqa: F811
                 12,
                 4,
                 59,
+                199346,
                 tzinfo=datetime.timezone(
                     datetime.timedelta(seconds=10800), "E. Africa Standard Time"
                 ),
@@ -483,6 +523,7 @@ def test_brave_windows(become_windows, change_homedir):  # noqa: F811
                 21,
                 58,
                 11,
+                196811,
                 tzinfo=datetime.timezone(
                     datetime.timedelta(seconds=10800), "E. Africa Standard Time"
                 ),
@@ -517,6 +558,7 @@ def test_brave_windows(become_windows, change_homedir):  # noqa: F811
                 22,
                 1,
                 29,
+                1322,
                 tzinfo=datetime.timezone(
                     datetime.timedelta(seconds=10800), "E. Africa Standard Time"
                 ),
@@ -536,6 +578,7 @@ def test_brave_windows(become_windows, change_homedir):  # noqa: F811
                 22,
                 0,
                 40,
+                217762,
                 tzinfo=datetime.timezone(
                     datetime.timedelta(seconds=10800), "E. Africa Standard Time"
                 ),
@@ -564,6 +607,7 @@ def test_vivaldi_mac(become_mac, change_homedir):  # noqa: F811
                 14,
                 25,
                 3,
+                23354,
                 tzinfo=datetime.timezone(datetime.timedelta(seconds=19800), "IST"),
             ),
             "https://vivaldi.com/whats-new-in-vivaldi-3-5/",
@@ -581,8 +625,502 @@ def test_vivaldi_mac(become_mac, change_homedir):  # noqa: F811
                 14,
                 25,
                 27,
+                607197,
                 tzinfo=datetime.timezone(datetime.timedelta(seconds=19800), "IST"),
             ),
             "https://pesos.github.io/",
         ),
     )
+
+
+def test_iter_history_windows(become_windows, change_homedir):  # noqa: F811
+    """Test iter_history yields the same rows as fetch_history, in batches"""
+    f = browser_history.browsers.Firefox()
+    f.fetch_size = 1
+    rows = f.iter_history()
+    assert not isinstance(rows, list)
+    assert sorted(rows) == f.fetch_history().histories
+    bmk = sorted(f.iter_bookmarks())
+    assert bmk == f.fetch_bookmarks().bookmarks
+    assert len(bmk) == 14
+
+
+def test_get_history_workers(become_windows, change_homedir):  # noqa: F811
+    """Test fetching browsers concurrently gives the same output as serially"""
+    his = browser_history.get_history().histories
+    assert len(his) > 0
+    assert browser_history.get_history(workers=4).histories == his
+    bmk = browser_history.get_bookmarks().bookmarks
+    assert browser_history.get_bookmarks(workers=4).bookmarks == bmk
+
+
+def test_iter_history_workers_close(monkeypatch):
+    """Test closing the history of concurrently fetched browsers early does
+    not fetch the browsers which have not started yet"""
+    first = browser_history.utils.get_browsers()[0]
+    started = []
+    release = threading.Event()
+
+    def fetch_browser(fetch_type, browser_class, **kwargs):
+        started.append(browser_class)
+        if browser_class is not first:
+            # keeps the other workers busy until the history is closed
+            release.wait(1)
+        return [(datetime.datetime.now(), browser_class.name)]
+
+    monkeypatch.setattr(browser_history, "_fetch_browser", fetch_browser)
+    rows = browser_history.iter_history(workers=2)
+    assert next(rows)[1] == first.name
+    rows.close()
+    release.set()
+    # the first browser, and the ones the two workers took after it
+    assert len(started) <= 3
+
+
+def test_fetch_history_workers(become_windows, change_homedir):  # noqa: F811
+    """Test fetching profiles concurrently gives the same output as serially"""
+    f = browser_history.browsers.Firefox()
+    assert len(f.profiles(f.history_file)) == 2
+    assert list(f.iter_history(workers=2)) == list(f.iter_history())
+    assert f.fetch_history(workers=2).histories == f.fetch_history().histories
+    assert f.fetch_bookmarks(workers=2).bookmarks == f.fetch_bookmarks().bookmarks
+
+
+def test_fetch_history_columnar(become_windows, change_homedir):  # noqa: F811
+    """Test columnar outputs hold the same rows"""
+    f = browser_history.browsers.Firefox()
+    outputs = f.fetch_history(columnar=True)
+    assert isinstance(outputs.histories, browser_history.generic.ColumnarRows)
+    assert outputs.histories == f.fetch_history().histories
+    assert f.fetch_bookmarks(columnar=True).bookmarks == f.fetch_bookmarks().bookmarks
+    assert (
+        browser_history.get_history(columnar=True).histories
+        == browser_history.get_history().histories
+    )
+    assert (
+        browser_history.get_bookmarks(columnar=True).bookmarks
+        == browser_history.get_bookmarks().bookmarks
+    )
+
+
+def test_fetch_history_merge(become_windows, change_homedir):  # noqa: F811
+    """Test the merged profiles are sorted like the sorted unmerged rows"""
+    f = browser_history.browsers.Firefox()
+    unsorted_his = list(f.iter_history())
+    for desc in (False, True):
+        expected = sorted(unsorted_his, reverse=desc)
+        assert list(f.iter_history(sort=True, desc=desc)) == expected
+        assert f.fetch_history(desc=desc).histories == expected
+        assert f.fetch_history(desc=desc, workers=2).histories == expected
+    assert browser_history.get_history().histories == sorted(
+        browser_history.iter_history()
+    )
+
+
+@pytest.mark.parametrize("snapshot", browser_history.generic.SNAPSHOT_STRATEGIES)
+def test_snapshot_strategies(become_windows, change_homedir, snapshot):  # noqa: F811
+    """Test every snapshot strategy gives the same output"""
+    f = browser_history.browsers.Firefox()
+    assert len(f.fetch_history(snapshot=snapshot).histories) == 8
+    assert len(f.fetch_bookmarks(snapshot=snapshot).bookmarks) == 14
+    b = browser_history.browsers.Brave()
+    assert (
+        b.fetch_history(snapshot=snapshot).histories
+        == b.fetch_history(snapshot="copy").histories
+    )
+    assert len(b.fetch_bookmarks(snapshot=snapshot).bookmarks) == 4
+
+
+def test_snapshot_file(become_windows, change_homedir, tmp_path):  # noqa: F811
+    """Test the snapshots are taken in the given directory"""
+    f = browser_history.browsers.Firefox()
+    history_path = f.paths(f.history_file)[0]
+    assert f.snapshot_file(history_path, str(tmp_path), "direct") == str(history_path)
+    # the fixtures are not in use, so they are read directly
+    assert f.snapshot_file(history_path, str(tmp_path), "auto") == str(history_path)
+    for snapshot in ("copy", "clone", "backup"):
+        snapshot_path = f.snapshot_file(history_path, str(tmp_path), snapshot)
+        assert snapshot_path == str(tmp_path / "places.sqlite")
+        os.remove(snapshot_path)
+    with pytest.raises(ValueError):
+        f.snapshot_file(history_path, str(tmp_path), "invalid")
+
+    assert len(f.fetch_history(snapshot="copy", snapshot_dir=str(tmp_path)).histories)
+    # the temporary directory inside snapshot_dir is removed afterwards
+    assert not os.listdir(tmp_path)
+
+
+def test_snapshot_wal(become_linux, monkeypatch, tmp_path):  # noqa: F811
+    """Test the writes still in the -wal file of a database in use are read"""
+    monkeypatch.setattr(Path, "home", lambda: tmp_path)
+    history_path = tmp_path / ".config/chromium/Default/History"
+    # 2021-01-01 00:00:00 UTC
+    start = 13253932800000000
+    conn = make_chromium_history(history_path, [(start, "https://example.com/")])
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    add_chromium_visits(
+        conn, [(start + 1000000 * i, f"https://example.com/{i}") for i in range(1, 5)]
+    )
+    assert os.path.getsize(f"{history_path}-wal") > 0
+    # make the last checkpoint look older than the writes to the -wal file
+    os.utime(history_path, ns=(0, 0))
+
+    f = browser_history.browsers.Chromium()
+    for snapshot in ("auto", "copy", "clone", "backup"):
+        his = f.fetch_history(snapshot=snapshot).histories
+        assert [url for _, url in his][-1] == "https://example.com/4"
+        assert len(his) == 5
+        assert f.snapshot_staleness(history_path) == datetime.timedelta(0)
+    # reading the original directly misses the writes in the -wal file
+    assert len(f.fetch_history(snapshot="direct").histories) == 1
+    assert f.snapshot_staleness(history_path) > datetime.timedelta(days=365)
+    assert f.snapshot_staleness(tmp_path / "nonexistent") is None
+    conn.close()
+
+
+def test_profiles(become_linux, monkeypatch, tmp_path):  # noqa: F811
+    """Test the profiles are found with the prefixes, depth and registry"""
+    monkeypatch.setattr(Path, "home", lambda: tmp_path)
+    chromium_dir = tmp_path / ".config/chromium"
+    for profile_dir in (
+        "Default",
+        "Profile 1",
+        "Guest Profile",
+        "Default/Cache",
+        "Profile 1/a/b",
+    ):
+        (chromium_dir / profile_dir).mkdir(parents=True)
+        (chromium_dir / profile_dir / "History").touch()
+    c = browser_history.browsers.Chromium()
+    assert c.profiles(c.history_file) == ["Default", "Profile 1"]
+
+    scanned = []
+    scandir = os.scandir
+    monkeypatch.setattr(
+        os, "scandir", lambda path: scanned.append(path) or scandir(path)
+    )
+    assert c.profiles(c.history_file) == ["Default", "Profile 1"]
+    assert not scanned
+    (chromium_dir / "Profile 2").mkdir()
+    (chromium_dir / "Profile 2" / "History").touch()
+    assert c.profiles(c.history_file) == ["Default", "Profile 1", "Profile 2"]
+    assert scanned
+
+    (chromium_dir / "Local State").write_text(
+        '{"profile": {"info_cache": {"Profile 1": {}, "Profile 3": {}}}}'
+    )
+    assert c.profiles(c.history_file) == ["Profile 1"]
+    # an unreadable registry is ignored
+    (chromium_dir / "Local State").write_text("{")
+    assert len(c.profiles(c.history_file)) == 3
+
+    firefox_dir = tmp_path / ".mozilla/firefox"
+    for profile_dir in ("abc.default", "def.other", "ghi.removed"):
+        (firefox_dir / profile_dir).mkdir(parents=True)
+        (firefox_dir / profile_dir / "places.sqlite").touch()
+    (firefox_dir / "profiles.ini").write_text(
+        "[Profile0]\nName=default\nIsRelative=1\nPath=abc.default\n\n"
+        f"[Profile1]\nName=other\nIsRelative=0\nPath={firefox_dir / 'def.other'}\n"
+    )
+    f = browser_history.browsers.Firefox()
+    assert f.profiles(f.history_file) == ["abc.default", "def.other"]
+
+
+def test_fetch_cache(become_linux, monkeypatch, tmp_path):  # noqa: F811
+    """Test fetches are cached until the history files change"""
+    monkeypatch.setattr(Path, "home", lambda: tmp_path)
+    history_path = tmp_path / ".config/chromium/Default/History"
+    start = 13253932800000000
+    conn = make_chromium_history(history_path, [(start, "https://example.com/")])
+    cache = browser_history.generic.FetchCache()
+    monkeypatch.setattr(browser_history.generic.Browser, "fetch_cache", cache)
+    f = browser_history.browsers.Chromium()
+    his = f.fetch_history().histories
+    assert f.fetch_history().histories == his
+    assert (cache.hits, cache.misses) == (1, 1)
+    # other options are cached separately
+    assert f.fetch_history(desc=True).histories == his
+    assert (cache.hits, cache.misses) == (1, 2)
+
+    add_chromium_visits(conn, [(start + 1, "https://example.com/1")])
+    assert len(f.fetch_history().histories) == 2
+    assert (cache.hits, cache.misses) == (1, 3)
+    assert len(browser_history.browsers.Chromium().fetch_history().histories) == 2
+    assert (cache.hits, cache.misses) == (2, 3)
+    conn.close()
+
+
+def test_fetch_history_time_range(become_windows, change_homedir):  # noqa: F811
+    """Test since/until return the same visits as filtering afterwards"""
+    f = browser_history.browsers.Firefox()
+    his = f.fetch_history().histories
+    since, until = his[2][0], his[6][0]
+    expected = [entry for entry in his if since <= entry[0] < until]
+    assert 0 < len(expected) < len(his)
+    assert f.fetch_history(since=since, until=until).histories == expected
+    assert f.fetch_history(since=since).histories == his[2:]
+    assert f.fetch_history(until=until).histories == his[:6]
+    # without the native timestamps the visits are filtered in Python
+    python_filtered = browser_history.browsers.Firefox()
+    python_filtered.history_epoch = None
+    python_filtered.history_SQL = LEGACY_FIREFOX_HISTORY_SQL
+    assert python_filtered.fetch_history(since=since, until=until).histories == [
+        entry
+        for entry in python_filtered.fetch_history().histories
+        if since <= entry[0] < until
+    ]
+    # naive datetimes are in the local timezone
+    naive_since = since.astimezone().replace(tzinfo=None)
+    assert f.fetch_history(since=naive_since, until=until).histories == expected
+    assert browser_history.get_history(since=since, until=until).histories == [
+        entry
+        for entry in browser_history.get_history().histories
+        if since <= entry[0] < until
+    ]
+
+
+def test_safari_time_range(become_mac, change_homedir):  # noqa: F811
+    """Test since/until on Safari which stores timestamps in seconds"""
+    s = browser_history.browsers.Safari()
+    his = s.fetch_history().histories
+    since = his[1][0]
+    assert s.fetch_history(since=since).histories == his[1:]
+    assert s.fetch_history(until=since).histories == his[:1]
+
+
+def _in_domain(url, domain):
+    host = urlparse(url).hostname
+    return host == domain or host.endswith(f".{domain}")
+
+
+@pytest.mark.parametrize(
+    "url_filter, matches",
+    [
+        (
+            {"domains": ["reddit.com", "GitHub.com"]},
+            lambda url: _in_domain(url, "reddit.com") or _in_domain(url, "github.com"),
+        ),
+        (
+            {"exclude_domains": ["www.youtube.com"]},
+            lambda url: not _in_domain(url, "www.youtube.com"),
+        ),
+        (
+            {"prefixes": ["https://www."], "exclude_likes": ["%REDDIT%"]},
+            lambda url: url.startswith("https://www.") and "reddit" not in url,
+        ),
+        (
+            {"globs": ["*/en-US/*"], "likes": ["%GITHUB%"]},
+            lambda url: "/en-US/" in url or "github" in url,
+        ),
+        (
+            {"exclude_prefixes": ["http://"], "exclude_globs": ["*.org/*"]},
+            lambda url: not url.startswith("http://") and ".org/" not in url,
+        ),
+    ],
+)
+def test_url_filter(url_filter, matches, become_windows, change_homedir):  # noqa: F811
+    """Test URL filters return the same visits as filtering afterwards"""
+    # match domains without moz_places.rev_host
+    host_filtered = browser_history.browsers.Firefox()
+    host_filtered.history_rev_host = False
+    url_filter = browser_history.generic.UrlFilter(**url_filter)
+    his = browser_history.get_history().histories
+    expected = [entry for entry in his if matches(entry[1])]
+    assert 0 < len(expected) < len(his)
+    assert browser_history.get_history(url_filter=url_filter).histories == expected
+    for f in (browser_history.browsers.Firefox(), host_filtered):
+        assert f.fetch_history(url_filter=url_filter).histories == [
+            entry for entry in f.fetch_history().histories if matches(entry[1])
+        ]
+
+
+def test_timezone(become_windows, change_homedir):  # noqa: F811
+    """Test histories and bookmarks are returned in the given timezone"""
+    new_york = tz.gettz("America/New_York")
+    for browser_class in (
+        browser_history.browsers.Firefox,
+        browser_history.browsers.Brave,
+    ):
+        his = browser_class().fetch_history().histories
+        bmk = browser_class().fetch_bookmarks().bookmarks
+        ny_browser = browser_class(tz=new_york)
+        ny_his = ny_browser.fetch_history().histories
+        ny_bmk = ny_browser.fetch_bookmarks().bookmarks
+        assert ny_his == his
+        assert ny_bmk == bmk
+        for entry in ny_his + ny_bmk:
+            assert entry[0].tzinfo is new_york
+            assert entry[0].utcoffset() == new_york.utcoffset(entry[0])
+    # the bookmarks were added on both sides of DST transitions
+    assert {
+        entry[0].utcoffset()
+        for entry in browser_history.browsers.Firefox(tz=new_york)
+        .fetch_bookmarks()
+        .bookmarks
+    } == {datetime.timedelta(hours=-4), datetime.timedelta(hours=-5)}
+
+
+def test_fetch_history_limit(become_windows, change_homedir):  # noqa: F811
+    """Test limit returns the first visits in the sort order"""
+    f = browser_history.browsers.Firefox()
+    his = f.fetch_history().histories
+    for desc in (False, True):
+        expected = sorted(his, reverse=desc)
+        for limit in (0, 1, 3, 100):
+            assert f.fetch_history(desc=desc, limit=limit).histories == (
+                expected[:limit]
+            )
+            assert f.fetch_history(desc=desc, limit=limit, workers=2).histories == (
+                expected[:limit]
+            )
+    query, params = f._history_query(True, True, limit=3)
+    assert query.endswith("ORDER BY visit_time DESC, url DESC LIMIT ?")
+    assert params == [3]
+    # the bounds of browsers without native timestamps are applied in Python
+    python_filtered = browser_history.browsers.Firefox()
+    python_filtered.history_epoch = None
+    python_filtered.history_SQL = LEGACY_FIREFOX_HISTORY_SQL
+    legacy_his = python_filtered.fetch_history().histories
+    since = legacy_his[2][0]
+    assert python_filtered.fetch_history(since=since, limit=2).histories == (
+        legacy_his[2:4]
+    )
+
+    all_his = browser_history.get_history().histories
+    for desc in (False, True):
+        assert (
+            browser_history.get_history(desc=desc, limit=5).histories
+            == sorted(all_his, reverse=desc)[:5]
+        )
+    assert list(browser_history.iter_bookmarks(sort=True, desc=True, limit=2)) == (
+        sorted(browser_history.get_bookmarks().bookmarks, reverse=True)[:2]
+    )
+
+
+def _all_pages(fetch_page, page_size, **kwargs):
+    """Returns the histories of all pages returned by ``fetch_page``"""
+    pages = []
+    token = None
+    while True:
+        outputs, token = fetch_page(page_size=page_size, token=token, **kwargs)
+        assert len(outputs.histories) <= page_size
+        pages.append(outputs.histories)
+        if token is None:
+            return pages
+
+
+def test_fetch_history_page(become_windows, change_homedir):  # noqa: F811
+    """Test paging through the history returns every visit once, in order"""
+    f = browser_history.browsers.Firefox()
+    his = f.fetch_history().histories
+    for desc in (False, True):
+        for page_size in (1, 3, len(his), len(his) + 1):
+            pages = _all_pages(f.fetch_history_page, page_size, desc=desc)
+            assert all(len(page) == page_size for page in pages[:-1])
+            rows = [row for page in pages for row in page]
+            assert sorted(rows) == sorted(his)
+            assert rows == sorted(rows, key=lambda row: row[0], reverse=desc)
+    page, token = f.fetch_history_page(page_size=2)
+    assert f.fetch_history_page(page_size=2, token=token)[0].histories == (
+        f.fetch_history().histories[2:4]
+    )
+    query, params = f._history_keyset_query(
+        False, None, None, None, browser_history.generic._decode_page_token(token)
+    )
+    assert query.endswith("WHERE visit_time >= ? ORDER BY visit_time ASC, visit_id ASC")
+    assert params == [f._native_time(page.histories[-1][0]) - 1]
+    with pytest.raises(ValueError):
+        f.fetch_history_page(token="not a token")
+    with pytest.raises(ValueError):
+        f.fetch_history_page(token="WzEsMiwzXQ==")
+
+    # without native timestamps or visit ids
+    legacy = browser_history.browsers.Firefox()
+    legacy.history_epoch = None
+    legacy.history_visit_id = False
+    legacy.history_SQL = LEGACY_FIREFOX_HISTORY_SQL
+    legacy_his = legacy.fetch_history().histories
+    since = legacy_his[2][0]
+    pages = _all_pages(legacy.fetch_history_page, 2, desc=True, since=since)
+    assert [row for page in pages for row in page] == legacy_his[:1:-1]
+
+    all_his = browser_history.get_history().histories
+    pages = _all_pages(browser_history.get_history_page, 4)
+    assert [row for page in pages for row in page] == all_his
+
+
+def test_fetch_history_page_ties(become_linux, monkeypatch, tmp_path):  # noqa: F811
+    """Test pages split visits made at the same time by their visit id"""
+    monkeypatch.setattr(Path, "home", lambda: tmp_path)
+    start = 13253932800000000
+    visits = [(start + i // 3, f"https://example.com/{i % 3}") for i in range(7)]
+    conn = make_chromium_history(tmp_path / ".config/chromium/Default/History", visits)
+    c = browser_history.browsers.Chromium()
+    rows = [row for page in _all_pages(c.fetch_history_page, 2) for row in page]
+    assert [url for _, url in rows] == [url for _, url in visits]
+    rows = [
+        row for page in _all_pages(c.fetch_history_page, 2, desc=True) for row in page
+    ]
+    assert [url for _, url in rows] == [url for _, url in visits[::-1]]
+
+    # visits added after a page was returned are on the following pages
+    outputs, token = c.fetch_history_page(page_size=4)
+    add_chromium_visits(conn, [(start, "https://example.com/new")])
+    add_chromium_visits(conn, [(start + 5, "https://example.com/newer")])
+    rows = (
+        outputs.histories + c.fetch_history_page(page_size=10, token=token)[0].histories
+    )
+    assert [url for _, url in rows] == [url for _, url in visits] + [
+        "https://example.com/newer"
+    ]
+    conn.close()
+
+
+def _written(write, output_format, *args, **kwargs):
+    """Returns what ``write`` writes to a file in ``output_format``"""
+    out_file = StringIO()
+    write(out_file, output_format, *args, **kwargs)
+    return out_file.getvalue()
+
+
+@pytest.mark.parametrize("output_format", ["csv", "jsonl", "json"])
+def test_export_history(output_format, become_windows, change_homedir):  # noqa: F811
+    """Test the history written straight from SQLite is the same as writing the
+    rows of iter_history"""
+    f = browser_history.browsers.Firefox()
+    history_paths = f.paths(profile_file=f.history_file)
+    since = f.fetch_history().histories[2][0]
+    url_filter = browser_history.generic.UrlFilter(exclude_domains=["reddit.com"])
+    for options in (
+        {"sort": False},
+        {"sort": False, "limit": 3},
+        {"sort": True, "history_paths": history_paths[:1]},
+        {"sort": True, "history_paths": history_paths[:1], "desc": True, "limit": 2},
+        {"sort": True, "since": since, "url_filter": url_filter},
+    ):
+        outputs = browser_history.generic.Outputs(
+            "history", rows=f.iter_history(**options)
+        )
+        assert _written(f.export_history, output_format, **options) == (
+            _written(outputs.write, output_format)
+        )
+
+
+def test_export_history_timezones(become_linux, monkeypatch, tmp_path):  # noqa: F811
+    """Test SQLite formats the timestamps in the timezone of the browser"""
+    monkeypatch.setattr(Path, "home", lambda: tmp_path)
+    # every 5 hours and 7 minutes for two years, with a few microseconds
+    visits = [
+        (13253932800000000 + i * 18420000000 + i % 3, f'https://a.com/"{i}"ü,')
+        for i in range(3500)
+    ]
+    make_chromium_history(tmp_path / ".config/chromium/Default/History", visits).close()
+    for zone in (None, tz.gettz("Australia/Lord_Howe"), tz.gettz("America/St_Johns")):
+        c = browser_history.browsers.Chromium(tz=zone)
+        for output_format in ("csv", "jsonl"):
+            outputs = browser_history.generic.Outputs(
+                "history", rows=c.iter_history(sort=True)
+            )
+            assert _written(c.export_history, output_format) == (
+                _written(outputs.write, output_format)
+            )
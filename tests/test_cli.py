@@ -5,6 +5,7 @@ import tempfile
 import re
 
 import pytest
+from dateutil.parser import isoparse
 
 from browser_history.utils import get_browsers, get_browser
 from browser_history.cli import cli, AVAILABLE_BROWSERS
@@ -510,3 +511,158 @@ def test_firefox_windows_profile_invalid_type(caplog, type_arg):  # noqa: F811
             r"Type .* is unavailable. Check --help for available types",
             record.message,
         )
+
+
+@pytest.mark.parametrize("workers_arg", ("-w", "--workers"))
+def test_workers(capsys, become_windows, change_homedir, workers_arg):  # noqa: F811
+    """Test -w/--workers gives the same output as fetching serially"""
+    cli([])
+    serial_out = capsys.readouterr().out
+    cli([workers_arg, "4"])
+    out, err = capsys.readouterr()
+    assert out == serial_out
+    assert err == ""
+
+
+def test_since_until(capsys, become_windows, change_homedir):  # noqa: F811
+    """Test --since and --until only output history in the time range"""
+    cli(["-b", "firefox"])
+    all_lines = capsys.readouterr().out.strip().splitlines()[1:]
+    since, until = "2020-10-02T00:00+00:00", "2020-10-04T12:00Z"
+    cli(["-b", "firefox", "--since", since, "--until", until])
+    lines = capsys.readouterr().out.strip().splitlines()[1:]
+    assert 0 < len(lines) < len(all_lines)
+    assert all(
+        isoparse(since) <= isoparse(line.split(",")[0]) < isoparse(until)
+        for line in lines
+    )
+    # the fixtures are much older than a week
+    cli(["--since", "7d"])
+    assert capsys.readouterr().out.strip() == HISTORY_HEADER
+
+
+@pytest.mark.parametrize("time_arg", ("yesterday", "2020-13-01", "5y"))
+def test_since_invalid(capsys, time_arg):
+    """Test invalid --since values exit with an error"""
+    with pytest.raises(SystemExit) as e:
+        cli(["--since", time_arg])
+    assert e.value.code == 2
+    assert "invalid time" in capsys.readouterr().err
+
+
+def test_since_bookmarks(capsys):
+    """Test --since cannot be used with bookmarks"""
+    with pytest.raises(SystemExit) as e:
+        cli(["-t", "bookmarks", "--since", "1h"])
+    assert e.value.code == 2
+    assert "can only be used with history" in capsys.readouterr().err
+
+
+def test_url_filters(capsys, become_windows, change_homedir):  # noqa: F811
+    """Test the URL filter options"""
+    cli(["--domain", "reddit.com", "--domain", "github.com"])
+    lines = capsys.readouterr().out.strip().splitlines()
+    assert lines[0] == HISTORY_HEADER
+    assert len(lines) > 1
+    assert all("reddit.com/" in line or "github.com/" in line for line in lines[1:])
+    cli(["-b", "firefox", "--url-like", "%wiki%", "--exclude-url-glob", "*.org/"])
+    assert capsys.readouterr().out.strip() == HISTORY_HEADER
+
+
+@pytest.mark.parametrize(
+    "args",
+    (["-t", "bookmarks", "--domain", "github.com"], ["--url-prefix", ""]),
+)
+def test_url_filters_invalid(capsys, args):
+    """Test invalid URL filters exit with an error"""
+    with pytest.raises(SystemExit) as e:
+        cli(args)
+    assert e.value.code == 2
+
+
+def test_store(capsys, monkeypatch, tmp_path, become_windows, change_homedir):  # noqa
+    """Test --store outputs the same history as reading the browsers"""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    for browser in ("all", "firefox"):
+        cli(["-b", browser])
+        expected = capsys.readouterr().out
+        for _ in range(2):
+            cli(["-b", browser, "--store"])
+            assert capsys.readouterr().out == expected
+    assert (tmp_path / "browser-history/history.sqlite").exists()
+
+
+@pytest.mark.parametrize(
+    "args", (["-t", "bookmarks", "--store"], ["-b", "firefox", "-p", "x", "--store"])
+)
+def test_store_invalid(capsys, args):
+    """Test --store cannot be used with bookmarks or profiles"""
+    with pytest.raises(SystemExit) as e:
+        cli(args)
+    assert e.value.code == 2
+
+
+def test_limit(capsys, become_windows, change_homedir):  # noqa: F811
+    """Test --limit only outputs the first entries"""
+    for browser in ("all", "firefox"):
+        for output_type in ("history", "bookmarks"):
+            cli(["-b", browser, "-t", output_type])
+            expected = capsys.readouterr().out.splitlines()
+            cli(["-b", browser, "-t", output_type, "--limit", "3"])
+            assert capsys.readouterr().out.splitlines() == expected[:4] + [""]
+    cli(["--desc"])
+    latest = capsys.readouterr().out.splitlines()
+    cli(["--desc", "--limit", "2"])
+    assert capsys.readouterr().out.splitlines() == latest[:3] + [""]
+    for limit in ("0", "-1", "x"):
+        with pytest.raises(SystemExit) as e:
+            cli(["--limit", limit])
+        assert e.value.code == 2
+
+
+def test_broken_pipe(monkeypatch, tmp_path, become_windows, change_homedir):  # noqa
+    """Test the output stops without errors when its reader goes away"""
+
+    class ClosedStdout:
+        def __init__(self, path):
+            self.file = open(path, "w")  # pylint: disable=consider-using-with
+            self.written = 0
+
+        def write(self, text):
+            if self.written > 100:
+                raise BrokenPipeError()
+            self.written += len(text)
+            self.file.write(text)
+            self.file.flush()
+
+        def fileno(self):
+            return self.file.fileno()
+
+        def flush(self):
+            pass
+
+    stdout = ClosedStdout(tmp_path / "stdout")
+    monkeypatch.setattr("sys.stdout", stdout)
+    with pytest.raises(SystemExit) as e:
+        cli([])
+    assert e.value.code == 1
+    stdout.file.close()
+    assert (tmp_path / "stdout").read_text().startswith(CSV_HISTORY_HEADER)
+
+
+def test_stats(capsys, become_windows, change_homedir):  # noqa: F811
+    """Test --stats prints the time of every phase to stderr"""
+    cli(["-b", "firefox"])
+    expected = capsys.readouterr().out
+    cli(["-b", "firefox", "--stats"])
+    out, err = capsys.readouterr()
+    assert out == expected
+    lines = err.splitlines()
+    assert lines[0].split() == "Browser Phase Seconds Rows Bytes Profile".split()
+    assert any(line.split()[:2] == ["Firefox", "snapshot"] for line in lines)
+    cli(["--stats", "json", "-t", "bookmarks"])
+    out, err = capsys.readouterr()
+    phases = {(total["browser"], total["phase"]) for total in json.loads(err)}
+    assert ("Firefox", "discovery") in phases
+    assert ("Firefox", "parse") in phases
+    assert (None, "write.csv") in phases
@@ -1,6 +1,8 @@
 # noqa: F401, F811
 # pylint: disable=redefined-outer-name,unused-argument,unused-import
 
+import os
+
 import pytest
 
 from browser_history import browsers, utils
@@ -102,3 +104,85 @@ def test_default_windows_firefox(become_windows, change_win_default):  # noqa: F
 def test_default_windows_none(become_windows, change_win_default):  # noqa: F811
     """Test that registry returning None is handled correctly"""
     assert utils.default_browser() is None
+
+
+@pytest.fixture
+def xdg_dirs(monkeypatch, tmp_path):
+    """Points the XDG base directories to temporary ones and returns them"""
+    dirs = {
+        "XDG_CONFIG_HOME": tmp_path / "config",
+        "XDG_CONFIG_DIRS": tmp_path / "etc",
+        "XDG_DATA_HOME": tmp_path / "data",
+        "XDG_DATA_DIRS": tmp_path / "usr",
+    }
+    for var, path in dirs.items():
+        monkeypatch.setenv(var, str(path))
+    monkeypatch.setenv("XDG_CURRENT_DESKTOP", "ubuntu:GNOME")
+    monkeypatch.setattr(utils, "_mimeapps_cache", None)
+    return dirs
+
+
+def write_mimeapps(path, http=None):
+    """Writes a mimeapps.list setting ``http`` as the default handler"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lines = ["[Default Applications]", "text/html=other.desktop"]
+    if http is not None:
+        lines.append(f"x-scheme-handler/http={http}")
+    path.write_text("\n".join(lines) + "\n")
+
+
+def test_default_mimeapps(become_linux, xdg_dirs, monkeypatch):  # noqa: F811
+    """Test the default browser is read from the mimeapps.list cascade and
+    cached until the files change"""
+    import subprocess
+
+    def check_output(*args, **kwargs):
+        raise FileNotFoundError
+
+    monkeypatch.setattr(subprocess, "check_output", check_output)
+    assert utils.default_browser() is None
+
+    system = xdg_dirs["XDG_DATA_DIRS"] / "applications/mimeapps.list"
+    write_mimeapps(system, ";chromium.desktop;firefox.desktop")
+    assert utils.default_browser() == browsers.Chromium
+
+    user = xdg_dirs["XDG_CONFIG_HOME"] / "mimeapps.list"
+    write_mimeapps(user)
+    # no handler set by the user, the system default applies
+    assert utils.default_browser() == browsers.Chromium
+    write_mimeapps(xdg_dirs["XDG_CONFIG_HOME"] / "gnome-mimeapps.list", "Brave.desktop")
+    assert utils.default_browser() == browsers.Brave
+
+    read = []
+    monkeypatch.setattr(utils, "_read_mimeapps", lambda paths: read.append(paths))
+    assert utils.default_browser() == browsers.Brave
+    assert read == []
+    write_mimeapps(user, "firefox.desktop")
+    os.utime(user, ns=(0, 0))
+    assert utils.default_browser() is None
+    assert len(read) == 1
+
+
+def test_default_mimeapps_fallback(become_linux, xdg_dirs, monkeypatch):  # noqa: F811
+    """Test xdg-settings is only asked when the files do not say"""
+    import subprocess
+
+    calls = []
+
+    def check_output(cmd, **kwargs):
+        calls.append(cmd)
+        return b"opera.desktop\n"
+
+    monkeypatch.setattr(subprocess, "check_output", check_output)
+    xdg_dirs["XDG_CONFIG_HOME"].mkdir()
+    (xdg_dirs["XDG_CONFIG_HOME"] / "mimeapps.list").write_text("not an ini file\n")
+    assert utils.default_browser() == browsers.Opera
+    assert calls == [["xdg-settings", "get", "default-web-browser"]]
+    # the answer of xdg-settings is kept until the files change
+    for _ in range(3):
+        assert utils.default_browser() == browsers.Opera
+    assert len(calls) == 1
+
+    write_mimeapps(xdg_dirs["XDG_DATA_HOME"] / "applications/mimeapps.list", "vivaldi")
+    assert utils.default_browser() == browsers.Vivaldi
+    assert len(calls) == 1
@@ -2,9 +2,14 @@
 # -*- coding: utf-8 -*-
 # pylint: disable=protected-access
 """test for generic module."""
-from datetime import datetime
+import json
+import shutil
+import sqlite3
+from datetime import date, datetime, timedelta, timezone, tzinfo
+from io import StringIO
 
 import pytest
+from dateutil import tz
 from browser_history import generic
 
 
@@ -72,3 +77,319 @@ def test_output_sort_domain(entries, exp_res):
     obj = generic.Outputs("history")
     obj.histories.extend(entries)
     assert list(obj.sort_domain().items()) == exp_res
+
+
+def test_in_use(tmp_path):
+    """test generic._in_use"""
+    not_db = tmp_path / "Bookmarks"
+    not_db.write_text("{}")
+    assert not generic._in_use(not_db)
+
+    db_path = tmp_path / "History"
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE urls (url TEXT)")
+    conn.commit()
+    assert not generic._in_use(db_path)
+    # browsers hold an exclusive lock on the history while running
+    conn.execute("PRAGMA locking_mode = EXCLUSIVE")
+    conn.execute("INSERT INTO urls VALUES ('https://example.com')")
+    conn.commit()
+    assert generic._in_use(db_path)
+    conn.close()
+    assert not generic._in_use(db_path)
+
+    (tmp_path / "History-journal").write_bytes(b"")
+    assert generic._in_use(db_path)
+
+
+def test_copy_consistent(tmp_path):
+    """Test copies are retried when a file disappears while it is copied, and
+    the error is raised once the attempts run out"""
+    db_path = tmp_path / "History"
+    sqlite3.connect(str(db_path)).close()
+    (tmp_path / "History-journal").write_bytes(b"")
+    copies = []
+
+    def vanishing_copy(src, dst):
+        copies.append(src)
+        if src.endswith("-journal") and len(copies) < 3:
+            raise FileNotFoundError(src)
+        shutil.copyfile(src, dst)
+
+    generic._copy_consistent(str(db_path), str(tmp_path / "copy"), vanishing_copy)
+    assert len(copies) == 4
+    assert (tmp_path / "copy").exists()
+
+    def missing_copy(src, dst):
+        raise FileNotFoundError(src)
+
+    with pytest.raises(FileNotFoundError):
+        generic._copy_consistent(str(db_path), str(tmp_path / "copy2"), missing_copy)
+
+
+def test_url_filter():
+    """Test the conditions of URL filters"""
+    UrlFilter = generic.UrlFilter
+    assert not UrlFilter()
+    assert UrlFilter().where() == ("1", [])
+    url_filter = UrlFilter(domains=["Example.com"], exclude_prefixes=["http://"])
+    assert url_filter
+    condition, params = url_filter.where(rev_host=True)
+    assert condition == (
+        "((rev_host >= ? AND rev_host < ?)) AND NOT ((url >= ? AND url < ?))"
+    )
+    assert params == ["moc.elpmaxe.", "moc.elpmaxe/", "http://", "http:/0"]
+    assert UrlFilter(domains=["a*b.com"]).where()[1] == ["*.a[*]b.com:*"]
+    with pytest.raises(ValueError):
+        UrlFilter(likes=[""])
+
+
+@pytest.mark.parametrize(
+    "zone, transition",
+    [
+        ("Europe/London", datetime(2020, 10, 25, 1, tzinfo=timezone.utc)),
+        ("Europe/London", datetime(2021, 3, 28, 1, tzinfo=timezone.utc)),
+        # transitions of half an hour at half past the hour
+        ("Australia/Lord_Howe", datetime(2021, 4, 3, 14, 30, tzinfo=timezone.utc)),
+        ("Australia/Lord_Howe", datetime(2020, 10, 3, 15, 30, tzinfo=timezone.utc)),
+    ],
+)
+def test_timezone_converter(zone, transition):
+    """Test the cached timezone conversion across DST transitions"""
+    converter = generic._TimezoneConverter(tz.gettz(zone))
+    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    start = (transition - epoch) // timedelta(microseconds=1) - 3 * 3600 * 10**6
+    # every 7 minutes and 30.5 seconds for 6 hours around the transition
+    timestamps = range(start, start + 6 * 3600 * 10**6, 450500000)
+    for _ in range(2):
+        actual = converter.datetimes(timestamps)
+        expected = [
+            (epoch + timedelta(microseconds=micros)).astimezone(tz.gettz(zone))
+            for micros in timestamps
+        ]
+        assert [(d, d.utcoffset(), d.fold) for d in actual] == [
+            (d, d.utcoffset(), d.fold) for d in expected
+        ]
+
+
+def test_timezone_converter_local():
+    """Test the conversion to the system's local timezone"""
+    converter = generic._TimezoneConverter()
+    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    # every 5 days and 1 second for 4 years
+    timestamps = range(1577836800 * 10**6, 1704067200 * 10**6, 432001 * 10**6)
+    assert [(d, d.utcoffset()) for d in converter.datetimes(timestamps)] == [
+        (d, d.utcoffset())
+        for d in (
+            (epoch + timedelta(microseconds=micros)).astimezone()
+            for micros in timestamps
+        )
+    ]
+
+
+class StepTimezone(tzinfo):
+    """Timezone whose UTC offset moves forward at the given UTC times
+
+    :param steps: list of (UTC datetime, offset) tuples sorted by time
+    """
+
+    def __init__(self, steps):
+        self.steps = steps
+
+    def fromutc(self, dt):
+        utc = dt.replace(tzinfo=timezone.utc)
+        offsets = [step for start, step in self.steps if utc >= start]
+        return dt + (offsets[-1] if offsets else timedelta(0))
+
+    def utcoffset(self, dt):
+        local = dt.replace(tzinfo=timezone.utc)
+        for start, step in reversed(self.steps):
+            if local - step >= start:
+                return step
+        return timedelta(0)
+
+    def dst(self, dt):
+        return None
+
+    def tzname(self, dt):
+        return None
+
+
+def test_utc_offsets():
+    """Test every change of the UTC offset is found, even if there are
+    several in the week between two lookups"""
+    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    first = datetime(2021, 1, 1, tzinfo=timezone.utc)
+    changes = [
+        (first + timedelta(days=2, hours=3, seconds=7), timedelta(hours=1)),
+        (first + timedelta(days=4, minutes=30), timedelta(hours=2)),
+        (first + timedelta(days=20), timedelta(hours=2, minutes=30)),
+    ]
+    micros = [(time - epoch) // timedelta(microseconds=1) for time, _ in changes]
+    offsets = generic._utc_offsets(
+        StepTimezone(changes), micros[0] - 2 * 86400 * 10**6, micros[-1] + 10**6
+    )
+    assert offsets == [
+        (-(1 << 63), 0, "+00:00"),
+        (micros[0], 3600 * 10**6, "+01:00"),
+        (micros[1], 7200 * 10**6, "+02:00"),
+        (micros[2], 9000 * 10**6, "+02:30"),
+    ]
+
+
+def _outputs(rows):
+    outputs = generic.Outputs("history")
+    outputs.histories.extend((datetime(2020, 1, 1), str(i)) for i in range(rows))
+    return outputs
+
+
+def test_fetch_cache(monkeypatch):
+    """Test FetchCache invalidation, LRU eviction and expiry"""
+    cache = generic.FetchCache(max_entries=2, max_rows=5)
+    assert cache.get("a", 1) is None
+    cache.put("a", 1, _outputs(2))
+    cached = cache.get("a", 1)
+    assert cached.histories == _outputs(2).histories
+    # the cached outputs are copied
+    cached.histories.clear()
+    assert len(cache.get("a", 1).histories) == 2
+    # another fingerprint means the files changed
+    assert cache.get("a", 2) is None
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (2, 2)
+
+    cache.put("a", 1, _outputs(1))
+    cache.put("b", 1, _outputs(1))
+    assert cache.get("a", 1) is not None
+    cache.put("c", 1, _outputs(1))
+    # "b" is the least recently used
+    assert cache.get("b", 1) is None
+    assert cache.get("a", 1) is not None
+    cache.put("b", 1, _outputs(5))
+    # evicted to stay within max_rows
+    assert len(cache) == 1
+    cache.put("d", 1, _outputs(6))
+    assert cache.get("d", 1) is None
+
+    cache = generic.FetchCache(ttl=60)
+    now = [0]
+    monkeypatch.setattr(generic.time, "monotonic", lambda: now[0])
+    cache.put("a", 1, _outputs(1))
+    now[0] = 60
+    assert cache.get("a", 1) is not None
+    now[0] = 61
+    assert cache.get("a", 1) is None
+    cache.put("a", 1, _outputs(1))
+    cache.clear()
+    assert cache.get("a", 1) is None
+
+
+def test_columnar_rows():
+    """Test ColumnarRows behaves like the list of rows it replaces"""
+    ist = timezone(timedelta(hours=5, minutes=30))
+    rows = [
+        (datetime(2020, 1, 1, 10, tzinfo=ist), "https://b.com", "B", None),
+        (datetime(2020, 1, 1, 10, tzinfo=ist), "https://a.com", "A", "Folder"),
+        (datetime(2019, 12, 31, 23, 59, 59, 999999, ist), "https://b.com", "B", None),
+    ]
+    columnar = generic.ColumnarRows(4, tz=ist)
+    columnar.extend(rows)
+    assert columnar == rows
+    assert len(columnar) == 3
+    assert columnar[1] == rows[1]
+    assert columnar[-1] == rows[-1]
+    assert columnar[1:] == rows[1:]
+    with pytest.raises(IndexError):
+        columnar[3]  # pylint: disable=pointless-statement
+    # the strings are only stored once
+    assert len(columnar.strings) == 6
+
+    copy = generic.ColumnarRows(4, tz=timezone.utc)
+    copy.append(rows[0])
+    copy.extend(columnar)
+    assert copy == [rows[0]] + rows
+    assert copy[0][0].tzinfo == timezone.utc
+    for reverse in (False, True):
+        copy.sort(reverse=reverse)
+        assert copy == sorted([rows[0]] + rows, reverse=reverse)
+
+    # naive datetimes are in the local timezone
+    naive = generic.ColumnarRows(2)
+    naive.append((datetime(2020, 1, 1), "https://a.com"))
+    assert naive[0][0] == datetime(2020, 1, 1).astimezone()
+
+
+def test_outputs_columnar():
+    """Test columnar Outputs are formatted like row lists"""
+    outputs = generic.Outputs("history")
+    columnar = generic.Outputs("history", columnar=True, tz=timezone.utc)
+    for obj in (outputs, columnar):
+        obj.histories.extend(
+            [
+                (datetime(2020, 1, 1, tzinfo=timezone.utc), "https://google.com"),
+                (datetime(2020, 1, 2, tzinfo=timezone.utc), "https://example.com"),
+            ]
+        )
+    assert isinstance(columnar.histories, generic.ColumnarRows)
+    for output_format in ("csv", "json", "jsonl"):
+        assert columnar.formatted(output_format) == outputs.formatted(output_format)
+    assert columnar.sort_domain() == outputs.sort_domain()
+
+
+@pytest.mark.parametrize("rows", [0, 1, 3])
+@pytest.mark.parametrize("fetch_type", ["history", "bookmarks"])
+def test_outputs_write(fetch_type, rows, tmp_path):
+    """Test the streamed outputs are the same as the formatted strings"""
+    obj = generic.Outputs(fetch_type)
+    fields = obj.field_map[fetch_type]["fields"]
+    obj.field_map[fetch_type]["var"].extend(
+        (datetime(2020, 1, i + 1), f'https://example.com/\n"{i}"', "Title", "Bar")[
+            : len(fields)
+        ]
+        for i in range(rows)
+    )
+    records = [
+        dict(zip(fields, (entry[0].isoformat(),) + entry[1:]))
+        for entry in obj.field_map[fetch_type]["var"]
+    ]
+    assert obj.to_json() == json.dumps({fetch_type: records}, indent=4)
+    assert obj.to_json(True) == "\n".join(json.dumps(record) for record in records)
+    for output_format in ("csv", "json", "JSONL"):
+        out_file = StringIO()
+        obj.write(out_file, output_format)
+        assert out_file.getvalue() == obj.formatted(output_format)
+        obj.save(tmp_path / "out", output_format)
+        with open(tmp_path / "out", newline="") as saved:
+            assert saved.read() == obj.formatted(output_format)
+    with pytest.raises(ValueError):
+        obj.write(StringIO(), "xml")
+    with pytest.raises(ValueError):
+        obj.save(tmp_path / "invalid", "xml")
+    assert not (tmp_path / "invalid").exists()
+
+
+def test_outputs_json_reference():
+    """Test the JSON outputs are byte for byte the same as encoding every row
+    as a dict with json.dumps"""
+    offset = timezone(timedelta(hours=5, minutes=30))
+    bookmarks = [
+        (
+            datetime(2020, 1, 1, 12, 30, 5, 123456, tzinfo=offset),
+            "https://a.com/ü",
+            "Tï\u2028",
+            "/",
+        ),
+        (datetime(2020, 1, 2), 'https://b.com/"\\\t\x00', "\U0001f600", "Bar"),
+        # values of other types are encoded as before
+        (date(2020, 1, 3), "https://c.com/", None, 3.5),
+        ["2020-01-04", "https://d.com/", "List", "Row"],
+        (datetime(2020, 1, 5), "https://e.com/", "Short"),
+    ] * 700
+    obj = generic.Outputs("bookmarks", rows=bookmarks)
+    fields = obj.field_map["bookmarks"]["fields"]
+    records = [dict(zip(fields, entry)) for entry in bookmarks]
+    encoder = generic._DateTimeEncoder
+    assert obj.to_json() == json.dumps({"bookmarks": records}, cls=encoder, indent=4)
+    assert obj.to_json(True) == "\n".join(
+        json.dumps(record, cls=encoder) for record in records
+    )
@@ -1,5 +1,83 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
 from .context import browser_history  # noqa: F401
 
 
 def test_nothing():
     pass
+
+
+def run_python(*args):
+    """Runs a new Python interpreter from the root of the repository and
+    returns its standard output and error"""
+    process = subprocess.run(
+        [sys.executable, *args],
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    return process.stdout, process.stderr
+
+
+def test_import_is_lazy():
+    """Test importing the CLI does not import modules which are only needed
+    by a few options, to keep it starting fast"""
+    code = "import sys, browser_history.cli; print(' '.join(sorted(sys.modules)))"
+    modules = set(run_python("-c", code)[0].split())
+    assert "browser_history.cli" in modules
+    for module in (
+        "multiprocessing",
+        "inspect",
+        "subprocess",
+        "winreg",
+        "browser_history.browsers",
+        "browser_history.store",
+    ):
+        assert module not in modules
+
+
+def test_version_is_lazy():
+    """Test --version does not look up the browsers"""
+    code = (
+        "import sys\n"
+        "from browser_history.cli import cli\n"
+        "try:\n"
+        "    cli(['--version'])\n"
+        "except SystemExit:\n"
+        "    print(' '.join(sorted(sys.modules)))\n"
+    )
+    modules = set(run_python("-c", code)[0].split())
+    assert "browser_history.cli" in modules
+    assert "browser_history.browsers" not in modules
+
+
+def test_lazy_modules():
+    """Test the submodules which are not imported up front can still be used
+    as attributes of the package"""
+    code = (
+        "import browser_history\n"
+        "print(browser_history.browsers.Firefox.name)\n"
+        "print(browser_history.store.HistoryStore.__name__)\n"
+    )
+    assert run_python("-c", code)[0].split() == ["Firefox", "HistoryStore"]
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason="needs -X importtime")
+def test_import_time():
+    """Test importing the CLI stays well below the time it took before its
+    imports were made lazy. The bound is loose so that slow machines pass,
+    the tests above check what is imported."""
+    stderr = run_python("-X", "importtime", "-c", "import browser_history.cli")[1]
+    # lines look like "import time:  self [us] | cumulative | imported package"
+    times = {
+        line.split("|")[2].strip(): int(line.split("|")[1])
+        for line in stderr.splitlines()
+        if line.startswith("import time:") and "cumulative" not in line
+    }
+    assert times["browser_history.cli"] < 500000
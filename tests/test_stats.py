@@ -0,0 +1,83 @@
+import json
+from datetime import datetime
+
+from browser_history import browsers, get_history, stats
+from browser_history.generic import Outputs
+from .utils import become_windows, change_homedir  # noqa: F401
+
+# pylint: disable=redefined-outer-name,unused-argument
+
+
+def test_stats_fetch_history(become_windows, change_homedir):  # noqa: F811
+    """Test the phases of fetch_history are recorded per profile"""
+    profiles = browsers.Firefox().paths(profile_file="places.sqlite")
+    spans = []
+    with stats.Stats(callback=spans.append) as collected:
+        assert stats.enabled()
+        his = browsers.Firefox().fetch_history(snapshot="copy").histories
+    assert not stats.enabled()
+    assert spans == collected.spans
+    totals = collected.summary()
+
+    def phase_totals(phase, field):
+        return [total[field] for total in totals if total["phase"] == phase]
+
+    assert phase_totals("discovery", "rows") == [len(profiles)]
+    assert phase_totals("snapshot", "profile") == [str(path) for path in profiles]
+    assert all(nbytes > 0 for nbytes in phase_totals("snapshot", "bytes"))
+    assert sum(phase_totals("query", "rows")) == len(his)
+    assert sum(phase_totals("decode", "rows")) == len(his)
+    (fetch,) = [total for total in totals if total["phase"] == "fetch_history"]
+    assert fetch["rows"] == len(his)
+    assert fetch["seconds"] >= sum(
+        total["seconds"] for total in totals if total is not fetch
+    )
+    assert all(total["browser"] == "Firefox" for total in totals)
+
+    # nothing is recorded after the stats are stopped
+    browsers.Firefox().fetch_history()
+    assert len(collected.spans) == len(spans)
+
+
+def test_stats_get_history(become_windows, change_homedir):  # noqa: F811
+    """Test the spans of get_history, bookmarks and the outputs"""
+    with stats.Stats() as collected:
+        outputs = get_history()
+        csv_output = outputs.formatted("csv")
+        browsers.Firefox().fetch_bookmarks()
+    totals = collected.summary()
+    phases = [total["phase"] for total in totals]
+    assert phases.count("get_history") == 1
+    assert "parse" in phases and "sort" in phases
+    (formatted,) = [total for total in totals if total["phase"] == "format.csv"]
+    assert formatted["bytes"] == len(csv_output.encode())
+    get = totals[phases.index("get_history")]
+    assert get["rows"] == len(outputs.histories)
+    assert get["browser"] is None
+
+    assert json.loads(collected.to_json()) == totals
+    lines = collected.table().splitlines()
+    assert lines[0].split() == "Browser Phase Seconds Rows Bytes Profile".split()
+    assert len(lines) == len(totals) + 1
+
+
+def test_stats_disabled():
+    """Test spans are not recorded while no stats are active"""
+    with stats.span("format.csv") as span:
+        span.rows = 1
+    collected = stats.Stats()
+    with collected:
+        Outputs("history").formatted("json")
+    Outputs("history").formatted("json")
+    assert [span.phase for span in collected.spans] == ["format.json"]
+    assert collected.spans[0].nbytes > 0
+
+
+def test_stats_format_bytes():
+    """Test the size of formatted outputs is in bytes, not characters"""
+    outputs = Outputs("history")
+    outputs.histories.append((datetime(2020, 1, 1), "https://例え.jp/ü"))
+    with stats.Stats() as collected:
+        formatted = outputs.formatted("csv")
+    assert collected.spans[0].nbytes == len(formatted.encode("utf-8"))
+    assert collected.spans[0].nbytes > len(formatted)
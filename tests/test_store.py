@@ -0,0 +1,244 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from browser_history.store import HistoryStore, default_store_path
+from .context import browser_history
+from .utils import (  # noqa: F401; pylint: disable=unused-import
+    become_linux,
+    become_windows,
+    change_homedir,
+    make_chromium_history,
+    add_chromium_visits,
+)
+
+# pylint: disable=redefined-outer-name,unused-argument
+
+# 2021-01-01 00:00:00 UTC
+START = 13253932800000000
+
+
+@pytest.fixture()
+def cache_home(monkeypatch, tmp_path):
+    """Use a temporary directory as $XDG_CACHE_HOME"""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    return tmp_path / "cache"
+
+
+def test_default_store_path(monkeypatch, cache_home):
+    assert default_store_path() == cache_home / "browser-history/history.sqlite"
+    monkeypatch.delenv("XDG_CACHE_HOME")
+    assert default_store_path() == Path.home() / ".cache/browser-history/history.sqlite"
+
+
+def test_get_history_store(become_windows, change_homedir, cache_home):  # noqa: F811
+    """Test the history from the store is the same as reading the browsers"""
+    his = browser_history.get_history().histories
+    assert browser_history.get_history(use_store=True).histories == his
+    assert (cache_home / "browser-history/history.sqlite").exists()
+    # served from the store, nothing is read from the browsers
+    with HistoryStore() as store:
+        assert store.refresh() == 0
+        assert list(store.iter_history()) == his
+        assert list(store.iter_history(desc=True)) == his[::-1]
+        assert list(store.iter_history(browsers=["Firefox"])) == (
+            browser_history.browsers.Firefox().fetch_history().histories
+        )
+    since, until = his[3][0], his[-3][0]
+    url_filter = browser_history.generic.UrlFilter(exclude_domains=["reddit.com"])
+    options = {"since": since, "until": until, "url_filter": url_filter}
+    assert (
+        browser_history.get_history(use_store=True, **options).histories
+        == browser_history.get_history(**options).histories
+    )
+
+
+def test_store_incremental(become_linux, monkeypatch, tmp_path):  # noqa: F811
+    """Test a refresh only reads the visits added since the last one"""
+    monkeypatch.setattr(Path, "home", lambda: tmp_path)
+    history_path = tmp_path / ".config/chromium/Default/History"
+    conn = make_chromium_history(
+        history_path, [(START + i, f"https://example.com/{i}") for i in range(3)]
+    )
+    queried_after = []
+    iter_history_after_id = browser_history.generic.Browser._iter_history_after_id
+
+    def spy_iter_history_after_id(self, history_paths, after_id=None, ranges=()):
+        queried_after.append(after_id)
+        return iter_history_after_id(self, history_paths, after_id, ranges)
+
+    monkeypatch.setattr(
+        browser_history.generic.Browser,
+        "_iter_history_after_id",
+        spy_iter_history_after_id,
+    )
+    chromium = [browser_history.browsers.Chromium]
+    with HistoryStore(tmp_path / "store.sqlite") as store:
+        assert store.refresh(chromium) == 3
+        assert store.refresh(chromium) == 0
+        assert queried_after == [None]
+
+        add_chromium_visits(
+            conn, [(START + 10 + i, f"https://example.com/new/{i}") for i in range(2)]
+        )
+        assert store.refresh(chromium) == 2
+        # the new visits are read from the last visit stored
+        assert queried_after[-1] == 3
+        his = list(store.iter_history())
+        assert [url for _, url in his] == [
+            "https://example.com/0",
+            "https://example.com/1",
+            "https://example.com/2",
+            "https://example.com/new/0",
+            "https://example.com/new/1",
+        ]
+        assert his[-1][0].microsecond == 11
+        conn.close()
+
+        # history cleared by the browser, the profile is read again
+        new_history_path = tmp_path / "History"
+        make_chromium_history(
+            new_history_path, [(START, "https://example.com/")]
+        ).close()
+        os.replace(new_history_path, history_path)
+        assert store.refresh(chromium) == 1
+        assert queried_after[-1] is None
+        assert [url for _, url in store.iter_history()] == ["https://example.com/"]
+
+        # profiles which no longer exist are removed
+        os.remove(history_path)
+        assert store.refresh(chromium) == 0
+        assert list(store.iter_history()) == []
+
+
+def test_store_older_visits(become_linux, monkeypatch, tmp_path):  # noqa: F811
+    """Test a refresh reads the visits added since the last one even if they
+    were made before the last visit stored, like visits imported by sync"""
+    monkeypatch.setattr(Path, "home", lambda: tmp_path)
+    history_path = tmp_path / ".config/chromium/Default/History"
+    conn = make_chromium_history(
+        history_path, [(START + 10 + i, f"https://example.com/{i}") for i in range(2)]
+    )
+    chromium = [browser_history.browsers.Chromium]
+    with HistoryStore(tmp_path / "store.sqlite") as store:
+        assert store.refresh(chromium) == 2
+        add_chromium_visits(conn, [(START, "https://example.com/synced")])
+        assert store.refresh(chromium) == 1
+        assert [url for _, url in store.iter_history()] == [
+            "https://example.com/synced",
+            "https://example.com/0",
+            "https://example.com/1",
+        ]
+    conn.close()
+
+
+def test_store_time_watermark(become_linux, monkeypatch, tmp_path):  # noqa: F811
+    """Test the time of the last visit is used as the watermark of browsers
+    without visit ids"""
+    monkeypatch.setattr(Path, "home", lambda: tmp_path)
+    monkeypatch.setattr(browser_history.browsers.Chromium, "history_visit_id", False)
+    history_path = tmp_path / ".config/chromium/Default/History"
+    conn = make_chromium_history(
+        history_path, [(START + i, f"https://example.com/{i}") for i in range(3)]
+    )
+    queried_since = []
+    iter_history = browser_history.generic.Browser.iter_history
+
+    def spy_iter_history(self, *args, **kwargs):
+        queried_since.append(kwargs.get("since"))
+        return iter_history(self, *args, **kwargs)
+
+    monkeypatch.setattr(
+        browser_history.generic.Browser, "iter_history", spy_iter_history
+    )
+    chromium = [browser_history.browsers.Chromium]
+    with HistoryStore(tmp_path / "store.sqlite") as store:
+        assert store.refresh(chromium) == 3
+        assert queried_since == [None]
+        add_chromium_visits(conn, [(START + 10, "https://example.com/new")])
+        assert store.refresh(chromium) == 1
+        # the new visits are read from the time of the last visit stored
+        assert queried_since[-1].microsecond == 2
+        assert [url for _, url in store.iter_history()][-1] == (
+            "https://example.com/new"
+        )
+    conn.close()
+
+
+def add_open_visit(conn, visit_time, url):
+    """Add a visit of a tab which is still open to a database created by
+    make_chromium_history, which has no duration yet and is not part of the
+    history. Returns its id."""
+    url_id = conn.execute("INSERT INTO urls (url) VALUES (?)", (url,)).lastrowid
+    visit_id = conn.execute(
+        "INSERT INTO visits (url, visit_time, visit_duration) VALUES (?, ?, 0)",
+        (url_id, visit_time),
+    ).lastrowid
+    conn.commit()
+    return visit_id
+
+
+@pytest.mark.parametrize("visit_ids", [True, False])
+def test_store_completed_visits(
+    become_linux, monkeypatch, tmp_path, visit_ids  # noqa: F811
+):
+    """Test a visit left out of the history when the store is refreshed is
+    stored once the browser completes it, even though later visits were
+    stored in the meantime"""
+    monkeypatch.setattr(Path, "home", lambda: tmp_path)
+    monkeypatch.setattr(
+        browser_history.browsers.Chromium, "history_visit_id", visit_ids
+    )
+    history_path = tmp_path / ".config/chromium/Default/History"
+    conn = make_chromium_history(history_path, [(START, "https://a/")])
+    open_visit = add_open_visit(conn, START + 1, "https://open/")
+    add_chromium_visits(conn, [(START + 2, "https://b/")])
+    chromium = [browser_history.browsers.Chromium]
+    with HistoryStore(tmp_path / "store.sqlite") as store:
+        assert store.refresh(chromium) == 2
+        add_chromium_visits(conn, [(START + 3, "https://c/")])
+        assert store.refresh(chromium) == 1
+        conn.execute("UPDATE visits SET visit_duration = 1 WHERE id = ?", (open_visit,))
+        conn.commit()
+        assert store.refresh(chromium) == 1
+        urls = ["https://a/", "https://open/", "https://b/", "https://c/"]
+        assert [url for _, url in store.iter_history()] == urls
+        fetched = browser_history.browsers.Chromium().fetch_history().histories
+        assert list(store.iter_history()) == fetched
+    conn.close()
+
+
+def test_store_pending_time(become_linux, monkeypatch, tmp_path):  # noqa: F811
+    """Test visits left out of the history are only looked for again for
+    pending_time"""
+    monkeypatch.setattr(Path, "home", lambda: tmp_path)
+    history_path = tmp_path / ".config/chromium/Default/History"
+    conn = make_chromium_history(history_path, [(START, "https://a/")])
+    open_visit = add_open_visit(conn, START + 1, "https://open/")
+    add_chromium_visits(conn, [(START + 2, "https://b/")])
+    chromium = [browser_history.browsers.Chromium]
+    with HistoryStore(tmp_path / "store.sqlite") as store:
+        assert store.refresh(chromium) == 2
+        # missed longer ago than pending_time
+        days = store.pending_time.days + 1
+        store.conn.execute("UPDATE pending SET since = since - ?", (days * 86400,))
+        conn.execute("UPDATE visits SET visit_duration = 1 WHERE id = ?", (open_visit,))
+        conn.commit()
+        assert store.refresh(chromium) == 0
+        assert store.conn.execute("SELECT count(*) FROM pending").fetchone() == (0,)
+    conn.close()
+
+
+def test_store_same_time(become_linux, monkeypatch, tmp_path):  # noqa: F811
+    """Test distinct visits to the same URL at the same time are all stored"""
+    monkeypatch.setattr(Path, "home", lambda: tmp_path)
+    history_path = tmp_path / ".config/chromium/Default/History"
+    visits = [(START, "https://a/"), (START, "https://a/"), (START + 1, "https://b/")]
+    make_chromium_history(history_path, visits).close()
+    chromium = [browser_history.browsers.Chromium]
+    with HistoryStore(tmp_path / "store.sqlite") as store:
+        assert store.refresh(chromium) == 3
+        assert list(store.iter_history()) == (
+            browser_history.browsers.Chromium().fetch_history().histories
+        )
@@ -1,3 +1,4 @@
+from browser_history import browsers, generic, utils
 from browser_history.utils import get_platform, get_platform_name, Platform
 from .utils import become_linux, become_mac, become_windows  # noqa: F401
 
@@ -24,3 +25,33 @@ def test_platform_name_mac(become_mac):  # noqa: F811
 
 def test_platform_name_win(become_windows):  # noqa: F811
     assert get_platform_name() == "Windows"
+
+
+def test_browser_index(monkeypatch, become_linux):  # noqa: F811
+    """Test browsers are looked up by name and alias, and that the index is
+    built again when a browser is defined"""
+    index = utils._get_browser_index()
+    assert utils._get_browser_index() is index
+    assert utils.get_browser("FireFox") is browsers.Firefox
+    assert utils.get_browser("safari") is None
+    assert utils.get_browser("netscape") is None
+    assert index.names["google-chrome"] is browsers.Chrome
+    assert index.alias_prefix("firefoxurl-3eedf34567dde") is browsers.Firefox
+    assert index.alias_prefix("operagxstable-1") is browsers.OperaGX
+    assert index.alias_prefix("opera") is None
+
+    # restored after the test, so that the browser below is not listed
+    monkeypatch.setattr(utils, "_browser_index", index)
+
+    class CustomBrowser(generic.Browser):
+        name = "Custom"
+        aliases = ("customhtm",)
+        linux_path = ".custom"
+        history_file = "History"
+        history_SQL = "SELECT visit_time, url FROM visits"
+
+    assert utils._browser_index is None
+    assert utils.get_browsers() == index.browsers + [CustomBrowser]
+    assert utils.get_browser("custombrowser") is CustomBrowser
+    monkeypatch.setattr(utils, "_default_browser_linux", lambda: "customhtm-2")
+    assert utils.default_browser() is CustomBrowser
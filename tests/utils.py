@@ -1,6 +1,7 @@
 from dateutil import tz
 from os import path
 import platform
+import sqlite3
 from pathlib import Path
 
 import pytest
@@ -110,3 +111,37 @@ def assert_bookmarks_equal(actual_bookmarks, expected_bookmarks):
         Path(expected_bookmarks[-1]),
     )
     assert _detach_timezone_stamp(actual) == _detach_timezone_stamp(expected)
+
+
+def make_chromium_history(history_path, visits):
+    """Create a Chromium history database at ``history_path`` containing
+    ``visits``, a list of (visit_time, url) tuples where visit_time is in
+    microseconds since 1601-01-01.
+
+    :return: an open connection to the database, in WAL mode and with
+        automatic checkpoints disabled so that writes stay in the -wal file.
+    """
+    history_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(history_path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA wal_autocheckpoint = 0")
+    conn.execute("CREATE TABLE urls (id INTEGER PRIMARY KEY, url TEXT)")
+    conn.execute(
+        "CREATE TABLE visits (id INTEGER PRIMARY KEY, url INTEGER, "
+        "visit_time INTEGER, visit_duration INTEGER)"
+    )
+    conn.execute("CREATE INDEX visits_time_index ON visits (visit_time)")
+    add_chromium_visits(conn, visits)
+    return conn
+
+
+def add_chromium_visits(conn, visits):
+    """Add (visit_time, url) ``visits`` to a database created by
+    :py:func:`make_chromium_history`."""
+    for visit_time, url in visits:
+        url_id = conn.execute("INSERT INTO urls (url) VALUES (?)", (url,)).lastrowid
+        conn.execute(
+            "INSERT INTO visits (url, visit_time, visit_duration) VALUES (?, ?, 1)",
+            (url_id, visit_time),
+        )
+    conn.commit()